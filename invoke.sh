@@ -10,6 +10,9 @@ function base64_encode() {
 
 invocation_id="00DJS0000000123ABC-$(openssl rand -hex 16)"
 
+# Invocations whose deadline has already passed are rejected, so the deadline is two minutes from now.
+deadline=$(python3 -c "import datetime; print((datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=2)).strftime('%Y-%m-%dT%H:%M:%S.%fZ'))")
+
 sfcontext=$(base64_encode <<'EOF'
 {
   "apiVersion": "56.0",
@@ -31,7 +34,7 @@ sffncontext=$(base64_encode <<EOF
 {
   "accessToken": "EXAMPLE-TOKEN",
   "apexFQN": "ExampleClass:example_function():7",
-  "deadline": "2023-01-19T10:11:12.468085Z",
+  "deadline": "${deadline}",
   "functionName": "ExampleProject.examplefunction",
   "invokingNamespace": "",
   "requestId": "${invocation_id}",
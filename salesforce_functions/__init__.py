@@ -1,9 +1,14 @@
-from ._internal.logging import get_logger
-from .context import Context, Org, User
-from .data_api.record import QueriedRecord, Record, RecordQueryResult
-from .data_api.reference_id import ReferenceId
-from .data_api.unit_of_work import UnitOfWork
-from .invocation_event import InvocationEvent
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from ._internal.logging import get_logger
+    from .context import Context, Org, User
+    from .data_api.record import QueriedRecord, Record, RecordQueryResult
+    from .data_api.reference_id import ReferenceId
+    from .data_api.unit_of_work import UnitOfWork
+    from .invocation_event import InvocationEvent
+    from .raw_response import RawResponse
 
 __all__ = [
     "Context",
@@ -11,9 +16,42 @@ __all__ = [
     "InvocationEvent",
     "Org",
     "QueriedRecord",
+    "RawResponse",
     "Record",
     "RecordQueryResult",
     "ReferenceId",
     "UnitOfWork",
     "User",
 ]
+
+# The modules that the public API is imported from. These are only imported on first use (via
+# `__getattr__`), since some of them import heavier dependencies (such as `aiohttp`), which would
+# otherwise slow down anything that imports this package, such as the CLI.
+_PUBLIC_API_MODULES = {
+    "Context": ".context",
+    "get_logger": "._internal.logging",
+    "InvocationEvent": ".invocation_event",
+    "Org": ".context",
+    "QueriedRecord": ".data_api.record",
+    "RawResponse": ".raw_response",
+    "Record": ".data_api.record",
+    "RecordQueryResult": ".data_api.record",
+    "ReferenceId": ".data_api.reference_id",
+    "UnitOfWork": ".data_api.unit_of_work",
+    "User": ".context",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _PUBLIC_API_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # Cache the value, so that `__getattr__` isn't called again for this name.
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *__all__])
@@ -0,0 +1,179 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+from .settings import DEFAULT_MAX_QUEUED, DEFAULT_SHUTDOWN_TIMEOUT
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class Admission:
+    """Details about how an invocation was admitted, which are reported in the response metadata."""
+
+    queue_depth: int
+    """The number of invocations that were waiting for an execution slot when this invocation arrived."""
+    wait_duration_ns: int
+    """How long the invocation waited for an execution slot."""
+
+
+class AdmissionController:  # pylint: disable=too-many-instance-attributes
+    """
+    Limits the number of function invocations that are executed concurrently by a worker.
+
+    Once `max_in_flight` invocations are executing, further invocations wait (in arrival order)
+    in a queue for an execution slot. Once `max_queued` invocations are waiting, any further
+    invocations are rejected immediately rather than being queued, so that a slow dependency
+    (such as the Data API) can't cause an unbounded number of invocations to pile up.
+
+    If `max_in_flight` is `None`, invocations are never queued or rejected.
+
+    If set, `on_change` is called whenever `in_flight` or `queued` changes, for example to
+    update metrics.
+
+    When the worker shuts down, `drain()` stops any new invocations from being admitted, and waits
+    for the invocations that were already admitted or queued to finish.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_in_flight: int | None,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        on_change: Callable[["AdmissionController"], None] | None = None,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self.closed = False
+        self.cancelled = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._idle_waiter: asyncio.Future[None] | None = None
+        self._on_change = on_change
+
+    @property
+    def queued(self) -> int:
+        """The number of invocations currently waiting for an execution slot."""
+        return len(self._waiters)
+
+    @contextlib.asynccontextmanager
+    async def admit(self) -> AsyncIterator[Admission | None]:
+        """
+        Wait for an execution slot, which is held until the context manager exits.
+
+        Raises `AdmissionRejectedError` if the queue of waiting invocations is full, or
+        `AdmissionClosedError` if the worker is shutting down. The returned
+        `Admission` is `None` if there is no limit on the number of in-flight invocations.
+        """
+        queue_depth = self.queued
+        wait_start_time_ns = time.perf_counter_ns()
+
+        try:
+            await self._acquire()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+        try:
+            if self.max_in_flight is None:
+                yield None
+            else:
+                yield Admission(
+                    queue_depth=queue_depth,
+                    wait_duration_ns=time.perf_counter_ns() - wait_start_time_ns,
+                )
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self._release()
+
+    def close(self) -> None:
+        """
+        Stop admitting new invocations, which are rejected with `AdmissionClosedError`.
+
+        Invocations that are already queued are still admitted once an execution slot is available.
+        """
+        self.closed = True
+
+    async def drain(self, timeout: float = DEFAULT_SHUTDOWN_TIMEOUT) -> int:
+        """
+        Close the controller, and wait up to `timeout` seconds for admitted and queued invocations to finish.
+
+        Returns the number of invocations that were aborted, which is the number that are still
+        unfinished once `timeout` is reached, plus any that were cancelled (such as by the ASGI
+        server, once its own graceful shutdown timeout was reached).
+        """
+        self.close()
+
+        if self.in_flight:
+            self._idle_waiter = asyncio.get_running_loop().create_future()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(asyncio.shield(self._idle_waiter), timeout)
+
+        return self.cancelled + self.in_flight + self.queued
+
+    async def _acquire(self) -> None:
+        if self.closed:
+            raise AdmissionClosedError(
+                "The worker is shutting down, so isn't accepting new invocations."
+            )
+
+        if self.max_in_flight is None or (
+            self.in_flight < self.max_in_flight and not self._waiters
+        ):
+            self.in_flight += 1
+            self._notify_change()
+            return
+
+        if len(self._waiters) >= self.max_queued:
+            raise AdmissionRejectedError(
+                f"The maximum number of queued invocations ({self.max_queued}) has been reached,"
+                f" while waiting for one of the {self.max_in_flight} in-flight invocations to finish."
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._notify_change()
+
+        try:
+            # The execution slot is handed over directly by `_release()`, so `in_flight`
+            # has already been accounted for once this returns.
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation, so pass it on.
+                self._release()
+            else:
+                # The waiter may have already been discarded by `_release()`.
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove(waiter)
+                self._notify_change()
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._notify_change()
+                return
+
+        self.in_flight -= 1
+        self._notify_change()
+
+        if self.in_flight == 0 and self._idle_waiter and not self._idle_waiter.done():
+            self._idle_waiter.set_result(None)
+
+    def _notify_change(self) -> None:
+        if self._on_change is not None:
+            self._on_change(self)
+
+
+class AdmissionRejectedError(Exception):
+    """The invocation was rejected, since the worker is already at capacity."""
+
+
+class AdmissionClosedError(AdmissionRejectedError):
+    """The invocation was rejected, since the worker is shutting down."""
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable
+
+from structlog.stdlib import BoundLogger
+
+from .settings import DEFAULT_SHUTDOWN_TIMEOUT
+
+
+class BackgroundTaskRunner:
+    """
+    Runs the background tasks scheduled by functions using `Context.add_background_task()`.
+
+    At most `max_concurrent` background tasks run at once, so that follow-up work can't starve
+    function invocations of resources (such as Data API connections). Any further tasks wait
+    (in the order they were scheduled) until a running task finishes.
+
+    The tasks are tracked, so that they can be drained when the worker shuts down.
+    """
+
+    def __init__(self, *, max_concurrent: int, logger: BoundLogger) -> None:
+        self.max_concurrent = max_concurrent
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._logger = logger
+
+    @property
+    def pending(self) -> int:
+        """The number of background tasks that are either running or waiting to run."""
+        return len(self._tasks)
+
+    def schedule(
+        self, background_tasks: Iterable[Callable[[], Awaitable[Any]]]
+    ) -> None:
+        """
+        Start running the given background tasks.
+
+        The tasks inherit the current context, so that log lines include the invocation ID.
+        """
+        for background_task in background_tasks:
+            task = asyncio.create_task(self._run(background_task))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, background_task: Callable[[], Awaitable[Any]]) -> None:
+        async with self._semaphore:
+            try:
+                await background_task()
+            except Exception as e:  # pylint: disable=broad-except
+                self._logger.exception(
+                    f"Exception occurred while executing background task: {e.__class__.__name__}: {e}"
+                )
+
+    async def drain(self, timeout: float = DEFAULT_SHUTDOWN_TIMEOUT) -> None:
+        """Wait for all background tasks to finish, cancelling any that are still running after `timeout` seconds."""
+        if not self._tasks:
+            return
+
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+
+        if pending:
+            self._logger.warning(
+                f"Cancelling {len(pending)} background task(s) that didn't finish within {timeout} seconds of shutdown"
+            )
+            for task in pending:
+                task.cancel()
+            await asyncio.wait(pending)
@@ -0,0 +1,387 @@
+import asyncio
+import dataclasses
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Mapping
+
+import anyio
+import orjson
+import structlog
+from starlette.datastructures import State
+from structlog.stdlib import BoundLogger
+
+from ..context import Context
+from ..data_api import (
+    _request_duration_observer,  # pyright: ignore [reportPrivateUsage]
+)
+from ..raw_response import RawResponse
+from .admission import AdmissionController, AdmissionRejectedError
+from .background_tasks import BackgroundTaskRunner
+from .cloud_event import (
+    CloudEventError,
+    SalesforceContext,
+    SalesforceFunctionsCloudEvent,
+)
+from .content_types import JSON_CODEC
+from .function_loader import BATCH_FUNCTION_NAME, BatchFunction
+from .log_limiter import finish_invocation_log_limiter, start_invocation_log_limiter
+from .metrics import RuntimeMetrics
+from .responses import (
+    DEADLINE_EXCEEDED_MESSAGE,
+    DEADLINE_PASSED_MESSAGE,
+    FunctionResponse,
+    StatusCode,
+    describe_admission_rejection,
+    make_response,
+    read_raw_response_file,
+    record_response_metrics,
+)
+from .timings import InvocationTimings
+
+# Admits and executes an event in the same way as an invocation that was sent on its own. This is
+# passed in by the app, since its invocation handling can't be imported here without a circular import.
+AdmitFunctionInvocation = Callable[
+    [State, SalesforceFunctionsCloudEvent, InvocationTimings],
+    Awaitable[FunctionResponse],
+]
+
+
+async def handle_batch_request(
+    state: State,
+    headers: Mapping[str, str],
+    body: bytes,
+    timings: InvocationTimings,
+    admit_function_invocation: AdmitFunctionInvocation,
+) -> FunctionResponse:
+    """
+    Handle a batch of function invocations sent using the `application/cloudevents-batch+json` content type.
+
+    The events are parsed in a single pass, and then either passed to the function concurrently (each
+    being admitted separately), or else passed to the function's `batch_function()` in groups that share
+    the same org and user. Each event counts as a separate invocation in the metrics.
+    In the former case, each event is admitted and executed using `admit_function_invocation`.
+
+    The response body is a JSON array containing the result of each event (in the same order as
+    the request) in the form: `{"statusCode": 200, "data": <result>, "extraInfo": <metadata>}`,
+    where `data` and `extraInfo` match the body and `x-extra-info` header of a single invocation.
+    """
+    logger: BoundLogger = state.logger
+    metrics: RuntimeMetrics = state.metrics
+
+    # The per-event results of a batch are buffered into a single response, which would defeat
+    # the point of streaming them.
+    if state.streaming and state.batch_function is None:
+        message = (
+            "Batch invocations aren't supported by functions that stream their results,"
+            f" unless the function also defines a {BATCH_FUNCTION_NAME}()"
+        )
+        logger.error(message)
+        function_response = make_response(
+            message, StatusCode.REQUEST_ERROR, timings=timings
+        )
+        record_response_metrics(metrics, function_response)
+        return function_response
+
+    parse_start_time_ns = time.perf_counter_ns()
+
+    try:
+        # If the function defines a `batch_function()`, the events are passed to that instead.
+        cloudevents = SalesforceFunctionsCloudEvent.batch_from_http(
+            headers,
+            body,
+            state.batch_payload_decoder
+            if state.batch_function
+            else state.payload_decoder,
+        )
+    except CloudEventError as e:
+        timings.parse_ns = time.perf_counter_ns() - parse_start_time_ns
+        message = f"Couldn't parse CloudEvent batch: {e}"
+        logger.error(message)
+        function_response = make_response(
+            message, StatusCode.REQUEST_ERROR, timings=timings, exception=e
+        )
+        record_response_metrics(metrics, function_response)
+        return function_response
+
+    timings.parse_ns = time.perf_counter_ns() - parse_start_time_ns
+    metrics.cloudevent_parse_duration.observe_ns(timings.parse_ns)
+
+    batch_function: BatchFunction | None = state.batch_function
+    event_responses: list[FunctionResponse]
+    if batch_function is None:
+        # Each event is handled in its own task (and so its own context).
+        event_responses = await asyncio.gather(
+            *(
+                _handle_batch_event(state, cloudevent, admit_function_invocation)
+                for cloudevent in cloudevents
+            )
+        )
+    else:
+        event_responses = await _handle_batch_function_invocations(
+            state, batch_function, cloudevents
+        )
+
+    for event_response in event_responses:
+        record_response_metrics(metrics, event_response)
+
+    return make_response(
+        RawResponse(
+            b"["
+            + b",".join(
+                event_response.to_batch_result() for event_response in event_responses
+            )
+            + b"]"
+        ),
+        StatusCode.SUCCESS,
+        timings=timings,
+    )
+
+
+async def _handle_batch_event(
+    state: State,
+    cloudevent: SalesforceFunctionsCloudEvent | CloudEventError,
+    admit_function_invocation: AdmitFunctionInvocation,
+) -> FunctionResponse:
+    """Handle one of the events in a batch, in the same way as an invocation that was sent on its own."""
+    if isinstance(cloudevent, CloudEventError):
+        return _make_batch_event_error_response(state.logger, cloudevent)
+
+    timings = InvocationTimings()
+    event_response = await admit_function_invocation(state, cloudevent, timings)
+    return _check_batch_event_response(
+        state.logger, cloudevent, timings, event_response
+    )
+
+
+def _check_batch_event_response(
+    logger: BoundLogger,
+    cloudevent: SalesforceFunctionsCloudEvent,
+    timings: InvocationTimings,
+    event_response: FunctionResponse,
+) -> FunctionResponse:
+    """
+    Check that the response to one of the events in a batch can be embedded in the batch's JSON response body.
+
+    Results are always encoded as JSON in batch invocations, except for a `RawResponse`, which is sent
+    as-is, and so is replaced by an error response unless its content type is JSON.
+    """
+    content_type = event_response.content_type
+    if content_type.partition(";")[0].strip().lower() == JSON_CODEC.content_type:
+        return event_response
+
+    message = f"RawResponse must be JSON in batch invocations, not '{content_type}'"
+    logger.error(message)
+    return make_response(
+        message, StatusCode.FUNCTION_ERROR, cloudevent=cloudevent, timings=timings
+    )
+
+
+async def _handle_batch_function_invocations(
+    state: State,
+    batch_function: BatchFunction,
+    cloudevents: list[SalesforceFunctionsCloudEvent | CloudEventError],
+) -> list[FunctionResponse]:
+    """Group the events in a batch by org and user, and pass each group to the function's `batch_function()`."""
+    event_responses: dict[int, FunctionResponse] = {}
+    groups: dict[
+        tuple[SalesforceContext, str], list[tuple[int, SalesforceFunctionsCloudEvent]]
+    ] = {}
+
+    for index, cloudevent in enumerate(cloudevents):
+        if isinstance(cloudevent, CloudEventError):
+            event_responses[index] = _make_batch_event_error_response(
+                state.logger, cloudevent
+            )
+        else:
+            key = (cloudevent.sf_context, cloudevent.sf_function_context.access_token)
+            groups.setdefault(key, []).append((index, cloudevent))
+
+    group_responses = await asyncio.gather(
+        *(
+            _admit_batch_function_invocation(
+                state, batch_function, [cloudevent for _, cloudevent in group]
+            )
+            for group in groups.values()
+        )
+    )
+
+    for group, responses in zip(groups.values(), group_responses):
+        for (index, _), response in zip(group, responses):
+            event_responses[index] = response
+
+    return [event_responses[index] for index in range(len(cloudevents))]
+
+
+async def _admit_batch_function_invocation(
+    state: State,
+    batch_function: BatchFunction,
+    cloudevents: list[SalesforceFunctionsCloudEvent],
+) -> list[FunctionResponse]:
+    """Wait for an execution slot for a group of events, which is shared by the whole group."""
+    logger: BoundLogger = state.logger
+    admission_controller: AdmissionController = state.admission_controller
+    structlog.contextvars.bind_contextvars(
+        invocationId=",".join(cloudevent.id for cloudevent in cloudevents)
+    )
+    log_limiter = (
+        start_invocation_log_limiter(state.log_limits) if state.log_limits else None
+    )
+
+    try:
+        async with admission_controller.admit():
+            return await _handle_batch_function_invocation(
+                state, batch_function, cloudevents
+            )
+    except AdmissionRejectedError as e:
+        message = describe_admission_rejection(e)
+        logger.warning(message, reason=str(e))
+        return [
+            make_response(
+                message,
+                StatusCode.TOO_MANY_INVOCATIONS,
+                cloudevent=cloudevent,
+                timings=InvocationTimings(),
+                reason=str(e),
+            )
+            for cloudevent in cloudevents
+        ]
+    finally:
+        if log_limiter:
+            finish_invocation_log_limiter(logger, log_limiter)
+
+
+async def _handle_batch_function_invocation(  # pylint: disable=too-many-locals
+    state: State,
+    batch_function: BatchFunction,
+    cloudevents: list[SalesforceFunctionsCloudEvent],
+) -> list[FunctionResponse]:
+    """
+    Execute the function's `batch_function()` for an admitted group of events that share the same org and user.
+
+    The events share a single `Context`, whose deadline is the earliest deadline of any of the events.
+    """
+    logger: BoundLogger = state.logger
+    metrics: RuntimeMetrics = state.metrics
+    context_start_time_ns = time.perf_counter_ns()
+
+    events = [cloudevent.to_invocation_event() for cloudevent in cloudevents]
+    deadlines = [
+        cloudevent.sf_function_context.deadline
+        for cloudevent in cloudevents
+        if cloudevent.sf_function_context.deadline is not None
+    ]
+    context = Context(
+        org=state.org_cache.get_org(
+            cloudevents[0].sf_context.user_context,
+            cloudevents[0].sf_function_context.access_token,
+        ),
+        deadline=min(deadlines, default=None),
+        _process_pool=state.process_pool,
+    )
+
+    # The timings are shared by the whole group, so each response is given its own copy.
+    timings = InvocationTimings(
+        context_ns=time.perf_counter_ns() - context_start_time_ns
+    )
+
+    def make_responses(
+        content: Any, status_code: StatusCode, exception: Exception | None = None
+    ) -> list[FunctionResponse]:
+        return [
+            make_response(
+                content,
+                status_code,
+                cloudevent=cloudevent,
+                timings=dataclasses.replace(timings),
+                exception=exception,
+            )
+            for cloudevent in cloudevents
+        ]
+
+    remaining_time = context.remaining_time()
+    if remaining_time is not None and remaining_time <= timedelta(0):
+        message = DEADLINE_PASSED_MESSAGE
+        logger.error(message)
+        return make_responses(message, StatusCode.FUNCTION_TIMEOUT)
+
+    _request_duration_observer.set(metrics.make_data_api_observer(timings))
+    function_start_time_ns = time.perf_counter_ns()
+
+    try:
+        with anyio.move_on_after(
+            remaining_time.total_seconds() if remaining_time is not None else None
+        ) as cancel_scope:
+            results = await batch_function(events, context)
+            if isinstance(results, list):
+                results = [await read_raw_response_file(result) for result in results]
+    except Exception as e:  # pylint: disable=broad-except
+        timings.function_ns = time.perf_counter_ns() - function_start_time_ns
+        message = (
+            f"Exception occurred while executing function: {e.__class__.__name__}: {e}"
+        )
+        logger.exception(message)
+        return make_responses(message, StatusCode.FUNCTION_ERROR, exception=e)
+
+    timings.function_ns = time.perf_counter_ns() - function_start_time_ns
+    metrics.function_execution_duration.observe_ns(timings.function_ns)
+
+    if cancel_scope.cancel_called:
+        message = DEADLINE_EXCEEDED_MESSAGE
+        logger.error(message)
+        return make_responses(message, StatusCode.FUNCTION_TIMEOUT)
+
+    if not isinstance(results, list) or len(results) != len(events):
+        message = (
+            f"Function {BATCH_FUNCTION_NAME}() must return a list containing one result per event"
+            f" (expected {len(events)} results)"
+        )
+        logger.error(message)
+        return make_responses(message, StatusCode.FUNCTION_ERROR)
+
+    responses: list[FunctionResponse] = []
+    for cloudevent, result in zip(cloudevents, results):
+        event_timings = dataclasses.replace(timings)
+        try:
+            event_response = make_response(
+                result,
+                StatusCode.SUCCESS,
+                cloudevent=cloudevent,
+                timings=event_timings,
+            )
+            responses.append(
+                _check_batch_event_response(
+                    logger, cloudevent, event_timings, event_response
+                )
+            )
+        except orjson.JSONEncodeError as e:
+            message = f"Function return value can't be serialized: {e.__class__.__name__}: {e}"
+            logger.error(message)
+            responses.append(
+                make_response(
+                    message,
+                    StatusCode.FUNCTION_ERROR,
+                    cloudevent=cloudevent,
+                    timings=event_timings,
+                    exception=e,
+                )
+            )
+
+    background_task_runner: BackgroundTaskRunner = state.background_task_runner
+    background_task_runner.schedule(
+        context._background_tasks  # pyright: ignore [reportPrivateUsage] pylint:disable=protected-access
+    )
+
+    return responses
+
+
+def _make_batch_event_error_response(
+    logger: BoundLogger, error: CloudEventError
+) -> FunctionResponse:
+    message = f"Couldn't parse CloudEvent: {error}"
+    logger.error(message)
+    return make_response(
+        message,
+        StatusCode.REQUEST_ERROR,
+        timings=InvocationTimings(),
+        exception=error,
+    )
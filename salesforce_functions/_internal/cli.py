@@ -1,17 +1,29 @@
 import os
+import socket
 import sys
+import tempfile
 from argparse import ArgumentParser
 from pathlib import Path
 
-import uvicorn
-
 from ..__version__ import __version__
-from .app import PROJECT_PATH_ENV_VAR
 from .config import ConfigError, load_config
-from .function_loader import LoadFunctionError, load_function
+from .settings import (
+    DEFAULT_INIT_TIMEOUT,
+    DEFAULT_LOG_OVERFLOW_POLICY,
+    DEFAULT_MAX_BACKGROUND_TASKS,
+    DEFAULT_MAX_QUEUED,
+    DEFAULT_SHUTDOWN_TIMEOUT,
+    LOG_OVERFLOW_POLICIES,
+    PROFILE_HEADER_NAME,
+)
+
+# The modules that are only needed by some subcommands (such as the app, uvicorn, and the function
+# loader, which imports the Data API client) are imported inside those subcommands, so that the
+# other subcommands start faster.
 
 PROGRAM_NAME = "sf-functions-python"
 ASGI_APP_IMPORT_STRING = "salesforce_functions._internal.app:asgi_app"
+FAST_ASGI_APP_IMPORT_STRING = "salesforce_functions._internal.app:fast_asgi_app"
 
 
 def main(args: list[str] | None = None) -> int:
@@ -59,6 +71,12 @@ def main(args: list[str] | None = None) -> int:
         type=int,
         help="The port on which the web server listens (default: %(default)s)",
     )
+    parser_serve.add_argument(
+        "--uds",
+        metavar="PATH",
+        help="Bind to a Unix domain socket at this path instead of --host and --port, for when the"
+        " function runtime is fronted by a local proxy (not supported on Windows)",
+    )
     parser_serve.add_argument(
         "-w",
         "--workers",
@@ -66,6 +84,111 @@ def main(args: list[str] | None = None) -> int:
         type=int,
         help="The number of worker processes (default: %(default)s)",
     )
+    parser_serve.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="The maximum number of invocations each worker process executes concurrently (default: unlimited)",
+    )
+    parser_serve.add_argument(
+        "--max-queued",
+        default=DEFAULT_MAX_QUEUED,
+        type=int,
+        help="The maximum number of invocations each worker process queues once --max-in-flight is reached,"
+        " after which invocations are rejected (default: %(default)s)",
+    )
+    parser_serve.add_argument(
+        "--max-background-tasks",
+        default=DEFAULT_MAX_BACKGROUND_TASKS,
+        type=int,
+        help="The maximum number of background tasks (scheduled using Context.add_background_task())"
+        " each worker process runs concurrently (default: %(default)s)",
+    )
+    parser_serve.add_argument(
+        "--thread-pool-size",
+        type=int,
+        help="The number of threads each worker process uses to run synchronous (non-async) functions"
+        " (default: the number of CPUs plus 4, up to 32)",
+    )
+    parser_serve.add_argument(
+        "--process-pool-size",
+        default=0,
+        type=int,
+        help="The number of processes each worker process starts for running CPU-bound code passed to"
+        " Context.run_in_process() (default: no process pool, so the code is run on a thread instead)",
+    )
+    parser_serve.add_argument(
+        "--compression-min-size",
+        metavar="BYTES",
+        type=int,
+        help="Compress response bodies of at least this size (in bytes) using gzip (or zstd/brotli, if"
+        " installed), if accepted by the request's Accept-Encoding header (default: compression disabled)",
+    )
+    parser_serve.add_argument(
+        "--log-queue-size",
+        metavar="LINES",
+        type=int,
+        help="Write log lines to stdout from a background thread, queueing up to this many lines, so that"
+        " a slow log drain doesn't stall invocations (default: log lines are written synchronously)",
+    )
+    parser_serve.add_argument(
+        "--log-overflow",
+        default=DEFAULT_LOG_OVERFLOW_POLICY,
+        choices=LOG_OVERFLOW_POLICIES,
+        help="What to do with log lines once the log queue is full: wait for space, drop the new line,"
+        " or drop the oldest queued line (default: %(default)s)",
+    )
+    parser_serve.add_argument(
+        "--log-sample-rate",
+        metavar="FRACTION",
+        type=float,
+        help="Log only this fraction (between 0 and 1) of the info log lines from each line of code in each"
+        " invocation, starting with the first (default: all lines are logged)",
+    )
+    parser_serve.add_argument(
+        "--log-rate-limit",
+        metavar="LINES",
+        type=float,
+        help="Log at most this many info log lines per second from each line of code in each invocation,"
+        " after an initial burst of this many lines (default: no rate limit)",
+    )
+    parser_serve.add_argument(
+        "--init-timeout",
+        default=DEFAULT_INIT_TIMEOUT,
+        type=float,
+        help="How long (in seconds) to wait for the function's init() hook to finish when each worker"
+        " process starts, before startup fails (default: %(default)s)",
+    )
+    parser_serve.add_argument(
+        "--shutdown-timeout",
+        default=DEFAULT_SHUTDOWN_TIMEOUT,
+        type=float,
+        help="How long (in seconds) each worker process has to shut down, from when it's told to,"
+        " which covers waiting for in-flight invocations (which are then aborted) and background tasks"
+        " to finish, and the function's shutdown() hook (default: %(default)s)",
+    )
+    parser_serve.add_argument(
+        "--fast-path",
+        action="store_true",
+        help="Handle function invocations using a lower overhead ASGI handler that bypasses Starlette's routing",
+    )
+    parser_serve.add_argument(
+        "--preload",
+        action="store_true",
+        help="Load the function once before starting the worker processes, which are then forked"
+        " so that they share its memory (not supported on Windows)",
+    )
+    parser_serve.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="Have each worker process bind its own socket (using SO_REUSEPORT), so that the kernel"
+        " balances connections across them, rather than sharing a single socket (not supported on Windows)",
+    )
+    parser_serve.add_argument(
+        "--profile-dir",
+        type=Path,
+        help=f"Profile invocations that set the '{PROFILE_HEADER_NAME}: true' request header, writing"
+        " the cProfile results to this directory (default: profiling disabled)",
+    )
 
     # Subcommand `version`
     parser_check = subparsers.add_parser(
@@ -74,6 +197,44 @@ def main(args: list[str] | None = None) -> int:
 
     parsed_args = parser.parse_args(args=args)
 
+    if (
+        parsed_args.subcommand == "serve"
+        and parsed_args.preload
+        and not hasattr(os, "fork")
+    ):
+        parser.error("--preload isn't supported on this platform")
+
+    if (
+        parsed_args.subcommand == "serve"
+        and parsed_args.process_pool_size
+        and not hasattr(socket, "AF_UNIX")
+    ):
+        parser.error("--process-pool-size isn't supported on this platform")
+
+    if parsed_args.subcommand == "serve" and parsed_args.log_sample_rate is not None:
+        if not 0 < parsed_args.log_sample_rate <= 1:
+            parser.error("--log-sample-rate must be greater than 0, and at most 1")
+
+    if (
+        parsed_args.subcommand == "serve"
+        and parsed_args.log_rate_limit is not None
+        and parsed_args.log_rate_limit <= 0
+    ):
+        parser.error("--log-rate-limit must be greater than 0")
+
+    if parsed_args.subcommand == "serve" and parsed_args.uds is not None:
+        if not hasattr(socket, "AF_UNIX"):
+            parser.error("--uds isn't supported on this platform")
+        if parsed_args.reuse_port:
+            parser.error("--reuse-port can't be used with --uds")
+
+    if (
+        parsed_args.subcommand == "serve"
+        and parsed_args.reuse_port
+        and not (hasattr(socket, "SO_REUSEPORT") and hasattr(os, "fork"))
+    ):
+        parser.error("--reuse-port isn't supported on this platform")
+
     match parsed_args.subcommand:
         case "check":
             return _check_function(parsed_args.project_path)
@@ -83,6 +244,23 @@ def main(args: list[str] | None = None) -> int:
                 parsed_args.host,
                 parsed_args.port,
                 parsed_args.workers,
+                uds=parsed_args.uds,
+                fast_path=parsed_args.fast_path,
+                preload=parsed_args.preload,
+                reuse_port=parsed_args.reuse_port,
+                max_in_flight=parsed_args.max_in_flight,
+                max_queued=parsed_args.max_queued,
+                max_background_tasks=parsed_args.max_background_tasks,
+                thread_pool_size=parsed_args.thread_pool_size,
+                process_pool_size=parsed_args.process_pool_size,
+                compression_min_size=parsed_args.compression_min_size,
+                log_queue_size=parsed_args.log_queue_size,
+                log_overflow=parsed_args.log_overflow,
+                log_sample_rate=parsed_args.log_sample_rate,
+                log_rate_limit=parsed_args.log_rate_limit,
+                init_timeout=parsed_args.init_timeout,
+                shutdown_timeout=parsed_args.shutdown_timeout,
+                profile_dir=parsed_args.profile_dir,
             )
         case "version":
             print(__version__)
@@ -94,9 +272,24 @@ def main(args: list[str] | None = None) -> int:
 
 
 def _check_function(project_path: Path) -> int:
+    # pylint: disable-next=import-outside-toplevel
+    from .function_loader import (
+        LoadFunctionError,
+        load_batch_function,
+        load_function,
+        load_lifecycle_hooks,
+        load_payload_decoder,
+    )
+
+    # This matches the validation performed by the app when it starts.
     try:
         load_config(project_path)
-        load_function(project_path)
+        function = load_function(project_path)
+        load_lifecycle_hooks(function)
+        batch_function = load_batch_function(function)
+        load_payload_decoder(function)
+        if batch_function:
+            load_payload_decoder(batch_function)
     except (ConfigError, LoadFunctionError) as e:
         print(f"Function failed validation: {e}", file=sys.stderr)
         return 1
@@ -105,7 +298,30 @@ def _check_function(project_path: Path) -> int:
     return 0
 
 
-def _start_server(project_path: Path, host: str, port: int, workers: int) -> int:
+def _start_server(  # pylint: disable=too-many-branches,too-many-locals
+    project_path: Path,
+    host: str,
+    port: int,
+    workers: int,
+    *,
+    uds: str | None,
+    fast_path: bool,
+    preload: bool,
+    reuse_port: bool,
+    max_in_flight: int | None,
+    max_queued: int,
+    max_background_tasks: int,
+    thread_pool_size: int | None,
+    process_pool_size: int,
+    compression_min_size: int | None,
+    log_queue_size: int | None,
+    log_overflow: str,
+    log_sample_rate: float | None,
+    log_rate_limit: float | None,
+    init_timeout: float,
+    shutdown_timeout: float,
+    profile_dir: Path | None,
+) -> int:
     if workers == 1:
         process_mode = "single process mode"
     else:
@@ -113,21 +329,109 @@ def _start_server(project_path: Path, host: str, port: int, workers: int) -> int
 
     print(f"Starting {PROGRAM_NAME} v{__version__} in {process_mode}.")
 
-    # Propagate CLI args to the ASGI app (uvicorn doesn't support passing custom config directly).
-    os.environ[PROJECT_PATH_ENV_VAR] = str(project_path)
+    # pylint: disable=import-outside-toplevel
+    import uvicorn
 
-    try:
-        # This only ever returns in the case of a successful shutdown (from a SIGINT/SIGTERM).
-        # If errors occur, uvicorn will catch/log them and call `sys.exit()` itself.
-        uvicorn.run(  # pyright: ignore [reportUnknownMemberType]
-            ASGI_APP_IMPORT_STRING,
-            host=host,
-            port=port,
-            workers=workers,
-            access_log=False,
+    from .app import (
+        COMPRESSION_MIN_SIZE_ENV_VAR,
+        INIT_TIMEOUT_ENV_VAR,
+        LOG_OVERFLOW_ENV_VAR,
+        LOG_QUEUE_SIZE_ENV_VAR,
+        LOG_RATE_LIMIT_ENV_VAR,
+        LOG_SAMPLE_RATE_ENV_VAR,
+        MAX_BACKGROUND_TASKS_ENV_VAR,
+        MAX_IN_FLIGHT_ENV_VAR,
+        MAX_QUEUED_ENV_VAR,
+        METRICS_DIR_ENV_VAR,
+        PROCESS_POOL_SIZE_ENV_VAR,
+        PROFILE_DIR_ENV_VAR,
+        PROJECT_PATH_ENV_VAR,
+        SHUTDOWN_TIMEOUT_ENV_VAR,
+        THREAD_POOL_SIZE_ENV_VAR,
+        preload_function,
+    )
+    from .function_loader import LoadFunctionError
+    from .workers import serve_forked_workers
+
+    # pylint: enable=import-outside-toplevel
+    # The worker processes each record their metrics to a file in this directory, so that
+    # the metrics endpoint can report the totals across all workers.
+    with tempfile.TemporaryDirectory(prefix=f"{PROGRAM_NAME}-metrics-") as metrics_dir:
+        # Propagate CLI args to the ASGI app (uvicorn doesn't support passing custom config directly).
+        app_env_vars = {
+            PROJECT_PATH_ENV_VAR: str(project_path),
+            MAX_QUEUED_ENV_VAR: str(max_queued),
+            MAX_BACKGROUND_TASKS_ENV_VAR: str(max_background_tasks),
+            PROCESS_POOL_SIZE_ENV_VAR: str(process_pool_size),
+            INIT_TIMEOUT_ENV_VAR: str(init_timeout),
+            SHUTDOWN_TIMEOUT_ENV_VAR: str(shutdown_timeout),
+            LOG_OVERFLOW_ENV_VAR: log_overflow,
+            METRICS_DIR_ENV_VAR: metrics_dir,
+        }
+        if max_in_flight is not None:
+            app_env_vars[MAX_IN_FLIGHT_ENV_VAR] = str(max_in_flight)
+        if thread_pool_size is not None:
+            app_env_vars[THREAD_POOL_SIZE_ENV_VAR] = str(thread_pool_size)
+        if compression_min_size is not None:
+            app_env_vars[COMPRESSION_MIN_SIZE_ENV_VAR] = str(compression_min_size)
+        if profile_dir is not None:
+            app_env_vars[PROFILE_DIR_ENV_VAR] = str(profile_dir)
+        if log_queue_size is not None:
+            app_env_vars[LOG_QUEUE_SIZE_ENV_VAR] = str(log_queue_size)
+        if log_sample_rate is not None:
+            app_env_vars[LOG_SAMPLE_RATE_ENV_VAR] = str(log_sample_rate)
+        if log_rate_limit is not None:
+            app_env_vars[LOG_RATE_LIMIT_ENV_VAR] = str(log_rate_limit)
+        os.environ.update(app_env_vars)
+
+        app_import_string = (
+            FAST_ASGI_APP_IMPORT_STRING if fast_path else ASGI_APP_IMPORT_STRING
         )
-    finally:
-        # Prevent the env var from leaking into the caller, for example during tests.
-        del os.environ[PROJECT_PATH_ENV_VAR]
+
+        try:
+            if preload:
+                # This happens once the env vars are set, since logging is configured using them.
+                try:
+                    preload_function(project_path)
+                except (ConfigError, LoadFunctionError) as e:
+                    print(f"Function failed validation: {e}", file=sys.stderr)
+                    return 1
+
+            if reuse_port or (preload and workers > 1):
+                # uvicorn's own multi-process mode spawns (rather than forks) its workers,
+                # so they wouldn't share the preloaded function, and it only supports the
+                # workers sharing a single socket.
+                return serve_forked_workers(
+                    uvicorn.Config(
+                        app_import_string,
+                        host=host,
+                        port=port,
+                        uds=uds,
+                        access_log=False,
+                        # uvicorn annotates this as an `int`, but it's only used as a timeout.
+                        timeout_graceful_shutdown=shutdown_timeout,  # type: ignore[arg-type]
+                    ),
+                    workers,
+                    reuse_port=reuse_port,
+                )
+
+            # This only ever returns in the case of a successful shutdown (from a SIGINT/SIGTERM).
+            # If errors occur, uvicorn will catch/log them and call `sys.exit()` itself.
+            uvicorn.run(  # pyright: ignore [reportUnknownMemberType]
+                app_import_string,
+                host=host,
+                port=port,
+                uds=uds,
+                workers=workers,
+                access_log=False,
+                # Bounds how long uvicorn waits for open connections to finish sending responses,
+                # before cancelling them and starting the app's own shutdown (see `_lifespan()`).
+                # uvicorn annotates this as an `int`, but it's only used as a timeout.
+                timeout_graceful_shutdown=shutdown_timeout,  # type: ignore[arg-type]
+            )
+        finally:
+            # Prevent the env vars from leaking into the caller, for example during tests.
+            for env_var in app_env_vars:
+                del os.environ[env_var]
 
     return 0
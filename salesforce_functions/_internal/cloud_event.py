@@ -1,11 +1,21 @@
 import binascii
+import functools
 import sys
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Any
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Mapping
 
 import orjson
-from starlette.datastructures import Headers
+
+from ..invocation_event import InvocationEvent
+from .content_types import (
+    JSON_CODEC,
+    JSON_CONTENT_TYPE,
+    MSGPACK_CODEC,
+    BodyCodec,
+    is_msgpack_content_type,
+)
+from .payload_decoder import PayloadDecodeError, PayloadDecoder
 
 if sys.version_info < (3, 11):
     import dateutil.parser  # pragma: no-cover-python-gte-311
@@ -13,6 +23,10 @@ else:
     pass  # pragma: no-cover-python-lt-311
 
 
+# The content type of a batch of structured content mode CloudEvents, which is a JSON array of events.
+BATCH_CONTENT_TYPE = "application/cloudevents-batch+json"
+
+
 @dataclass(frozen=True, kw_only=True, slots=True)
 class SalesforceUserContext:
     org_id: str
@@ -32,37 +46,50 @@ class SalesforceContext:
 
     @classmethod
     def from_base64_json(cls, base64_json: str) -> "SalesforceContext":
-        try:
-            data = _parse_base64_json(base64_json)
-        except (binascii.Error, UnicodeDecodeError) as e:
-            raise CloudEventError(f"sfcontext isn't correctly encoded: {e}") from e
-        except orjson.JSONDecodeError as e:
-            raise CloudEventError(f"sfcontext isn't valid JSON: {e}") from e
+        """
+        Parse the base64 encoded JSON of the `ce-sfcontext` CloudEvent extension.
 
-        try:
-            user_context = data["userContext"]
-            return cls(
-                api_version=data["apiVersion"],
-                payload_version=data["payloadVersion"],
-                user_context=SalesforceUserContext(
-                    org_id=user_context["orgId"],
-                    user_id=user_context["userId"],
-                    on_behalf_of_user_id=user_context.get("onBehalfOfUserId"),
-                    username=user_context["username"],
-                    salesforce_base_url=user_context["salesforceBaseUrl"],
-                    org_domain_url=user_context["orgDomainUrl"],
-                ),
-            )
-        except TypeError as e:
-            raise CloudEventError(
-                f"sfcontext contains unexpected data type: {e}"
-            ) from e
-        except KeyError as e:
-            raise CloudEventError(f"sfcontext missing required key {e}") from e
+        The header value is the same for every invocation made by a given org and user, so
+        the (immutable) result is cached, to save decoding the same value each time.
+        """
+        return _parse_sf_context(base64_json)
+
+
+# The maximum number of distinct `ce-sfcontext` header values whose parsed result is cached.
+SF_CONTEXT_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=SF_CONTEXT_CACHE_SIZE)
+def _parse_sf_context(base64_json: str) -> SalesforceContext:
+    try:
+        data = _parse_base64_json(base64_json)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise CloudEventError(f"sfcontext isn't correctly encoded: {e}") from e
+    except orjson.JSONDecodeError as e:
+        raise CloudEventError(f"sfcontext isn't valid JSON: {e}") from e
+
+    try:
+        user_context = data["userContext"]
+        return SalesforceContext(
+            api_version=data["apiVersion"],
+            payload_version=data["payloadVersion"],
+            user_context=SalesforceUserContext(
+                org_id=user_context["orgId"],
+                user_id=user_context["userId"],
+                on_behalf_of_user_id=user_context.get("onBehalfOfUserId"),
+                username=user_context["username"],
+                salesforce_base_url=user_context["salesforceBaseUrl"],
+                org_domain_url=user_context["orgDomainUrl"],
+            ),
+        )
+    except TypeError as e:
+        raise CloudEventError(f"sfcontext contains unexpected data type: {e}") from e
+    except KeyError as e:
+        raise CloudEventError(f"sfcontext missing required key {e}") from e
 
 
 @dataclass(frozen=True, kw_only=True, slots=True)
-class SalesforceFunctionContext:
+class SalesforceFunctionContext:  # pylint: disable=too-many-instance-attributes
     # TODO: Figure out discrepancy with schema: https://github.com/forcedotcom/sf-fx-schema/issues/8
     access_token: str
     request_id: str
@@ -71,6 +98,7 @@ class SalesforceFunctionContext:
     apex_id: str | None
     apex_fqn: str | None
     resource: str | None
+    deadline: datetime | None
 
     @classmethod
     def from_base64_json(cls, base64_json: str) -> "SalesforceFunctionContext":
@@ -90,6 +118,7 @@ class SalesforceFunctionContext:
                 apex_id=data.get("apexId"),
                 apex_fqn=data.get("apexFQN"),
                 resource=data.get("resource"),
+                deadline=_parse_deadline(data.get("deadline")),
             )
         except TypeError as e:
             raise CloudEventError(
@@ -112,22 +141,66 @@ class SalesforceFunctionsCloudEvent:  # pylint: disable=too-many-instance-attrib
     time: datetime | None
     sf_context: SalesforceContext
     sf_function_context: SalesforceFunctionContext
+    raw_data: bytes | None = field(default=None, repr=False, compare=False)
+    """The undecoded data payload, if it was sent as the request body."""
+    load_data: Callable[[], Any] | None = field(default=None, repr=False, compare=False)
+    """Decodes the data payload, if its decoding was deferred (in which case `data` is `None`)."""
+
+    def to_invocation_event(self) -> InvocationEvent[Any]:
+        """Create the `InvocationEvent` that's passed to the function, which defers decoding if this does."""
+        return InvocationEvent._with_raw_data(  # pylint: disable=protected-access
+            id=self.id,
+            type=self.type,
+            source=self.source,
+            data=self.data,
+            time=self.time,
+            raw_data=self.raw_data,
+            load_data=self.load_data,
+        )
 
     @classmethod
     def from_http(
-        cls, headers: Headers, body: bytes
+        cls,
+        headers: Mapping[str, str],
+        body: bytes,
+        data_decoder: PayloadDecoder | None = None,
+        *,
+        lazy_data: bool = False,
     ) -> "SalesforceFunctionsCloudEvent":
-        content_type = headers.get("Content-Type", "")
+        """
+        Parse a binary content mode CloudEvent from the given HTTP request headers and body.
+
+        The body is usually JSON, but can also be MessagePack, if the optional `ormsgpack` package
+        is installed. If set, `data_decoder` converts the decoded body into the type expected by the
+        function. The header names in `headers` must be lowercase, or else the mapping must be
+        case-insensitive.
+
+        If `lazy_data` is true (and there's no `data_decoder`), the body isn't decoded, and instead
+        `load_data` is set to a function that decodes it, raising `CloudEventError` if it's invalid.
+        """
+        content_type = headers.get("content-type", "")
 
-        if not content_type.startswith("application/json"):
+        if content_type.startswith(JSON_CONTENT_TYPE):
+            codec = JSON_CODEC
+        elif is_msgpack_content_type(content_type):
+            if MSGPACK_CODEC is None:
+                raise CloudEventError(
+                    f"Content-Type '{content_type}' requires the optional 'ormsgpack' package to be installed"
+                )
+            codec = MSGPACK_CODEC
+        else:
             raise CloudEventError(
-                f"Content-Type must be 'application/json' not '{content_type}'"
+                f"Content-Type must be 'application/json' or 'application/msgpack' not '{content_type}'"
             )
 
-        try:
-            data = orjson.loads(body) if body else None
-        except orjson.JSONDecodeError as e:
-            raise CloudEventError(f"Data payload isn't valid JSON: {e}") from e
+        data = None
+        load_data = None
+        if body and lazy_data and data_decoder is None:
+            load_data = functools.partial(_decode_body, codec, body)
+        else:
+            data = _decode_data(
+                _decode_body(codec, body) if body else None, data_decoder
+            )
 
         try:
             return cls(
@@ -144,10 +217,115 @@ class SalesforceFunctionsCloudEvent:  # pylint: disable=too-many-instance-attrib
                 sf_function_context=SalesforceFunctionContext.from_base64_json(
                     headers["ce-sffncontext"]
                 ),
+                raw_data=body,
+                load_data=load_data,
             )
         except KeyError as e:
             raise CloudEventError(f"Missing required header {e}") from e
 
+    @classmethod
+    def from_json(
+        cls, event: Any, data_decoder: PayloadDecoder | None = None
+    ) -> "SalesforceFunctionsCloudEvent":
+        """
+        Parse a structured content mode CloudEvent, which has already been decoded from JSON.
+
+        In this mode the CloudEvent attributes (including the `sfcontext` and `sffncontext` extensions)
+        are members of the event's JSON object, rather than being sent as HTTP headers.
+        """
+        if not isinstance(event, dict):
+            raise CloudEventError(
+                f"Event must be a JSON object not '{event.__class__.__name__}'"
+            )
+
+        data_content_type = event.get("datacontenttype", "application/json")
+        if not isinstance(data_content_type, str) or not data_content_type.startswith(
+            "application/json"
+        ):
+            raise CloudEventError(
+                f"datacontenttype must be 'application/json' not '{data_content_type}'"
+            )
+
+        try:
+            return cls(
+                id=event["id"],
+                source=event["source"],
+                spec_version=event["specversion"],
+                type=event["type"],
+                data=_decode_data(event.get("data"), data_decoder),
+                data_content_type=data_content_type,
+                data_schema=event.get("dataschema"),
+                subject=event.get("subject"),
+                time=_parse_event_time(event.get("time")),
+                sf_context=SalesforceContext.from_base64_json(event["sfcontext"]),
+                sf_function_context=SalesforceFunctionContext.from_base64_json(
+                    event["sffncontext"]
+                ),
+            )
+        except TypeError as e:
+            raise CloudEventError(f"Event contains unexpected data type: {e}") from e
+        except KeyError as e:
+            raise CloudEventError(f"Missing required attribute {e}") from e
+
+    @classmethod
+    def batch_from_http(
+        cls,
+        headers: Mapping[str, str],
+        body: bytes,
+        data_decoder: PayloadDecoder | None = None,
+    ) -> list["SalesforceFunctionsCloudEvent | CloudEventError"]:
+        """
+        Parse a batch of structured content mode CloudEvents from the given HTTP request headers and body.
+
+        The body is decoded in a single pass. Raises `CloudEventError` if the batch as a whole is invalid,
+        whereas an individual event that's invalid is returned as a `CloudEventError` in its place, so
+        that the rest of the batch can still be invoked.
+        """
+        content_type = headers.get("content-type", "")
+
+        if not content_type.startswith(BATCH_CONTENT_TYPE):
+            raise CloudEventError(
+                f"Content-Type must be '{BATCH_CONTENT_TYPE}' not '{content_type}'"
+            )
+
+        try:
+            events = orjson.loads(body)
+        except orjson.JSONDecodeError as e:
+            raise CloudEventError(f"Batch payload isn't valid JSON: {e}") from e
+
+        if not isinstance(events, list):
+            raise CloudEventError("Batch payload must be a JSON array of events")
+
+        cloudevents: list[SalesforceFunctionsCloudEvent | CloudEventError] = []
+        for event in events:
+            try:
+                cloudevents.append(cls.from_json(event, data_decoder))
+            except CloudEventError as e:
+                cloudevents.append(e)
+
+        return cloudevents
+
+
+def _decode_body(codec: BodyCodec, body: bytes) -> Any:
+    try:
+        return codec.decode(body)
+    except ValueError as e:
+        raise CloudEventError(
+            f"Data payload isn't valid {codec.format_name}: {e}"
+        ) from e
+
+
+def _decode_data(data: Any, data_decoder: PayloadDecoder | None) -> Any:
+    if data_decoder is None:
+        return data
+
+    try:
+        return data_decoder(data)
+    except PayloadDecodeError as e:
+        raise CloudEventError(
+            f"Data payload doesn't match the function's type annotation: {e}"
+        ) from e
+
 
 def _parse_base64_json(base64_json: str) -> Any:
     return orjson.loads(binascii.a2b_base64(base64_json))
@@ -158,18 +336,43 @@ def _parse_event_time(time_string: str | None) -> datetime | None:
         return None
 
     try:
-        # Prior to Python 3.11, the stdlib's `datetime.fromisoformat()` didn't fully support
-        # RFC 3339 format dates, so an external library has to be used instead. This library
-        # is not used on newer Pythons to keep dependencies to a minimum.
-        if sys.version_info < (3, 11):
-            return dateutil.parser.isoparse(
-                time_string
-            )  # pragma: no-cover-python-gte-311
-
-        return datetime.fromisoformat(time_string)  # pragma: no-cover-python-lt-311
+        return _parse_rfc3339_timestamp(time_string)
     except (TypeError, ValueError) as e:
         raise CloudEventError(f"Unable to parse event time: {e}") from e
 
 
+def _parse_deadline(deadline_string: str | None) -> datetime | None:
+    if deadline_string is None:
+        return None
+
+    try:
+        deadline = _parse_rfc3339_timestamp(deadline_string)
+    except (TypeError, ValueError) as e:
+        raise CloudEventError(f"Unable to parse sffncontext deadline: {e}") from e
+
+    # The remaining time budget is calculated by comparing against the current UTC time,
+    # which isn't possible for naive datetimes, so assume any deadline without an offset is UTC.
+    if deadline.tzinfo is None:
+        deadline = deadline.replace(tzinfo=timezone.utc)
+
+    return deadline
+
+
+def _parse_rfc3339_timestamp(timestamp: str) -> datetime:
+    # Prior to Python 3.11, the stdlib's `datetime.fromisoformat()` didn't fully support
+    # RFC 3339 format dates, so an external library has to be used instead. This library
+    # is not used on newer Pythons to keep dependencies to a minimum.
+    if sys.version_info < (3, 11):
+        return dateutil.parser.isoparse(timestamp)  # pragma: no-cover-python-gte-311
+
+    return datetime.fromisoformat(timestamp)  # pragma: no-cover-python-lt-311
+
+
+def sf_context_cache_info() -> tuple[int, int]:
+    """Return the number of hits and misses of the cache used by `SalesforceContext.from_base64_json()`."""
+    cache_info = _parse_sf_context.cache_info()
+    return cache_info.hits, cache_info.misses
+
+
 class CloudEventError(Exception):
     pass
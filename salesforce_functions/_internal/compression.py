@@ -0,0 +1,103 @@
+import asyncio
+import functools
+import gzip
+import importlib
+from typing import Callable, Mapping
+
+from .negotiation import parse_quality_values
+
+Compressor = Callable[[bytes], bytes]
+
+# The content codings that responses can be compressed with, in order of preference for when the
+# client accepts several of them equally. zstd and brotli compress both faster and smaller than gzip,
+# but are only used if the optional `zstandard` and `brotli` packages are installed.
+CONTENT_ENCODINGS = ("zstd", "br", "gzip")
+
+# Compressing a body this large (in bytes) takes long enough that it's run on a thread instead of
+# the event loop, so that it doesn't hold up the worker's other invocations. The compression libraries
+# release the GIL whilst compressing, so this also lets large bodies be compressed in parallel.
+DEFAULT_THREAD_MIN_SIZE = 256 * 1024
+
+
+class ResponseCompressor:
+    """
+    Compresses function invocation response bodies, using the encoding negotiated via `Accept-Encoding`.
+
+    Bodies smaller than `min_size` bytes aren't compressed, since the saving in transfer time would be
+    outweighed by the time spent compressing them. The compression levels used favour speed over ratio,
+    since the responses are compressed on every request rather than once ahead of time.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_size: int,
+        thread_min_size: int = DEFAULT_THREAD_MIN_SIZE,
+        compressors: Mapping[str, Compressor] | None = None,
+    ) -> None:
+        self.min_size = min_size
+        self.thread_min_size = thread_min_size
+        self.compressors = (
+            dict(compressors) if compressors is not None else available_compressors()
+        )
+        self._encodings = tuple(self.compressors)
+
+    def negotiate(self, accept_encoding: str) -> str | None:
+        """Choose the encoding to compress the response with, or `None` if it shouldn't be compressed."""
+        if not accept_encoding:
+            return None
+        return _negotiate(accept_encoding, self._encodings)
+
+    async def compress(self, body: bytes, encoding: str) -> bytes:
+        """Compress `body` using a negotiated encoding, offloading large bodies to a thread."""
+        compress = self.compressors[encoding]
+        if len(body) >= self.thread_min_size:
+            return await asyncio.to_thread(compress, body)
+        return compress(body)
+
+
+def available_compressors() -> dict[str, Compressor]:
+    """Return the compressors for the content codings whose libraries are installed, in order of preference."""
+    compressors: dict[str, Compressor] = {}
+
+    # The optional libraries are imported dynamically, since they don't all provide type hints.
+    try:
+        zstandard = importlib.import_module("zstandard")
+    except ImportError:
+        pass
+    else:
+        # Compressor instances aren't thread-safe, so one is created per call (which is cheap).
+        compressors["zstd"] = lambda body: zstandard.ZstdCompressor(level=3).compress(
+            body
+        )
+
+    try:
+        brotli = importlib.import_module("brotli")
+    except ImportError:
+        pass
+    else:
+        # The default quality (11) is intended for compressing static assets ahead of time.
+        compressors["br"] = lambda body: brotli.compress(body, quality=4)
+
+    compressors["gzip"] = lambda body: gzip.compress(body, compresslevel=6, mtime=0)
+    return compressors
+
+
+@functools.lru_cache(maxsize=64)
+def _negotiate(accept_encoding: str, encodings: tuple[str, ...]) -> str | None:
+    # Clients typically send the same `Accept-Encoding` header with every request, so this is cached.
+    qualities = parse_quality_values(accept_encoding)
+    # `x-gzip` is an alias of `gzip`, as per RFC 9110.
+    if "x-gzip" in qualities:
+        qualities.setdefault("gzip", qualities["x-gzip"])
+
+    wildcard_quality = qualities.get("*", 0.0)
+    chosen_encoding = None
+    chosen_quality = 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, wildcard_quality)
+        if quality > chosen_quality:
+            chosen_encoding = encoding
+            chosen_quality = quality
+
+    return chosen_encoding
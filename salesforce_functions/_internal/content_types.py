@@ -0,0 +1,105 @@
+import functools
+import importlib
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import orjson
+
+from .negotiation import parse_quality_values
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+# The media ranges in an `Accept` header that match JSON, in order of precedence.
+_JSON_MEDIA_RANGES = (JSON_CONTENT_TYPE, "application/*", "*/*")
+
+# `application/x-msgpack` is the unregistered content type that's used by many MessagePack clients.
+_MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, "application/x-msgpack")
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class BodyCodec:
+    """Decodes function invocation request bodies, and encodes response bodies, for a content type."""
+
+    content_type: str
+    """The content type of the encoded bodies, which is used as the response's `Content-Type`."""
+    format_name: str
+    """The human readable name of the format, for use in error messages."""
+    decode: Callable[[bytes], Any]
+    """Decodes a request body, raising a `ValueError` (or a subclass) if it isn't valid."""
+    encode: Callable[[Any], bytes]
+    encode_errors: tuple[type[Exception], ...]
+    """The exceptions raised by `encode` when the content can't be encoded."""
+
+
+JSON_CODEC = BodyCodec(
+    content_type=JSON_CONTENT_TYPE,
+    format_name="JSON",
+    decode=orjson.loads,
+    encode=orjson.dumps,
+    encode_errors=(orjson.JSONEncodeError,),
+)
+
+
+def _load_msgpack_codec() -> BodyCodec | None:
+    # `ormsgpack` is an optional dependency, which is imported dynamically since it's often not installed.
+    # It's from the same author as `orjson`, and so has comparable performance, and the same support for
+    # natively serializing types such as dataclasses (including `QueriedRecord`), datetimes and UUIDs.
+    try:
+        ormsgpack = importlib.import_module("ormsgpack")
+    except ImportError:
+        return None
+
+    # Non-string dict keys (such as integers) are permitted in MessagePack, unlike in JSON.
+    option = ormsgpack.OPT_NON_STR_KEYS
+
+    def encode(content: Any) -> bytes:
+        return ormsgpack.packb(content, option=option)  # type: ignore[no-any-return]
+
+    return BodyCodec(
+        content_type=MSGPACK_CONTENT_TYPE,
+        format_name="MessagePack",
+        decode=ormsgpack.unpackb,
+        encode=encode,
+        encode_errors=(ormsgpack.MsgpackEncodeError,),
+    )
+
+
+# This is `None` if the optional `ormsgpack` package isn't installed.
+MSGPACK_CODEC = _load_msgpack_codec()
+
+# The exceptions raised by any of the codecs when a response body can't be encoded.
+ENCODE_ERRORS = JSON_CODEC.encode_errors + (
+    MSGPACK_CODEC.encode_errors if MSGPACK_CODEC else ()
+)
+
+
+def is_msgpack_content_type(content_type: str) -> bool:
+    return content_type.startswith(_MSGPACK_CONTENT_TYPES)
+
+
+@functools.lru_cache(maxsize=64)
+def negotiate_response_codec(accept: str) -> BodyCodec:
+    """
+    Choose the codec for the response body, based on the request's `Accept` header.
+
+    Responses are encoded using MessagePack if the client explicitly accepts it (and `ormsgpack` is
+    installed), unless it prefers JSON. Otherwise they're encoded using JSON, as they always were.
+    Clients typically send the same `Accept` header with every request, so the result is cached.
+    """
+    if MSGPACK_CODEC is None or not accept:
+        return JSON_CODEC
+
+    qualities = parse_quality_values(accept)
+    msgpack_quality = max(qualities.get(name, 0.0) for name in _MSGPACK_CONTENT_TYPES)
+
+    if msgpack_quality > 0 and msgpack_quality >= json_quality(qualities):
+        return MSGPACK_CODEC
+    return JSON_CODEC
+
+
+def json_quality(qualities: dict[str, float]) -> float:
+    """The quality value given to JSON by the parsed quality values of an `Accept` header."""
+    return next(
+        (qualities[name] for name in _JSON_MEDIA_RANGES if name in qualities), 0.0
+    )
@@ -3,22 +3,45 @@ import inspect
 import sys
 import traceback
 import typing
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Awaitable, Callable
+from typing import Any, AsyncGenerator, Awaitable, Callable
 
 from ..context import Context
 from ..invocation_event import InvocationEvent
+from .payload_decoder import PayloadDecoder, build_payload_decoder
 
 FUNCTION_MODULE_NAME = "main"
 FUNCTION_NAME = "function"
+INIT_HOOK_NAME = "init"
+SHUTDOWN_HOOK_NAME = "shutdown"
+BATCH_FUNCTION_NAME = "batch_function"
 
 Function = Callable[[InvocationEvent[Any], Context], Awaitable[Any]]
+SyncFunction = Callable[[InvocationEvent[Any], Context], Any]
+StreamingFunction = Callable[[InvocationEvent[Any], Context], AsyncGenerator[Any, None]]
+LifecycleHook = Callable[[], Awaitable[Any]]
+BatchFunction = Callable[[list[InvocationEvent[Any]], Context], Awaitable[list[Any]]]
 
 
-def load_function(project_path: Path) -> Function:
+@dataclass(frozen=True, kw_only=True, slots=True)
+class LifecycleHooks:
+    """The optional lifecycle hooks defined alongside the function in `main.py`."""
+
+    init: LifecycleHook | None
+    """Called once per worker process, before it starts handling function invocations."""
+    shutdown: LifecycleHook | None
+    """Called once per worker process, after in-flight invocations have finished during shutdown."""
+
+
+def load_function(project_path: Path) -> Function | SyncFunction | StreamingFunction:
     """
     Load and validate the function inside `main.py` in the specified directory.
 
+    The function can be either an async function, or a synchronous function (which the runtime
+    calls on a thread pool, since otherwise it would block the worker's event loop). It can also
+    be an async generator function, whose yielded items are streamed in the response body.
+
     Uses the approach documented here:
     https://docs.python.org/3/library/importlib.html#importing-a-source-file-directly
     """
@@ -67,10 +90,13 @@ def load_function(project_path: Path) -> Function:
             f"Didn't find a function named '{FUNCTION_NAME}' in {module_filename}."
         )
 
-    if not inspect.iscoroutinefunction(function):
+    # Synchronous generators can't be streamed, since they'd block the event loop between items.
+    if inspect.isgeneratorfunction(function):
         raise LoadFunctionError(
-            f"The function named '{FUNCTION_NAME}' in {module_filename} must be an async function."
-            f" Change the function definition from 'def {FUNCTION_NAME}' to 'async def {FUNCTION_NAME}'."
+            f"The function named '{FUNCTION_NAME}' in {module_filename} must return its result"
+            " rather than being a generator. Replace any 'yield' statements with a 'return' statement,"
+            f" or to stream the results, change the function definition from 'def {FUNCTION_NAME}'"
+            f" to 'async def {FUNCTION_NAME}'."
         )
 
     parameter_count = len(inspect.signature(function).parameters)
@@ -85,5 +111,125 @@ def load_function(project_path: Path) -> Function:
     return function
 
 
+def load_lifecycle_hooks(
+    function: Function | SyncFunction | StreamingFunction,
+) -> LifecycleHooks:
+    """
+    Load and validate the optional `init()` and `shutdown()` hooks from the module of a loaded function.
+
+    The hooks must be async functions that take no arguments. For example:
+
+    ```python
+    async def init():
+        # Load models, build lookup tables, open connection pools, etc.
+
+    async def shutdown():
+        # Clean up anything set up by `init()`.
+    ```
+    """
+    module = sys.modules[function.__module__]
+    hooks: dict[str, LifecycleHook | None] = {}
+
+    for name in (INIT_HOOK_NAME, SHUTDOWN_HOOK_NAME):
+        hook = getattr(module, name, None)
+
+        # Other types of objects with the same name (such as an imported module) aren't hooks.
+        if hook is None or not inspect.isfunction(hook):
+            hooks[name] = None
+            continue
+
+        if not inspect.iscoroutinefunction(hook):
+            raise LoadFunctionError(
+                f"The '{name}' hook in {FUNCTION_MODULE_NAME}.py must be an async function."
+                f" Change the function definition from 'def {name}' to 'async def {name}'."
+            )
+
+        parameter_count = len(inspect.signature(hook).parameters)
+        if parameter_count != 0:
+            raise LoadFunctionError(
+                f"The '{name}' hook in {FUNCTION_MODULE_NAME}.py has the wrong number of"
+                f" parameters (expected 0 but found {parameter_count})."
+            )
+
+        hooks[name] = hook
+
+    return LifecycleHooks(
+        init=hooks[INIT_HOOK_NAME], shutdown=hooks[SHUTDOWN_HOOK_NAME]
+    )
+
+
+def load_batch_function(
+    function: Function | SyncFunction | StreamingFunction,
+) -> BatchFunction | None:
+    """
+    Load and validate the optional `batch_function()` from the module of a loaded function.
+
+    If defined, it's used (instead of calling the function once per event) for batches of events
+    sent using the `application/cloudevents-batch+json` content type. It's passed the events
+    that share the same org and user, and must return a list with one result per event.
+    For example:
+
+    ```python
+    async def batch_function(events: list[InvocationEvent[Any]], context: Context) -> list[Any]:
+        # Handle all of the events at once, such as using a single query.
+    ```
+    """
+    module = sys.modules[function.__module__]
+    batch_function = getattr(module, BATCH_FUNCTION_NAME, None)
+
+    if batch_function is None or not inspect.isfunction(batch_function):
+        return None
+
+    if not inspect.iscoroutinefunction(batch_function):
+        raise LoadFunctionError(
+            f"The function named '{BATCH_FUNCTION_NAME}' in {FUNCTION_MODULE_NAME}.py must be an async"
+            f" function. Change the function definition from 'def {BATCH_FUNCTION_NAME}' to"
+            f" 'async def {BATCH_FUNCTION_NAME}'."
+        )
+
+    parameter_count = len(inspect.signature(batch_function).parameters)
+    expected_parameter_count = len(typing.get_args(BatchFunction)[0])
+
+    if parameter_count != expected_parameter_count:
+        raise LoadFunctionError(
+            f"The function named '{BATCH_FUNCTION_NAME}' in {FUNCTION_MODULE_NAME}.py has the wrong"
+            f" number of parameters (expected {expected_parameter_count} but found {parameter_count})."
+        )
+
+    return typing.cast(BatchFunction, batch_function)
+
+
+def load_payload_decoder(
+    function: Function | SyncFunction | StreamingFunction | BatchFunction,
+) -> PayloadDecoder | None:
+    """
+    Build the decoder for the data payload of the events passed to a loaded function (or `batch_function()`).
+
+    If the function's event parameter is annotated as `InvocationEvent[T]`, where `T` is a dataclass
+    or `TypedDict`, then the payload is converted into (and validated against) `T`. For example:
+
+    ```python
+    @dataclass
+    class Payload:
+        account_name: str
+        contact_emails: list[str]
+
+    async def function(event: InvocationEvent[Payload], context: Context):
+        # `event.data` is an instance of `Payload`.
+    ```
+
+    Returns `None` if the payload should be passed to the function as-is.
+    """
+    name = getattr(function, "__name__", FUNCTION_NAME)
+
+    try:
+        return build_payload_decoder(function)
+    except Exception as e:  # e.g.: NameError, due to an unresolvable forward reference.
+        raise LoadFunctionError(
+            f"Couldn't build a decoder for the event data type of the function named '{name}'"
+            f" in {FUNCTION_MODULE_NAME}.py: {e.__class__.__name__}: {e}"
+        ) from e
+
+
 class LoadFunctionError(Exception):
     """There was an error loading the function or it failed validation."""
@@ -0,0 +1,146 @@
+import math
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from types import CodeType
+
+import structlog
+from structlog.stdlib import BoundLogger
+from structlog.typing import EventDict, WrappedLogger
+
+# Only these (lower severity) log levels are sampled and rate limited, so that warnings and errors
+# are always logged, however many there are.
+_LIMITED_METHOD_NAMES = frozenset(["debug", "info"])
+
+# A call site is identified by the code object and line number of the call to the logger, which
+# (unlike the file name and function name) doesn't need any strings building to look up.
+_CallSiteKey = tuple[CodeType, int]
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class LogLimits:
+    """
+    Limits on the number of info (and debug) log lines each call site can log per invocation.
+
+    These stop functions that log once per record (such as in a loop over the results of a Data API
+    query) from making logging the bottleneck, whilst still logging enough lines to be able to see
+    what the function was doing.
+    """
+
+    sample_rate: float = 1.0
+    """The fraction of lines to log, such as `0.1` to log the first line, and every tenth line after it."""
+    rate_limit: float | None = None
+    """The maximum number of lines logged per second, after an initial burst of this many lines."""
+
+
+@dataclass(slots=True)
+class _CallSite:
+    count: int
+    tokens: float
+    updated: float
+
+
+class InvocationLogLimiter:
+    """Applies `LogLimits` to the log lines of one invocation, counting the lines that are suppressed."""
+
+    def __init__(self, limits: LogLimits) -> None:
+        self.limits = limits
+        self.dropped_by_sampling = 0
+        """The number of lines that weren't logged, since they weren't sampled."""
+        self.dropped_by_rate_limit = 0
+        """The number of lines that weren't logged, since they exceeded the rate limit."""
+        self._call_sites: dict[_CallSiteKey, _CallSite] = {}
+        self._finished = False
+
+    def allow(self, call_site_key: _CallSiteKey) -> bool:
+        """Record a log line from the call site, returning whether it should be logged."""
+        if self._finished:
+            return True
+
+        now = time.monotonic()
+        rate_limit = self.limits.rate_limit
+        # At least one line can always be logged, even if the rate limit is less than 1 per second.
+        burst = max(rate_limit or 0.0, 1.0)
+        call_site = self._call_sites.get(call_site_key)
+        if call_site is None:
+            call_site = _CallSite(count=0, tokens=burst, updated=now)
+            self._call_sites[call_site_key] = call_site
+
+        # Sampling is deterministic, so that the first line from each call site is always logged,
+        # followed by evenly spaced lines after it.
+        index = call_site.count
+        call_site.count += 1
+        sample_rate = self.limits.sample_rate
+        if sample_rate < 1.0 and math.ceil(index * sample_rate) == math.ceil(
+            (index + 1) * sample_rate
+        ):
+            self.dropped_by_sampling += 1
+            return False
+
+        # A token bucket, which is refilled at `rate_limit` tokens per second.
+        if rate_limit is not None:
+            call_site.tokens = min(
+                burst, call_site.tokens + (now - call_site.updated) * rate_limit
+            )
+            call_site.updated = now
+            if call_site.tokens < 1.0:
+                self.dropped_by_rate_limit += 1
+                return False
+            call_site.tokens -= 1.0
+
+        return True
+
+    def finish(self) -> None:
+        """Stop limiting log lines, such as those logged by the invocation's background tasks."""
+        self._finished = True
+
+
+# The limiter of the current invocation. Each invocation is handled in its own task (and so its own
+# context), so this doesn't need resetting.
+_invocation_log_limiter: ContextVar[InvocationLogLimiter | None] = ContextVar(
+    "_invocation_log_limiter", default=None
+)
+
+
+def start_invocation_log_limiter(limits: LogLimits) -> InvocationLogLimiter:
+    """Start limiting the log lines of the current invocation."""
+    log_limiter = InvocationLogLimiter(limits)
+    _invocation_log_limiter.set(log_limiter)
+    return log_limiter
+
+
+def finish_invocation_log_limiter(
+    logger: BoundLogger, log_limiter: InvocationLogLimiter
+) -> None:
+    """Stop limiting the invocation's log lines, and log a summary of any that were suppressed."""
+    log_limiter.finish()
+    if log_limiter.dropped_by_sampling or log_limiter.dropped_by_rate_limit:
+        logger.info(
+            "Suppressed log lines due to log sampling or rate limiting",
+            droppedBySampling=log_limiter.dropped_by_sampling,
+            droppedByRateLimit=log_limiter.dropped_by_rate_limit,
+        )
+
+
+def limit_log_lines(
+    _logger: WrappedLogger, method_name: str, event_dict: EventDict
+) -> EventDict:
+    """
+    A structlog processor that drops log lines that exceed the current invocation's `LogLimits`.
+
+    This must be the first processor, so that no time is spent processing lines that are dropped.
+    """
+    if method_name in _LIMITED_METHOD_NAMES:
+        log_limiter = _invocation_log_limiter.get()
+        if log_limiter and not log_limiter.allow(_find_call_site_key()):
+            raise structlog.DropEvent
+    return event_dict
+
+
+def _find_call_site_key() -> _CallSiteKey:
+    # Skips the frames of this module and of structlog, to find the frame that called the logger.
+    frame = sys._getframe(2)  # pylint: disable=protected-access
+    while frame.f_back and frame.f_globals.get("__name__", "").startswith("structlog"):
+        frame = frame.f_back
+    return frame.f_code, frame.f_lineno
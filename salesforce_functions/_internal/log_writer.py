@@ -0,0 +1,176 @@
+import os
+import sys
+import threading
+import weakref
+from collections import deque
+from typing import Callable, Literal, TextIO
+
+# What to do with a log line when the queue is full:
+# - `block`: wait for the writer thread to make room (so no lines are lost, but logging can stall).
+# - `drop-newest`: drop the line being logged.
+# - `drop-oldest`: drop the line that has been queued the longest, to make room for the new line.
+OverflowPolicy = Literal["block", "drop-newest", "drop-oldest"]
+
+
+class QueuedLogWriter:  # pylint: disable=too-many-instance-attributes
+    """
+    Writes log lines to a file (by default stdout) from a background thread, rather than the caller's.
+
+    Writing to stdout blocks once the pipe to the log drain is full, which when logging from the
+    event loop would stall every invocation being handled by the worker. Instead, lines are added
+    to a queue of at most `max_queued` lines, which the writer thread writes out in batches (so
+    that a burst of lines costs one write and flush, rather than one per line).
+
+    Once the queue is full, lines are handled according to `overflow_policy`. Dropped lines are
+    counted in `dropped`, and are reported by a warning line written after the next batch, and by
+    calling `on_dropped` (if set, from the writer thread) with the number of lines dropped.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_queued: int,
+        overflow_policy: OverflowPolicy,
+        file: TextIO | None = None,
+        on_dropped: Callable[[int], None] | None = None,
+    ) -> None:
+        self.max_queued = max_queued
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        """The total number of lines dropped, since the queue was full."""
+        self.on_dropped = on_dropped
+        """Called with the number of lines dropped, which can be set once the writer has started."""
+        self._file = file or sys.stdout
+        self._lines: deque[str] = deque()
+        self._unreported_dropped = 0
+        self._writing = False
+        self._closing = False
+        self._closed = False
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+        self._idle = threading.Condition(lock)
+        self._thread = threading.Thread(
+            target=self._run, name="sf-functions-log-writer", daemon=True
+        )
+        self._thread.start()
+
+        if hasattr(os, "register_at_fork"):
+            # Only the forking thread exists in a forked process (such as the worker processes of the
+            # CLI's `--preload` mode, which configures logging before loading the function), so the
+            # writer thread has to be restarted there. A weak reference is used, since fork handlers
+            # can't be unregistered.
+            writer_ref = weakref.ref(self)
+
+            def after_fork_in_child() -> None:
+                writer = writer_ref()
+                if writer:
+                    writer._restart_after_fork()  # pylint: disable=protected-access
+
+            os.register_at_fork(after_in_child=after_fork_in_child)
+
+    @property
+    def queued(self) -> int:
+        """The number of lines waiting to be written."""
+        return len(self._lines)
+
+    def write(self, line: str) -> None:
+        """Queue a line (which mustn't include the trailing newline) to be written."""
+        with self._not_empty:
+            if len(self._lines) >= self.max_queued:
+                if self.overflow_policy == "block":
+                    while len(self._lines) >= self.max_queued and not self._closed:
+                        self._not_full.wait()
+                elif self.overflow_policy == "drop-newest":
+                    self._count_dropped()
+                    return
+                else:
+                    self._lines.popleft()
+                    self._count_dropped()
+
+            if self._closed:
+                # Lines logged once the writer has been closed (such as during interpreter shutdown)
+                # are written directly, rather than being lost.
+                self._write_batch([line], 0)
+                return
+
+            self._lines.append(line)
+            self._not_empty.notify()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until all queued lines have been written, returning `False` if `timeout` is reached."""
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: self._closed or not (self._lines or self._writing), timeout
+            )
+
+    def close(self, timeout: float | None = None) -> bool:
+        """
+        Write any queued lines and stop the writer thread, returning `False` if `timeout` is reached.
+
+        Any lines written after the writer is closed are written directly, from the caller's thread.
+        """
+        with self._not_empty:
+            self._closing = True
+            self._not_empty.notify()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _restart_after_fork(self) -> None:
+        # Lines queued before the fork are written by the parent process's writer thread. The lock is
+        # replaced, since it may have been held by the writer thread at the time of the fork.
+        self._lines.clear()
+        self._unreported_dropped = 0
+        self._writing = False
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+        self._idle = threading.Condition(lock)
+        if not (self._closing or self._closed):
+            self._thread = threading.Thread(
+                target=self._run, name="sf-functions-log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _count_dropped(self) -> None:
+        self.dropped += 1
+        self._unreported_dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._not_empty:
+                self._not_empty.wait_for(
+                    lambda: self._lines or self._unreported_dropped or self._closing
+                )
+                if self._closing and not (self._lines or self._unreported_dropped):
+                    self._closed = True
+                    self._not_full.notify_all()
+                    self._idle.notify_all()
+                    return
+                lines = list(self._lines)
+                self._lines.clear()
+                dropped = self._unreported_dropped
+                self._unreported_dropped = 0
+                self._writing = True
+                self._not_full.notify_all()
+
+            self._write_batch(lines, dropped)
+            if dropped and self.on_dropped:
+                self.on_dropped(dropped)
+
+            with self._idle:
+                self._writing = False
+                self._idle.notify_all()
+
+    def _write_batch(self, lines: list[str], dropped: int) -> None:
+        if dropped:
+            lines.append(
+                f'level=warning msg="Dropped log lines since the log queue was full"'
+                f" droppedLines={dropped}"
+            )
+        try:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+        except (OSError, ValueError):
+            # Such as if stdout has been closed. There's nowhere left to report the error to.
+            pass
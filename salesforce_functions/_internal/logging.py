@@ -1,36 +1,98 @@
 import logging
+from typing import Any
 
 import structlog
+from structlog.typing import EventDict, Processor, WrappedLogger
 
+from .log_limiter import LogLimits, limit_log_lines
+from .log_writer import QueuedLogWriter
 
-def configure_logging() -> None:
+
+def configure_logging(
+    log_writer: QueuedLogWriter | None = None, log_limits: LogLimits | None = None
+) -> None:
     """
     Configure structlog to output logs in logfmt format, using options recommended for best performance.
 
+    If a `log_writer` is passed, log lines are still rendered by the caller, but are then written by
+    the log writer's background thread, rather than being written to stdout by the caller.
+
+    If `log_limits` are passed, info (and debug) log lines that exceed the limits are dropped. The
+    limits only apply once an invocation has started a limiter using `start_invocation_log_limiter()`.
+
     https://www.brandur.org/logfmt
     https://www.structlog.org/en/stable/performance.html
     """
-    structlog.configure(
-        processors=[
-            # Adds any log attributes bound to the request context (such as `invocationId`).
-            structlog.contextvars.merge_contextvars,
-            # Adds the log event level as `level={info,warning,...}`.
-            structlog.processors.add_log_level,
-            # Override the default structlog message key name of `event`.
-            structlog.processors.EventRenamer("msg"),
+    processors: list[Processor] = [limit_log_lines] if log_limits else []
+    processors += [
+        # Adds any log attributes bound to the request context (such as `invocationId`).
+        structlog.contextvars.merge_contextvars,
+        # Adds the log event level as `level={info,warning,...}`.
+        structlog.processors.add_log_level,
+        # Override the default structlog message key name of `event`.
+        structlog.processors.EventRenamer("msg"),
+    ]
+    logger_factory: Any
+
+    if log_writer:
+        processors += [
+            # Exceptions are output prior to the log line in the same way as below, but are queued
+            # as part of the log line, so that lines logged concurrently can't end up between them.
+            structlog.processors.format_exc_info,
+            _render_with_exception,
+        ]
+        logger_factory = _QueuedLoggerFactory(log_writer)
+    else:
+        processors += [
             # Pretty print any exceptions prior to the logfmt log line referencing the exception.
             # The output is not in logfmt style, but makes the exception much easier to read than
             # trying to newline escape it and output it under an attribute on the log line itself.
             structlog.processors.ExceptionPrettyPrinter(),
             structlog.processors.LogfmtRenderer(),
-        ],
+        ]
+        logger_factory = structlog.WriteLoggerFactory()
+
+    structlog.configure(
+        processors=processors,
         # Only output log level info and above.
         wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
-        logger_factory=structlog.WriteLoggerFactory(),
+        logger_factory=logger_factory,
         cache_logger_on_first_use=True,
     )
 
 
+_logfmt_renderer = structlog.processors.LogfmtRenderer()
+
+
+def _render_with_exception(
+    logger: WrappedLogger, method_name: str, event_dict: EventDict
+) -> str:
+    exception = event_dict.pop("exception", None)
+    line = _logfmt_renderer(logger, method_name, event_dict)
+    return f"{exception}\n{line}" if exception else line
+
+
+class _QueuedLogger:  # pylint: disable=too-few-public-methods
+    """A structlog logger that hands the rendered log lines to a `QueuedLogWriter`."""
+
+    def __init__(self, log_writer: QueuedLogWriter) -> None:
+        self._write = log_writer.write
+
+    def msg(self, message: str) -> None:
+        self._write(message)
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class _QueuedLoggerFactory:  # pylint: disable=too-few-public-methods
+    def __init__(self, log_writer: QueuedLogWriter) -> None:
+        self._log_writer = log_writer
+
+    def __call__(self, *_args: Any) -> _QueuedLogger:
+        return _QueuedLogger(self._log_writer)
+
+
 def get_logger() -> structlog.stdlib.BoundLogger:
     """
     Create a logger instance that outputs logs in logfmt style.
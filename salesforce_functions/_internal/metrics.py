@@ -0,0 +1,431 @@
+import bisect
+import mmap
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, MutableSequence, Sequence, cast
+
+from .admission import AdmissionController
+from .compression import CONTENT_ENCODINGS
+from .timings import InvocationTimings
+
+if TYPE_CHECKING:
+    # Imported only for type checking, since it imports the Data API (and so `aiohttp`).
+    from .thread_pool import FunctionThreadPool
+
+# Bucket upper bounds for histograms of durations, in seconds. These range from the sub-millisecond
+# durations of CloudEvent parsing/serialization, up to the longest permitted function executions.
+DURATION_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+# Bucket upper bounds for histograms of HTTP body sizes, in bytes.
+SIZE_BUCKETS = (
+    256.0,
+    1024.0,
+    4096.0,
+    16384.0,
+    65536.0,
+    262144.0,
+    1048576.0,
+    4194304.0,
+    16777216.0,
+)
+
+_METRICS_FILE_SUFFIX = ".metrics"
+_VALUE_SIZE = 8
+
+
+class MetricsRegistry:
+    """
+    A minimal Prometheus-compatible metrics registry, which supports aggregation across worker processes.
+
+    Every metric value is stored in a flat array of doubles. If a `directory` is passed to `open()`,
+    that array is backed by a memory-mapped file in that directory that's unique to the current
+    process. Rendering the metrics then sums the arrays of every file in the directory, so that a
+    scrape that's handled by any one worker returns totals for all workers that share the directory.
+
+    Metrics must all be defined before `open()` is called, since that fixes the array layout.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: list["_Metric"] = []
+        self._size = 0
+        self._directory: Path | None = None
+        self._mmap: mmap.mmap | None = None
+        self._is_open = False
+        self._view = memoryview(bytearray()).cast("d")
+        self.values = _as_doubles(self._view)
+
+    def _allocate(self, metric: "_Metric", size: int) -> int:
+        if self._is_open:
+            raise RuntimeError("Metrics can't be defined once the registry is open.")
+        offset = self._size
+        self._size += size
+        self._metrics.append(metric)
+        return offset
+
+    def open(self, directory: Path | None) -> None:
+        """Allocate the storage for the metric values, optionally backed by a file in `directory`."""
+        size_in_bytes = self._size * _VALUE_SIZE
+        self._is_open = True
+
+        if directory is None:
+            self._set_view(memoryview(bytearray(size_in_bytes)).cast("d"))
+            return
+
+        self._directory = directory
+        path = directory.joinpath(f"worker-{os.getpid()}{_METRICS_FILE_SUFFIX}")
+
+        # If the file already exists (from an earlier worker that had the same PID), its counter
+        # values are kept, so that the totals across all workers remain monotonically increasing.
+        file_descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(file_descriptor).st_size != size_in_bytes:
+                os.ftruncate(file_descriptor, 0)
+                os.ftruncate(file_descriptor, size_in_bytes)
+            self._mmap = mmap.mmap(file_descriptor, size_in_bytes)
+        finally:
+            os.close(file_descriptor)
+
+        self._set_view(memoryview(self._mmap).cast("d"))
+        self._reset_gauges()
+
+    def close(self) -> None:
+        """
+        Release the storage for the metric values.
+
+        Gauges are reset first, since they represent the current state of this worker, which
+        should no longer count towards the totals of any workers that remain running. Any values
+        recorded after this (such as by an invocation that outlived the server) are discarded.
+        """
+        self._reset_gauges()
+        # The view must be released before the memory map it refers to can be closed.
+        self._view.release()
+        self._set_view(memoryview(bytearray(self._size * _VALUE_SIZE)).cast("d"))
+        self._directory = None
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _set_view(self, view: memoryview) -> None:
+        self._view = view
+        self.values = _as_doubles(view)
+
+    def _reset_gauges(self) -> None:
+        for metric in self._metrics:
+            if isinstance(metric, Gauge):
+                self.values[metric.offset] = 0.0
+
+    def render(self) -> str:
+        """Render the metrics (summed across all workers) in the Prometheus text exposition format."""
+        totals = self._collect()
+        lines: list[str] = []
+
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render(totals))
+
+        return "\n".join(lines) + "\n"
+
+    def _collect(self) -> list[float]:
+        if self._directory is None:
+            return list(self.values)
+
+        totals = [0.0] * self._size
+        for path in self._directory.glob(f"*{_METRICS_FILE_SUFFIX}"):
+            try:
+                data = path.read_bytes()
+            except OSError:  # pragma: no cover
+                # The file was removed between listing the directory and reading it.
+                continue
+
+            # Skip files from workers using a different version of the runtime.
+            if len(data) != self._size * _VALUE_SIZE:
+                continue
+
+            for index, value in enumerate(_as_doubles(memoryview(data).cast("d"))):
+                totals[index] += value
+
+        return totals
+
+
+def _as_doubles(view: memoryview) -> MutableSequence[float]:
+    # Typeshed types the items of all memoryviews as `int`, regardless of their format.
+    return cast(MutableSequence[float], view)
+
+
+class _Metric:  # pylint: disable=too-few-public-methods
+    type = ""
+
+    def __init__(
+        self, registry: MetricsRegistry, name: str, documentation: str, size: int
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._registry = registry
+        self.offset = registry._allocate(self, size)
+
+    def render(self, totals: Sequence[float]) -> list[str]:
+        raise NotImplementedError  # pragma: no cover
+
+
+class Counter(_Metric):
+    """A monotonically increasing value, with one value per label value."""
+
+    type = "counter"
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        name: str,
+        documentation: str,
+        *,
+        label_name: str,
+        label_values: Iterable[str],
+    ) -> None:
+        label_values = list(label_values)
+        super().__init__(registry, name, documentation, len(label_values))
+        self._label_name = label_name
+        self._label_offsets = {
+            label_value: self.offset + index
+            for index, label_value in enumerate(label_values)
+        }
+
+    def inc(self, label_value: str, amount: float = 1.0) -> None:
+        self._registry.values[self._label_offsets[label_value]] += amount
+
+    def render(self, totals: Sequence[float]) -> list[str]:
+        return [
+            f'{self.name}{{{self._label_name}="{label_value}"}} {_format_value(totals[offset])}'
+            for label_value, offset in self._label_offsets.items()
+        ]
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, such as the number of in-flight invocations."""
+
+    type = "gauge"
+
+    def __init__(
+        self, registry: MetricsRegistry, name: str, documentation: str
+    ) -> None:
+        super().__init__(registry, name, documentation, 1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._registry.values[self.offset] += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._registry.values[self.offset] -= amount
+
+    def set(self, value: float) -> None:
+        self._registry.values[self.offset] = value
+
+    def render(self, totals: Sequence[float]) -> list[str]:
+        return [f"{self.name} {_format_value(totals[self.offset])}"]
+
+
+class Histogram(_Metric):
+    """Counts observations (such as durations) in configurable buckets, along with their sum."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        name: str,
+        documentation: str,
+        *,
+        buckets: Sequence[float],
+    ) -> None:
+        # Layout: one (non-cumulative) count per bucket, then the `+Inf` bucket, then the sum.
+        super().__init__(registry, name, documentation, len(buckets) + 2)
+        self._buckets = tuple(buckets)
+        self._sum_offset = self.offset + len(buckets) + 1
+
+    def observe(self, value: float) -> None:
+        values = self._registry.values
+        values[self.offset + bisect.bisect_left(self._buckets, value)] += 1
+        values[self._sum_offset] += value
+
+    def observe_ns(self, duration_ns: int) -> None:
+        """Record a duration given in nanoseconds, which is converted to seconds."""
+        self.observe(duration_ns / 1_000_000_000)
+
+    def render(self, totals: Sequence[float]) -> list[str]:
+        lines: list[str] = []
+        cumulative_count = 0.0
+
+        for index, upper_bound in enumerate(self._buckets):
+            cumulative_count += totals[self.offset + index]
+            lines.append(
+                f'{self.name}_bucket{{le="{upper_bound!r}"}} {_format_value(cumulative_count)}'
+            )
+
+        cumulative_count += totals[self.offset + len(self._buckets)]
+        lines.append(
+            f'{self.name}_bucket{{le="+Inf"}} {_format_value(cumulative_count)}'
+        )
+        lines.append(f"{self.name}_sum {_format_value(totals[self._sum_offset])}")
+        lines.append(f"{self.name}_count {_format_value(cumulative_count)}")
+        return lines
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class RuntimeMetrics:  # pylint: disable=too-many-instance-attributes
+    """The metrics recorded by the function runtime."""
+
+    def __init__(self, *, status_codes: Iterable[int]) -> None:
+        self.registry = MetricsRegistry()
+        self.invocations = Counter(
+            self.registry,
+            "sf_functions_invocations_total",
+            "The number of function invocation requests, by response status code.",
+            label_name="status_code",
+            label_values=[str(status_code) for status_code in status_codes],
+        )
+        self.in_flight_invocations = Gauge(
+            self.registry,
+            "sf_functions_in_flight_invocations",
+            "The number of function invocations currently executing.",
+        )
+        self.queued_invocations = Gauge(
+            self.registry,
+            "sf_functions_queued_invocations",
+            "The number of function invocations currently waiting for an execution slot.",
+        )
+        self.thread_pool_size = Gauge(
+            self.registry,
+            "sf_functions_thread_pool_size",
+            "The number of threads available for running synchronous functions.",
+        )
+        self.thread_pool_busy_threads = Gauge(
+            self.registry,
+            "sf_functions_thread_pool_busy_threads",
+            "The number of threads currently running a synchronous function.",
+        )
+        self.thread_pool_queued_calls = Gauge(
+            self.registry,
+            "sf_functions_thread_pool_queued_calls",
+            "The number of synchronous function calls currently waiting for a thread.",
+        )
+        self.cloudevent_parse_duration = Histogram(
+            self.registry,
+            "sf_functions_cloudevent_parse_duration_seconds",
+            "Time spent parsing the CloudEvent of a function invocation request.",
+            buckets=DURATION_BUCKETS,
+        )
+        self.function_execution_duration = Histogram(
+            self.registry,
+            "sf_functions_function_execution_duration_seconds",
+            "Time spent executing the function.",
+            buckets=DURATION_BUCKETS,
+        )
+        self.response_serialization_duration = Histogram(
+            self.registry,
+            "sf_functions_response_serialization_duration_seconds",
+            "Time spent serializing the function invocation response.",
+            buckets=DURATION_BUCKETS,
+        )
+        self.data_api_request_duration = Histogram(
+            self.registry,
+            "sf_functions_data_api_request_duration_seconds",
+            "Time spent waiting for Data API requests made by the function.",
+            buckets=DURATION_BUCKETS,
+        )
+        self.request_size = Histogram(
+            self.registry,
+            "sf_functions_request_size_bytes",
+            "The size of function invocation request bodies.",
+            buckets=SIZE_BUCKETS,
+        )
+        self.response_size = Histogram(
+            self.registry,
+            "sf_functions_response_size_bytes",
+            "The size of function invocation response bodies, before any compression.",
+            buckets=SIZE_BUCKETS,
+        )
+        self.compressed_responses = Counter(
+            self.registry,
+            "sf_functions_compressed_responses_total",
+            "The number of function invocation responses that were compressed, by content encoding.",
+            label_name="encoding",
+            label_values=CONTENT_ENCODINGS,
+        )
+        self.response_compression_duration = Histogram(
+            self.registry,
+            "sf_functions_response_compression_duration_seconds",
+            "Time spent compressing function invocation response bodies.",
+            buckets=DURATION_BUCKETS,
+        )
+
+        self.sf_context_cache_lookups = Counter(
+            self.registry,
+            "sf_functions_sfcontext_cache_lookups_total",
+            "The number of lookups of parsed sfcontext CloudEvent extensions in the cache, by result.",
+            label_name="result",
+            label_values=["hit", "miss"],
+        )
+        # The cache's totals when the counters were last updated, which the counters are incremented
+        # by the change in (rather than set to), since they may continue the counts of a previous worker.
+        self._reported_sf_context_cache_info = (0, 0)
+        self.log_lines_dropped = Counter(
+            self.registry,
+            "sf_functions_log_lines_dropped_total",
+            "The number of log lines dropped since the log queue was full, by overflow policy.",
+            label_name="policy",
+            label_values=["drop-newest", "drop-oldest"],
+        )
+
+    def make_data_api_observer(
+        self, timings: InvocationTimings
+    ) -> Callable[[int], None]:
+        """Create the callback that records the duration of each Data API request made by an invocation."""
+
+        def observe_data_api_request(duration_ns: int) -> None:
+            timings.add_data_api_request(duration_ns)
+            self.data_api_request_duration.observe_ns(duration_ns)
+
+        return observe_data_api_request
+
+    def update_sf_context_cache_counters(self, hits: int, misses: int) -> None:
+        """Update the sfcontext cache counters, from the totals returned by `sf_context_cache_info()`."""
+        reported_hits, reported_misses = self._reported_sf_context_cache_info
+        self.sf_context_cache_lookups.inc("hit", hits - reported_hits)
+        self.sf_context_cache_lookups.inc("miss", misses - reported_misses)
+        self._reported_sf_context_cache_info = (hits, misses)
+
+    def update_admission_gauges(
+        self, admission_controller: AdmissionController
+    ) -> None:
+        """Update the in-flight/queued invocation gauges, for use as `AdmissionController`'s `on_change`."""
+        self.in_flight_invocations.set(admission_controller.in_flight)
+        self.queued_invocations.set(admission_controller.queued)
+
+    def update_thread_pool_gauges(self, thread_pool: "FunctionThreadPool") -> None:
+        """Update the thread pool gauges, for use as `FunctionThreadPool`'s `on_change`."""
+        self.thread_pool_size.set(thread_pool.max_workers)
+        self.thread_pool_busy_threads.set(thread_pool.busy)
+        self.thread_pool_queued_calls.set(thread_pool.queued)
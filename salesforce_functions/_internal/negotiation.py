@@ -0,0 +1,25 @@
+def parse_quality_values(header_value: str) -> dict[str, float]:
+    """
+    Parse a content negotiation header (such as `Accept` or `Accept-Encoding`) into its quality values.
+
+    The names are lowercased, and the first occurrence of a name wins. Values without a `q` parameter
+    have a quality of 1, whereas invalid `q` parameters are treated as 0 (not acceptable).
+    """
+    qualities: dict[str, float] = {}
+    for item in header_value.split(","):
+        name, _, parameters = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities.setdefault(name, quality)
+
+    return qualities
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import aiohttp
+
+from ..context import Org, User
+from ..data_api import DataAPI
+from .cloud_event import SalesforceUserContext
+
+# The maximum number of org/user combinations for which an `Org` instance is cached per worker.
+ORG_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class _CacheEntry:
+    user_context: SalesforceUserContext
+    access_token: str
+    org: Org
+
+
+class OrgCache:
+    """
+    A per-worker cache of the `Org` instances (and their `User` and `DataAPI`) passed to the function.
+
+    Consecutive invocations from the same org and user otherwise construct identical objects each
+    time. Entries are keyed on the org and user IDs, and are replaced whenever the access token (or
+    any other attribute of the user context) changes. Once the cache is full, the least recently
+    used entry is evicted.
+    """
+
+    def __init__(
+        self,
+        *,
+        api_version: str,
+        session: aiohttp.ClientSession | None,
+        max_size: int = ORG_CACHE_SIZE,
+    ) -> None:
+        self._api_version = api_version
+        self._session = session
+        self._max_size = max_size
+        self._entries: OrderedDict[tuple[str, str], _CacheEntry] = OrderedDict()
+
+    def get_org(self, user_context: SalesforceUserContext, access_token: str) -> Org:
+        """Return the cached `Org` for the given user context and access token, creating it if needed."""
+        key = (user_context.org_id, user_context.user_id)
+        entry = self._entries.get(key)
+
+        if (
+            entry is not None
+            and entry.access_token == access_token
+            and entry.user_context == user_context
+        ):
+            self._entries.move_to_end(key)
+            return entry.org
+
+        org = Org(
+            id=user_context.org_id,
+            base_url=user_context.salesforce_base_url,
+            domain_url=user_context.org_domain_url,
+            data_api=DataAPI(
+                org_domain_url=user_context.org_domain_url,
+                api_version=self._api_version,
+                access_token=access_token,
+                session=self._session,
+            ),
+            user=User(
+                id=user_context.user_id,
+                username=user_context.username,
+                on_behalf_of_user_id=user_context.on_behalf_of_user_id,
+            ),
+        )
+
+        # Replaces any existing entry for this org and user, such as one with an outdated access token.
+        self._entries[key] = _CacheEntry(
+            user_context=user_context, access_token=access_token, org=org
+        )
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+        return org
+
+    def __len__(self) -> int:
+        return len(self._entries)
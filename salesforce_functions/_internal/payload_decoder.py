@@ -0,0 +1,350 @@
+import dataclasses
+import enum
+import inspect
+import types
+import typing
+from typing import Any, Callable, Literal, Union
+
+from ..invocation_event import InvocationEvent
+
+# Converts the decoded JSON (or MessagePack) of an event's data payload into the type that the
+# function expects, raising `PayloadDecodeError` if the payload doesn't match that type.
+PayloadDecoder = Callable[[Any], Any]
+
+# The decoder of a value nested inside the payload.
+_Decoder = Callable[[Any], Any]
+
+_PRIMITIVE_TYPE_NAMES: dict[type, str] = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    bytes: "bytes",
+    type(None): "null",
+    list: "array",
+    dict: "object",
+}
+
+
+class PayloadDecodeError(ValueError):
+    """The event's data payload doesn't match the type that the function expects."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        # The path to the invalid value (such as `.contacts[0].email`), which is built up in reverse
+        # as the error propagates through the decoders of the enclosing values. This means the path
+        # only has to be tracked once decoding has failed, rather than for every value decoded.
+        self.reversed_path: list[str] = []
+
+    def __str__(self) -> str:
+        return f"{self.reason} at data{''.join(reversed(self.reversed_path))}"
+
+
+def build_payload_decoder(function: Callable[..., Any]) -> PayloadDecoder | None:
+    """
+    Build a decoder for the data payload of the events passed to `function`, from its type annotations.
+
+    Decoders are only built if the first parameter is annotated as `InvocationEvent[T]` (or, for the
+    `batch_function()`, `list[InvocationEvent[T]]`), where `T` is a dataclass or `TypedDict` (or a list
+    of them). The decoder then converts the payload into instances of `T` (recursively converting any
+    nested dataclasses and `TypedDict`s), validating that the payload matches the annotated types.
+
+    The decoder is compiled ahead of time into a tree of closures (one per annotated type), so that
+    decoding a payload doesn't need to inspect any type annotations. Values whose annotated types
+    can't be checked (such as arbitrary classes) are passed through as-is.
+
+    Returns `None` if no decoder is needed, in which case the payload is passed to the function as-is.
+    """
+    payload_type = _get_payload_type(function)
+    if payload_type is None or not _contains_structured_type(payload_type):
+        return None
+
+    return _compile(payload_type, {})
+
+
+def _get_payload_type(function: Callable[..., Any]) -> Any:
+    parameters = list(inspect.signature(function).parameters)
+    if not parameters:
+        return None
+
+    try:
+        # This also resolves annotations that are strings (such as when using `from __future__ import annotations`).
+        annotation = typing.get_type_hints(function).get(parameters[0])
+    except Exception:  # pylint: disable=broad-except
+        # For example, annotations that reference names only imported when `TYPE_CHECKING`.
+        return None
+
+    # The `batch_function()` is passed a list of events.
+    if typing.get_origin(annotation) is list:
+        (annotation,) = typing.get_args(annotation) or (None,)
+
+    if typing.get_origin(annotation) is not InvocationEvent:
+        return None
+
+    (payload_type,) = typing.get_args(annotation)
+    return payload_type
+
+
+def _contains_structured_type(annotation: Any) -> bool:
+    if dataclasses.is_dataclass(annotation) or typing.is_typeddict(annotation):
+        return True
+    return any(_contains_structured_type(arg) for arg in typing.get_args(annotation))
+
+
+def _compile(  # pylint: disable=too-many-return-statements
+    annotation: Any, compiled: dict[Any, _Decoder]
+) -> _Decoder:
+    """Compile the decoder for an annotated type, reusing any already compiled in `compiled`."""
+    if annotation in compiled:
+        return compiled[annotation]
+
+    if dataclasses.is_dataclass(annotation) and isinstance(annotation, type):
+        return _compile_dataclass(annotation, compiled)
+
+    if typing.is_typeddict(annotation):
+        return _compile_typeddict(annotation, compiled)
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is list and args:
+        return _compile_list(_compile(args[0], compiled))
+
+    if origin is dict and len(args) == 2:
+        return _compile_dict(_compile(args[1], compiled))
+
+    if origin in (Union, types.UnionType):
+        return _compile_union(annotation, compiled)
+
+    if origin is Literal:
+        return _compile_literal(args)
+
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return _compile_enum(annotation)
+
+    if annotation in (list, dict) or origin in (list, dict):
+        return _compile_instance_check(origin or annotation)
+
+    if annotation is float:
+        return _decode_float
+
+    if annotation is int:
+        return _decode_int
+
+    if annotation in (str, bool, bytes, type(None), None):
+        return _compile_instance_check(type(None) if annotation is None else annotation)
+
+    # Any other types (such as `Any`, or arbitrary classes) can't be produced by decoding JSON,
+    # so are passed through without validation.
+    return _decode_any
+
+
+def _compile_dataclass(cls: type, compiled: dict[Any, _Decoder]) -> _Decoder:
+    field_decoders: list[tuple[str, _Decoder]] = []
+    required_fields: list[str] = []
+
+    def decode_dataclass(value: Any) -> Any:
+        if not isinstance(value, dict):
+            raise _type_error(cls.__name__, value)
+
+        for name in required_fields:
+            if name not in value:
+                raise PayloadDecodeError(f"Missing required field '{name}'")
+
+        # Unknown fields are ignored, so that new fields can be added to the payload before the
+        # function is updated to use them.
+        kwargs = {}
+        name = ""
+        try:
+            for name, decode in field_decoders:
+                if name in value:
+                    kwargs[name] = decode(value[name])
+        except PayloadDecodeError as e:
+            e.reversed_path.append(f".{name}")
+            raise
+
+        try:
+            return cls(**kwargs)
+        except (TypeError, ValueError) as e:
+            # Such as validation performed by the dataclass's `__post_init__()`.
+            raise PayloadDecodeError(f"Invalid {cls.__name__}: {e}") from e
+
+    # Registered before compiling the fields, so that recursive types refer back to this decoder.
+    compiled[cls] = decode_dataclass
+    type_hints = typing.get_type_hints(cls)
+
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            continue
+        field_decoders.append((field.name, _compile(type_hints[field.name], compiled)))
+        if (
+            field.default is dataclasses.MISSING
+            and field.default_factory is dataclasses.MISSING
+        ):
+            required_fields.append(field.name)
+
+    return decode_dataclass
+
+
+def _compile_typeddict(cls: type, compiled: dict[Any, _Decoder]) -> _Decoder:
+    field_decoders: list[tuple[str, _Decoder]] = []
+    required_keys: frozenset[str] = getattr(cls, "__required_keys__")
+
+    def decode_typeddict(value: Any) -> Any:
+        if not isinstance(value, dict):
+            raise _type_error(cls.__name__, value)
+
+        for name in required_keys:
+            if name not in value:
+                raise PayloadDecodeError(f"Missing required field '{name}'")
+
+        # Like dataclasses, unknown keys are ignored (and are left out of the result).
+        result = {}
+        name = ""
+        try:
+            for name, decode in field_decoders:
+                if name in value:
+                    result[name] = decode(value[name])
+        except PayloadDecodeError as e:
+            e.reversed_path.append(f".{name}")
+            raise
+
+        return result
+
+    compiled[cls] = decode_typeddict
+    for name, annotation in typing.get_type_hints(cls).items():
+        field_decoders.append((name, _compile(annotation, compiled)))
+
+    return decode_typeddict
+
+
+def _compile_list(decode_item: _Decoder) -> _Decoder:
+    def decode_list(value: Any) -> Any:
+        if not isinstance(value, list):
+            raise _type_error("array", value)
+
+        index = 0
+        try:
+            result = []
+            for index, item in enumerate(value):
+                result.append(decode_item(item))
+            return result
+        except PayloadDecodeError as e:
+            e.reversed_path.append(f"[{index}]")
+            raise
+
+    return decode_list
+
+
+def _compile_dict(decode_value: _Decoder) -> _Decoder:
+    def decode_dict(value: Any) -> Any:
+        if not isinstance(value, dict):
+            raise _type_error("object", value)
+
+        key = ""
+        try:
+            result = {}
+            for key, item in value.items():
+                result[key] = decode_value(item)
+            return result
+        except PayloadDecodeError as e:
+            e.reversed_path.append(f".{key}")
+            raise
+
+    return decode_dict
+
+
+def _compile_union(annotation: Any, compiled: dict[Any, _Decoder]) -> _Decoder:
+    args = typing.get_args(annotation)
+    decoders = [_compile(arg, compiled) for arg in args]
+    expected = " or ".join(_describe(arg) for arg in args)
+
+    # `Optional[T]` is by far the most common union, so is special cased.
+    if len(args) == 2 and types.NoneType in args:
+        decode_other = decoders[1] if args.index(types.NoneType) == 0 else decoders[0]
+
+        def decode_optional(value: Any) -> Any:
+            return None if value is None else decode_other(value)
+
+        return decode_optional
+
+    def decode_union(value: Any) -> Any:
+        # The first type that the value matches wins.
+        for decode in decoders:
+            try:
+                return decode(value)
+            except PayloadDecodeError:
+                pass
+        raise _type_error(expected, value)
+
+    return decode_union
+
+
+def _compile_literal(values: tuple[Any, ...]) -> _Decoder:
+    allowed_values = frozenset(values)
+    expected = " or ".join(repr(value) for value in values)
+
+    def decode_literal(value: Any) -> Any:
+        try:
+            if value in allowed_values:
+                return value
+        except TypeError:  # Unhashable values, such as lists.
+            pass
+        raise PayloadDecodeError(f"Expected {expected} but found {value!r}")
+
+    return decode_literal
+
+
+def _compile_enum(cls: type[enum.Enum]) -> _Decoder:
+    def decode_enum(value: Any) -> Any:
+        try:
+            return cls(value)
+        except (ValueError, TypeError):
+            raise PayloadDecodeError(
+                f"Expected a valid {cls.__name__} value but found {value!r}"
+            ) from None
+
+    return decode_enum
+
+
+def _compile_instance_check(cls: type) -> _Decoder:
+    expected = _describe(cls)
+
+    def decode_instance(value: Any) -> Any:
+        if not isinstance(value, cls):
+            raise _type_error(expected, value)
+        return value
+
+    return decode_instance
+
+
+def _decode_int(value: Any) -> Any:
+    # `bool` is a subclass of `int`, but booleans aren't valid integers.
+    if type(value) is not int:  # pylint: disable=unidiomatic-typecheck
+        raise _type_error("integer", value)
+    return value
+
+
+def _decode_float(value: Any) -> Any:
+    # JSON doesn't distinguish between integers and floats, so integers are accepted (and converted).
+    value_type = type(value)
+    if value_type is float:
+        return value
+    if value_type is int:
+        return float(value)
+    raise _type_error("number", value)
+
+
+def _decode_any(value: Any) -> Any:
+    return value
+
+
+def _describe(annotation: Any) -> str:
+    if annotation in _PRIMITIVE_TYPE_NAMES:
+        return _PRIMITIVE_TYPE_NAMES[annotation]
+    return getattr(annotation, "__name__", None) or str(annotation)
+
+
+def _type_error(expected: str, value: Any) -> PayloadDecodeError:
+    return PayloadDecodeError(f"Expected {expected} but found {_describe(type(value))}")
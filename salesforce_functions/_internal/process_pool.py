@@ -0,0 +1,254 @@
+import asyncio
+import contextvars
+import itertools
+import multiprocessing
+import pickle
+import shutil
+import socket
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BufferedRWPair
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from ..data_api import _data_api_proxy  # pyright: ignore [reportPrivateUsage]
+from ..data_api import DataAPI
+from ..data_api.exceptions import DataApiError
+from .function_loader import load_function
+from .logging import configure_logging
+
+T = TypeVar("T")
+
+# The `DataAPI` methods that `ProcessDataAPI` is able to call.
+DATA_API_METHOD_NAMES = frozenset(
+    ["query", "query_more", "create", "update", "delete", "commit_unit_of_work"]
+)
+
+# Messages between the processes are pickled, and prefixed with their length.
+_MESSAGE_HEADER = struct.Struct("!I")
+
+
+class FunctionProcessPool:  # pylint: disable=too-many-instance-attributes
+    """
+    Runs CPU-bound callables (passed to `Context.run_in_process()`) on a pool of worker processes.
+
+    Otherwise CPU-bound code would hold the GIL, stalling every other invocation (and request)
+    being handled by the worker. Each worker process owns its own pool, which is started (and
+    warmed up, by importing the function in every pool process) before the worker accepts
+    invocations. Once all `max_workers` processes are busy, further calls wait in a queue.
+
+    The callable and its arguments are pickled, so should be defined at the top level of a module,
+    and be passed only the data they need (such as `InvocationEvent.data`), rather than the
+    `InvocationEvent` or `Context`. `ProcessDataAPI` requests made by the callable are sent back to
+    the worker over a Unix socket, and made using the invocation's `DataAPI` instance.
+    """
+
+    def __init__(self, *, max_workers: int, project_path: Path) -> None:
+        self.max_workers = max_workers
+        self._project_path = project_path
+        self._call_ids = itertools.count()
+        self._calls: dict[int, tuple[DataAPI, contextvars.Context]] = {}
+        self._socket_directory = tempfile.mkdtemp(prefix="sf-functions-python-")
+        self._socket_path = str(Path(self._socket_directory, "data-api.sock"))
+        self._server: asyncio.AbstractServer | None = None
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def start(self) -> None:
+        """
+        Start the pool's processes, and wait until they have all imported the function.
+
+        Raises `BrokenProcessPool` if the processes fail to start.
+        """
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, path=self._socket_path
+        )
+        # The processes are spawned rather than forked, since forking a process that's running
+        # other threads (such as the ASGI server's) can leave locks held in the child.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_process,
+            initargs=(str(self._project_path), self._socket_path),
+        )
+
+        # Processes are only started on demand, so submitting one call per process starts them all.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, _warm_up)
+                for _ in range(self.max_workers)
+            )
+        )
+
+    async def run(
+        self, data_api: DataAPI, func: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> T:
+        """
+        Call `func` with the given arguments in one of the pool's processes, and wait for the result.
+
+        Any `ProcessDataAPI` requests made by `func` are made using `data_api`, in (a copy of) the
+        current `contextvars` context, so that they're included in the invocation's metrics.
+        """
+        if self._executor is None:
+            raise RuntimeError("The process pool hasn't been started.")
+
+        call_id = next(self._call_ids)
+        self._calls[call_id] = (data_api, contextvars.copy_context())
+        loop = asyncio.get_running_loop()
+
+        try:
+            return await loop.run_in_executor(
+                self._executor, _run_call, call_id, func, args, kwargs
+            )
+        finally:
+            # If awaiting the result was cancelled (such as once the invocation deadline is
+            # reached) the call carries on running, but can no longer use the Data API.
+            del self._calls[call_id]
+
+    async def shutdown(self) -> None:
+        """Cancel any queued calls, and wait for running calls to finish and the processes to exit."""
+        if self._executor is not None:
+            # Waiting for the processes to exit blocks, so mustn't happen on the event loop.
+            await asyncio.to_thread(
+                self._executor.shutdown, wait=True, cancel_futures=True
+            )
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        shutil.rmtree(self._socket_directory, ignore_errors=True)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Each pool process opens a single connection, and makes one request at a time over it.
+        try:
+            while True:
+                try:
+                    (length,) = _MESSAGE_HEADER.unpack(
+                        await reader.readexactly(_MESSAGE_HEADER.size)
+                    )
+                    call_id, method_name, args = pickle.loads(
+                        await reader.readexactly(length)
+                    )
+                except asyncio.IncompleteReadError:
+                    # The process has exited.
+                    return
+
+                writer.write(await self._call_data_api(call_id, method_name, args))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _call_data_api(
+        self, call_id: int, method_name: str, args: tuple[Any, ...]
+    ) -> bytes:
+        try:
+            if method_name not in DATA_API_METHOD_NAMES:
+                raise DataApiError(f"Unknown Data API method '{method_name}'.")
+            if call_id not in self._calls:
+                raise DataApiError(
+                    "The invocation that called Context.run_in_process() has already finished."
+                )
+
+            data_api, context = self._calls[call_id]
+            # The task is created in the invocation's context, so that the request is observed
+            # by the invocation's Data API metrics and timings.
+            task = context.run(
+                asyncio.ensure_future, getattr(data_api, method_name)(*args)
+            )
+            return _encode_message((True, await task))
+        except Exception as e:  # pylint: disable=broad-except
+            return _encode_exception(e)
+
+
+async def run_in_thread(
+    data_api: DataAPI, func: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """
+    Call `func` on a thread instead, for when the function runtime doesn't have a process pool.
+
+    This is the case when the process pool is disabled (the default), or in unit tests that use
+    `testing.mock_context()`. `ProcessDataAPI` requests made by `func` are run on the event loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    def call_data_api(method_name: str, args: tuple[Any, ...]) -> Any:
+        return asyncio.run_coroutine_threadsafe(
+            getattr(data_api, method_name)(*args), loop
+        ).result()
+
+    def call() -> T:
+        # This runs in a copy of the current context, so doesn't need resetting.
+        _data_api_proxy.set(call_data_api)
+        return func(*args, **kwargs)
+
+    return await asyncio.to_thread(call)
+
+
+# The state of the current pool process, set by `_initialize_process()`.
+_socket_path: str | None = None
+_connection: BufferedRWPair | None = None
+
+
+def _initialize_process(project_path: str, socket_path: str) -> None:
+    global _socket_path  # pylint: disable=global-statement
+    _socket_path = socket_path
+    configure_logging()
+    # Importing the function ahead of the first call means that it's ready to use, and that
+    # the callables passed to `Context.run_in_process()` can be unpickled from its module.
+    load_function(Path(project_path))
+
+
+def _warm_up() -> None:
+    pass
+
+
+def _run_call(
+    call_id: int,
+    func: Callable[..., T],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> T:
+    def call_data_api(method_name: str, method_args: tuple[Any, ...]) -> Any:
+        connection = _get_connection()
+        connection.write(_encode_message((call_id, method_name, method_args)))
+        connection.flush()
+        (length,) = _MESSAGE_HEADER.unpack(connection.read(_MESSAGE_HEADER.size))
+        succeeded, value = pickle.loads(connection.read(length))
+        if succeeded:
+            return value
+        raise value
+
+    token = _data_api_proxy.set(call_data_api)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _data_api_proxy.reset(token)
+
+
+def _get_connection() -> BufferedRWPair:
+    global _connection  # pylint: disable=global-statement
+    if _connection is None:
+        assert _socket_path is not None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(_socket_path)
+        _connection = sock.makefile("rwb")
+    return _connection
+
+
+def _encode_message(message: Any) -> bytes:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return _MESSAGE_HEADER.pack(len(payload)) + payload
+
+
+def _encode_exception(exception: Exception) -> bytes:
+    try:
+        # Not all exceptions can be unpickled (such as those with required keyword-only arguments),
+        # which would otherwise only be discovered by the pool process.
+        pickle.loads(pickle.dumps(exception, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:  # pylint: disable=broad-except
+        exception = DataApiError(f"{exception.__class__.__name__}: {exception}")
+    return _encode_message((False, exception))
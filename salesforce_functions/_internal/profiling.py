@@ -0,0 +1,118 @@
+import contextlib
+import cProfile
+import pstats
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+from structlog.stdlib import BoundLogger
+
+T = TypeVar("T")
+
+_UNSAFE_FILENAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]")
+
+# The profiles of the calls that the invocation currently being profiled made on other threads (such as
+# a synchronous function run on the thread pool), which are merged into its profile once it finishes.
+# This is copied to those threads along with the rest of the `contextvars` context.
+_thread_profiles: ContextVar[list[cProfile.Profile] | None] = ContextVar(
+    "_thread_profiles", default=None
+)
+
+
+@dataclass(kw_only=True, slots=True)
+class Profile:
+    """A profile of a single function invocation."""
+
+    path: Path
+    """The file that the profile is written to, in `pstats` format."""
+    written: bool = False
+    """Whether the profile was successfully written, which only happens once profiling has finished."""
+
+
+class InvocationProfiler:  # pylint: disable=too-few-public-methods
+    """
+    Profiles individual function invocations using `cProfile`, writing the results to `directory`.
+
+    The resulting files can be inspected using the `pstats` module, or tools such as `snakeviz`.
+
+    `cProfile` records everything that runs on the worker's event loop whilst it's enabled, so the
+    profile includes the Data API requests awaited by the function, but will also include any other
+    invocations that were executing concurrently. Only one invocation per worker is profiled at a time,
+    since only one `cProfile` profiler can be active per thread.
+
+    `cProfile` only profiles the thread that enabled it, so calls made on other threads (such as to
+    synchronous functions, which run on the thread pool) are profiled using `call_profiled()`.
+    """
+
+    def __init__(self, *, directory: Path, logger: BoundLogger) -> None:
+        self.directory = directory
+        self._logger = logger
+        self._is_profiling = False
+
+    @contextlib.contextmanager
+    def profile(self, invocation_id: str) -> Iterator[Profile | None]:
+        """
+        Profile the code run within the context manager.
+
+        Returns `None` (and doesn't profile) if another invocation is already being profiled.
+        """
+        if self._is_profiling:
+            self._logger.warning(
+                "Not profiling function invocation, since another invocation is already being profiled"
+            )
+            yield None
+            return
+
+        filename = f"{_UNSAFE_FILENAME_CHARACTERS.sub('_', invocation_id)}-{time.time_ns()}.pstats"
+        profile = Profile(path=self.directory.joinpath(filename))
+        profiler = cProfile.Profile()
+        thread_profiles: list[cProfile.Profile] = []
+        thread_profiles_token = _thread_profiles.set(thread_profiles)
+
+        self._is_profiling = True
+        profiler.enable()
+
+        try:
+            yield profile
+        finally:
+            profiler.disable()
+            _thread_profiles.reset(thread_profiles_token)
+            self._is_profiling = False
+
+            try:
+                # Calls that are still running on other threads (such as a synchronous function that
+                # didn't finish before the invocation deadline) aren't included.
+                stats = pstats.Stats(profiler)
+                for thread_profile in thread_profiles:
+                    stats.add(thread_profile)
+                stats.dump_stats(profile.path)
+            except OSError as e:
+                self._logger.error(
+                    f"Unable to write profile: {e.__class__.__name__}: {e}"
+                )
+            else:
+                profile.written = True
+
+
+def call_profiled(func: Callable[..., T], *args: Any) -> T:
+    """
+    Call `func` with the given arguments, profiling it if the current invocation is being profiled.
+
+    This must be used to make calls on threads other than the event loop's (whose `contextvars` context
+    must be a copy of the invocation's), since `cProfile` only profiles the thread that enabled it.
+    """
+    thread_profiles = _thread_profiles.get()
+    if thread_profiles is None:
+        return func(*args)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(*args)
+    finally:
+        profiler.disable()
+        # The profile is only merged into the invocation's profile once the call has finished.
+        thread_profiles.append(profiler)
@@ -0,0 +1,413 @@
+import asyncio
+import contextlib
+import dataclasses
+import time
+import traceback
+import typing
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Awaitable, Callable
+
+import anyio
+import orjson
+from starlette.datastructures import State
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from structlog.stdlib import BoundLogger
+
+from ..context import Context
+from ..raw_response import RawResponse
+from .admission import Admission, AdmissionClosedError, AdmissionRejectedError
+from .background_tasks import BackgroundTaskRunner
+from .cloud_event import SalesforceFunctionsCloudEvent
+from .content_types import JSON_CODEC, BodyCodec
+from .metrics import RuntimeMetrics
+from .profiling import Profile
+from .streaming import StreamedResult, StreamEncoder
+from .timings import InvocationTimings
+
+# The codec used to encode the response body of the current request, which is negotiated using its
+# `Accept` header. Each request is handled in its own task (and so its own context), so this doesn't
+# need resetting.
+response_codec: ContextVar[BodyCodec] = ContextVar("response_codec", default=JSON_CODEC)
+
+
+# The types of response body, which are sent as-is. ASGI servers accept any bytes-like object (since
+# asyncio transports do), so memoryviews are written to the socket without first being copied.
+_Body = bytes | bytearray | memoryview
+
+
+class StatusCode(Enum):
+    SUCCESS = 200
+    REQUEST_ERROR = 400
+    FUNCTION_ERROR = 500
+    TOO_MANY_INVOCATIONS = 429
+    INTERNAL_ERROR = 503
+    FUNCTION_TIMEOUT = 504
+
+
+# The messages of the error responses that are made for both single and batch invocations.
+DEADLINE_PASSED_MESSAGE = (
+    "Function invocation deadline passed before the function started executing"
+)
+DEADLINE_EXCEEDED_MESSAGE = (
+    "Function didn't finish executing before the invocation deadline"
+)
+
+
+def describe_admission_rejection(error: AdmissionRejectedError) -> str:
+    """Make the message of the error response for an invocation that wasn't admitted."""
+    if isinstance(error, AdmissionClosedError):
+        return "Function invocation rejected since the worker is shutting down"
+    return "Function invocation rejected since the worker is at capacity"
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class FunctionResponse:  # pylint: disable=too-many-instance-attributes
+    """A framework-independent response to a function invocation request."""
+
+    status_code: int
+    body: _Body
+    """The response body, which can be any bytes-like object so that it's sent without being copied."""
+    extra_info: str
+    server_timing: str | None
+    serialization_duration_ns: int
+    """How long it took to serialize the response body, which is recorded in the metrics."""
+    content_type: str = JSON_CODEC.content_type
+    content_encoding: str | None = None
+    """The encoding that the body was compressed with, if it was compressed."""
+    body_stream: "ResponseStream | None" = None
+    """
+    The stream of results that forms the body, if the function streams its results (in which case `body`
+    is empty). Since the results are still being produced, the final `x-extra-info` metadata is only
+    known once the body has been sent, so is sent as a trailer if the server supports them.
+    """
+
+    def to_starlette_response(self) -> Response:
+        if self.body_stream:
+            return _StreamedStarletteResponse(self)
+
+        headers = {"x-extra-info": self.extra_info}
+        if self.server_timing:
+            headers["server-timing"] = self.server_timing
+        if self.content_encoding:
+            headers["content-encoding"] = self.content_encoding
+            headers["vary"] = "accept-encoding"
+        # Passing the content type as a header rather than as `media_type` stops Starlette appending a
+        # charset to `text/*` content types, so it's sent as-is, the same as by `send()`.
+        headers["content-type"] = self.content_type
+
+        return Response(
+            # Starlette only supports `bytes` bodies, so a `bytearray` or `memoryview` body is copied.
+            content=bytes(self.body),
+            status_code=self.status_code,
+            headers=headers,
+        )
+
+    def to_batch_result(self) -> bytes:
+        """
+        Serialize the response as an element of the response body of a batch invocation request.
+
+        The body is embedded as-is, so must be JSON (see `_check_batch_event_response()` in `batch.py`).
+        """
+        return b'{"statusCode":%d,"data":%b,"extraInfo":%b}' % (
+            self.status_code,
+            self.body,
+            self.extra_info.encode(),
+        )
+
+    async def send(self, send: Send, *, trailers: bool = False) -> None:
+        """
+        Send the response using raw ASGI messages, matching `to_starlette_response()`.
+
+        If `trailers` is true (which requires the server to support the ASGI HTTP trailers extension),
+        the final metadata of a streamed response is sent as an `x-extra-info` trailer.
+        """
+        headers = [(b"x-extra-info", self.extra_info.encode("latin-1"))]
+        if self.server_timing:
+            headers.append((b"server-timing", self.server_timing.encode("latin-1")))
+        if self.content_encoding:
+            headers.append(
+                (b"content-encoding", self.content_encoding.encode("latin-1"))
+            )
+            headers.append((b"vary", b"accept-encoding"))
+        if not self.body_stream:
+            headers.append((b"content-length", str(len(self.body)).encode("latin-1")))
+        headers.append((b"content-type", self.content_type.encode("latin-1")))
+
+        if not self.body_stream:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": headers,
+                }
+            )
+            await send({"type": "http.response.body", "body": self.body})
+            return
+
+        # Without a `content-length`, the server uses chunked transfer encoding.
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": headers,
+                "trailers": trailers,
+            }
+        )
+
+        async def write(chunk: bytes) -> None:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        extra_info = await self.body_stream.write_to(write)
+        await send({"type": "http.response.body", "body": b""})
+
+        if trailers:
+            await send(
+                {
+                    "type": "http.response.trailers",
+                    "headers": [(b"x-extra-info", extra_info.encode("latin-1"))],
+                    "more_trailers": False,
+                }
+            )
+
+
+class _StreamedStarletteResponse(Response):
+    """A Starlette response that streams the body of a `FunctionResponse` whose function streams its results."""
+
+    def __init__(self, function_response: FunctionResponse) -> None:
+        super().__init__(status_code=function_response.status_code)
+        self.function_response = function_response
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.function_response.send(send, trailers=supports_trailers(scope))
+
+
+def supports_trailers(scope: Scope) -> bool:
+    return "http.response.trailers" in (scope.get("extensions") or {})
+
+
+@dataclass(kw_only=True, slots=True)
+class ResponseStream:  # pylint: disable=too-many-instance-attributes
+    """
+    The results of a function that streams its results, which are produced whilst the response is sent.
+
+    Since the function is still executing, the invocation's metrics are only recorded (and any
+    background tasks scheduled) once the function has finished.
+    """
+
+    state: State
+    result: StreamedResult
+    encoder: StreamEncoder
+    cloudevent: SalesforceFunctionsCloudEvent
+    context: Context
+    admission: Admission | None
+    timings: InvocationTimings
+    function_start_time_ns: int
+    exit_stack: contextlib.AsyncExitStack = dataclasses.field(
+        default_factory=contextlib.AsyncExitStack
+    )
+    """Cleans up once the stream has finished, such as by releasing the invocation's execution slot."""
+
+    async def write_to(self, write: Callable[[bytes], Awaitable[None]]) -> str:
+        """
+        Stream the encoded results using `write`, returning the final `x-extra-info` metadata.
+
+        If the stream format has a metadata frame, the metadata is also written as the final line.
+        """
+        logger: BoundLogger = self.state.logger
+        metrics: RuntimeMetrics = self.state.metrics
+        status_code = StatusCode.SUCCESS
+        exception = None
+        remaining_time = self.context.remaining_time()
+
+        try:
+            # The deadline applies to the whole stream, not just to producing each result.
+            with anyio.move_on_after(
+                remaining_time.total_seconds() if remaining_time is not None else None
+            ) as cancel_scope:
+                async for item in self.result.items:
+                    self.encoder.add(item)
+                    if self.encoder.full:
+                        await write(self.encoder.flush())
+                await write(self.encoder.finish())
+        except Exception as e:  # pylint: disable=broad-except
+            status_code = StatusCode.FUNCTION_ERROR
+            exception = e
+            logger.exception(
+                f"Exception occurred while streaming function results: {e.__class__.__name__}: {e}"
+            )
+        else:
+            if cancel_scope.cancel_called:
+                status_code = StatusCode.FUNCTION_TIMEOUT
+                logger.error(
+                    "Function didn't finish streaming its results before the invocation deadline"
+                )
+        finally:
+            await self.result.items.aclose()
+            await self.exit_stack.aclose()
+
+        # The results produced so far are still sent if the stream fails, but the body is left incomplete
+        # (for a JSON array, without the closing bracket), so clients can't mistake it for the whole result.
+        if status_code != StatusCode.SUCCESS:
+            await write(self.encoder.flush())
+
+        self.timings.function_ns = time.perf_counter_ns() - self.function_start_time_ns
+        self.timings.serialization_ns = self.encoder.serialization_ns
+        metrics.function_execution_duration.observe_ns(self.timings.function_ns)
+        metrics.invocations.inc(str(status_code.value))
+        metrics.response_size.observe(self.encoder.size)
+        metrics.response_serialization_duration.observe_ns(
+            self.encoder.serialization_ns
+        )
+
+        if status_code == StatusCode.SUCCESS:
+            background_task_runner: BackgroundTaskRunner = (
+                self.state.background_task_runner
+            )
+            background_task_runner.schedule(
+                self.context._background_tasks  # pyright: ignore [reportPrivateUsage] pylint:disable=protected-access
+            )
+
+        metadata = make_metadata(
+            status_code,
+            cloudevent=self.cloudevent,
+            timings=self.timings,
+            exception=exception,
+            admission=self.admission,
+        )
+        metadata["streamedItems"] = self.encoder.item_count
+        extra_info = orjson.dumps(metadata)
+        if self.encoder.stream_format.metadata_frame:
+            await write(b'{"extraInfo":%b}\n' % extra_info)
+        return extra_info.decode()
+
+
+def make_response(  # pylint: disable=too-many-arguments
+    content: Any,
+    status_code: StatusCode,
+    cloudevent: SalesforceFunctionsCloudEvent | None = None,
+    timings: InvocationTimings | None = None,
+    exception: Exception | None = None,
+    admission: Admission | None = None,
+    profile: Profile | None = None,
+    reason: str | None = None,
+) -> FunctionResponse:
+    # We're not using Starlette's `JSONResponse`, since it uses the Python stdlib's
+    # `json` module for JSON serialization, whereas `orjson` has better performance:
+    # https://github.com/ijl/orjson#performance
+    serialization_start_time_ns = time.perf_counter_ns()
+    body: _Body
+    if isinstance(content, RawResponse):
+        # Any file body has already been read by `read_raw_response_file()`.
+        body = typing.cast(_Body, content.body)
+        if isinstance(body, memoryview):
+            # The length of a memoryview is its number of items, rather than bytes, unless it's cast
+            # to bytes (which doesn't copy it, unless it isn't contiguous and so can't be sent as-is).
+            body = body.cast("B") if body.c_contiguous else body.tobytes()
+        content_type = content.content_type
+    elif isinstance(content, orjson.Fragment):
+        # Pre-encoded JSON can't be embedded in other formats, so is always sent as JSON.
+        body = orjson.dumps(content)
+        content_type = JSON_CODEC.content_type
+    else:
+        codec = response_codec.get()
+        body = codec.encode(content)
+        content_type = codec.content_type
+    serialization_duration_ns = time.perf_counter_ns() - serialization_start_time_ns
+
+    server_timing = None
+    if timings:
+        timings.serialization_ns = serialization_duration_ns
+        server_timing = timings.to_server_timing()
+
+    metadata = make_metadata(
+        status_code,
+        cloudevent=cloudevent,
+        timings=timings,
+        exception=exception,
+        admission=admission,
+        profile=profile,
+        reason=reason,
+    )
+
+    return FunctionResponse(
+        status_code=status_code.value,
+        body=body,
+        extra_info=orjson.dumps(metadata).decode(),
+        server_timing=server_timing,
+        serialization_duration_ns=serialization_duration_ns,
+        content_type=content_type,
+    )
+
+
+def make_metadata(
+    status_code: StatusCode,
+    *,
+    cloudevent: SalesforceFunctionsCloudEvent | None = None,
+    timings: InvocationTimings | None = None,
+    exception: Exception | None = None,
+    admission: Admission | None = None,
+    profile: Profile | None = None,
+    reason: str | None = None,
+) -> dict[str, str | int | bool | dict[str, float]]:
+    """Make the metadata that's sent in the response's `x-extra-info` header."""
+    # Based on the `responseExtraInfo` definition in:
+    # https://github.com/forcedotcom/sf-fx-schema/blob/main/schema.json
+    metadata: dict[str, str | int | bool | dict[str, float]] = {
+        "requestId": cloudevent.id if cloudevent else "n/a",
+        "source": cloudevent.source if cloudevent else "n/a",
+        "statusCode": status_code.value,
+    }
+
+    if timings:
+        if timings.function_ns:
+            metadata["execTimeMs"] = round(timings.function_ns / (1000 * 1000))
+        metadata["timingsMs"] = timings.to_milliseconds()
+
+    if admission:
+        metadata["queueDepth"] = admission.queue_depth
+        metadata["queueWaitMs"] = round(admission.wait_duration_ns / (1000 * 1000))
+
+    if profile and profile.written:
+        metadata["profilePath"] = str(profile.path)
+
+    if reason:
+        metadata["reason"] = reason
+
+    if exception:
+        metadata["stack"] = "".join(traceback.format_exception(exception))
+
+    if status_code != StatusCode.SUCCESS:
+        metadata["isFunctionError"] = status_code in (
+            StatusCode.FUNCTION_ERROR,
+            StatusCode.FUNCTION_TIMEOUT,
+        )
+
+    return metadata
+
+
+def record_response_metrics(
+    metrics: RuntimeMetrics, function_response: FunctionResponse
+) -> None:
+    # Streamed responses record their metrics once they've finished streaming.
+    if function_response.body_stream:
+        return
+    metrics.invocations.inc(str(function_response.status_code))
+    metrics.response_size.observe(len(function_response.body))
+    metrics.response_serialization_duration.observe_ns(
+        function_response.serialization_duration_ns
+    )
+
+
+async def read_raw_response_file(function_result: Any) -> Any:
+    """Read (and then close) the file body of a `RawResponse`, on a thread so it doesn't block the event loop."""
+    if isinstance(function_result, RawResponse) and not isinstance(
+        function_result.body, (bytes, bytearray, memoryview)
+    ):
+        # The function has already returned, so the file has to be closed here once it's been read.
+        with function_result.body:
+            body = await asyncio.to_thread(function_result.body.read)
+        return RawResponse(body, function_result.content_type)
+    return function_result
@@ -0,0 +1,26 @@
+# Default settings and names that are shared by the CLI and the app. These are kept separate from
+# the modules that use them, so that the CLI can build its argument parser without importing the app
+# and its dependencies, which would slow down subcommands (such as `version`) that don't need them.
+
+# The default maximum number of invocations that can wait for an execution slot, once the
+# maximum number of in-flight invocations has been reached.
+DEFAULT_MAX_QUEUED = 100
+
+# The default for how long (in seconds) each worker has to shut down, which includes waiting for
+# in-flight invocations and background tasks to finish, and running the function's `shutdown()` hook.
+DEFAULT_SHUTDOWN_TIMEOUT = 30.0
+
+# The default for how long to wait (in seconds) for the function's `init()` hook to finish when starting up.
+DEFAULT_INIT_TIMEOUT = 60.0
+
+# The default maximum number of background tasks that each worker runs concurrently.
+DEFAULT_MAX_BACKGROUND_TASKS = 10
+
+# The policies for handling log lines once the log queue (used if `--log-queue-size` is set) is full.
+LOG_OVERFLOW_POLICIES = ("block", "drop-newest", "drop-oldest")
+
+# The default log queue overflow policy, which drops lines rather than stalling the caller.
+DEFAULT_LOG_OVERFLOW_POLICY = "drop-newest"
+
+# The request header that invocations must set to `true` to request that they be profiled.
+PROFILE_HEADER_NAME = "x-profile"
@@ -0,0 +1,162 @@
+import dataclasses
+import functools
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator
+
+import orjson
+
+from ..context import Context
+from ..invocation_event import InvocationEvent
+from .content_types import JSON_CONTENT_TYPE, json_quality
+from .function_loader import Function, StreamingFunction
+from .negotiation import parse_quality_values
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# Requests that set this header to `true` are sent the final metadata of an NDJSON stream as its last
+# line, for clients that can't read HTTP trailers (which uvicorn doesn't support).
+STREAM_METADATA_HEADER_NAME = "x-stream-metadata"
+
+# `application/jsonl` is the (also unregistered) content type used by some JSON Lines clients.
+_NDJSON_CONTENT_TYPES = (NDJSON_CONTENT_TYPE, "application/jsonl")
+
+# Encoded items are buffered until at least this many bytes are pending, and then sent as one chunk.
+# Sending each (typically small) item as its own chunk would add the overhead of an ASGI message,
+# a write syscall and chunked transfer encoding framing per item.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class StreamFormat:
+    """How the items yielded by a streaming function are framed in the response body."""
+
+    content_type: str
+    prefix: bytes
+    separator: bytes
+    suffix: bytes
+    option: int
+    """The `orjson` option used to encode each item."""
+    metadata_frame: bool = False
+    """
+    Whether the final `x-extra-info` metadata is sent as the last line of the body, in the form
+    `{"extraInfo": <metadata>}`, since otherwise it's only sent as a trailer if the server supports them.
+    """
+
+
+# A JSON array, so that the response body is the same as if the function had returned a list.
+JSON_ARRAY_FORMAT = StreamFormat(
+    content_type=JSON_CONTENT_TYPE, prefix=b"[", separator=b",", suffix=b"]", option=0
+)
+
+# Newline delimited JSON, which clients can parse incrementally, one item per line.
+NDJSON_FORMAT = StreamFormat(
+    content_type=NDJSON_CONTENT_TYPE,
+    prefix=b"",
+    separator=b"",
+    suffix=b"",
+    option=orjson.OPT_APPEND_NEWLINE,
+)
+
+# NDJSON followed by a metadata line, which only NDJSON supports, since it can't be added to a JSON array
+# without changing the result.
+NDJSON_WITH_METADATA_FORMAT = dataclasses.replace(NDJSON_FORMAT, metadata_frame=True)
+
+
+@functools.lru_cache(maxsize=64)
+def negotiate_stream_format(accept: str, metadata_frame: bool = False) -> StreamFormat:
+    """
+    Choose the format of a streamed response body, based on the request's `Accept` header.
+
+    Responses are streamed as NDJSON (with a final metadata line if `metadata_frame` is set) if the
+    client explicitly accepts it, unless it prefers JSON. Otherwise they're streamed as a JSON array.
+    Clients typically send the same `Accept` header with every request, so the result is cached.
+    """
+    if not accept:
+        return JSON_ARRAY_FORMAT
+
+    qualities = parse_quality_values(accept)
+    ndjson_quality = max(qualities.get(name, 0.0) for name in _NDJSON_CONTENT_TYPES)
+
+    if ndjson_quality > 0 and ndjson_quality >= json_quality(qualities):
+        return NDJSON_WITH_METADATA_FORMAT if metadata_frame else NDJSON_FORMAT
+    return JSON_ARRAY_FORMAT
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class StreamedResult:
+    """The result of a function that streams its results, which have started being produced."""
+
+    items: AsyncGenerator[Any, None]
+    """The function's async generator, which yields the remaining items."""
+    first_items: list[Any]
+    """The first item yielded by the function, or an empty list if it didn't yield anything."""
+
+
+def wrap_streaming_function(function: StreamingFunction) -> Function:
+    """
+    Wrap an async generator function, so that it can be called in the same way as other functions.
+
+    The wrapper returns once the function has yielded its first item, so that exceptions raised (or
+    deadlines exceeded) before the function has produced any results can still be reported using the
+    response's status code, in the same way as for functions that return their result.
+    """
+
+    async def start_streaming(event: InvocationEvent[Any], context: Context) -> Any:
+        items = function(event, context)
+        try:
+            first_item = await anext(items)
+        except StopAsyncIteration:
+            return StreamedResult(items=items, first_items=[])
+        return StreamedResult(items=items, first_items=[first_item])
+
+    return start_streaming
+
+
+class StreamEncoder:
+    """
+    Encodes the items yielded by a streaming function into the chunks of a response body.
+
+    Items are buffered until at least `chunk_size` bytes are pending, so that the memory used
+    stays flat regardless of how many items the function yields.
+    """
+
+    def __init__(
+        self, stream_format: StreamFormat, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> None:
+        self.stream_format = stream_format
+        self.chunk_size = chunk_size
+        self.item_count = 0
+        """The number of items encoded so far."""
+        self.size = 0
+        """The total size in bytes of the chunks returned so far."""
+        self.serialization_ns = 0
+        """The total time spent encoding items."""
+        self._buffer = bytearray(stream_format.prefix)
+
+    @property
+    def full(self) -> bool:
+        """Whether enough is buffered that it should be sent as a chunk."""
+        return len(self._buffer) >= self.chunk_size
+
+    def add(self, item: Any) -> None:
+        """Encode an item, raising `orjson.JSONEncodeError` if it can't be serialized."""
+        serialization_start_time_ns = time.perf_counter_ns()
+        encoded_item = orjson.dumps(item, option=self.stream_format.option)
+        if self.item_count:
+            self._buffer += self.stream_format.separator
+        self._buffer += encoded_item
+        self.item_count += 1
+        self.serialization_ns += time.perf_counter_ns() - serialization_start_time_ns
+
+    def flush(self) -> bytes:
+        """Return the buffered chunk, and empty the buffer."""
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        self.size += len(chunk)
+        return chunk
+
+    def finish(self) -> bytes:
+        """Return the final chunk, once all of the items have been added."""
+        self._buffer += self.stream_format.suffix
+        return self.flush()
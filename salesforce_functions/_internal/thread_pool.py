@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from ..context import Context
+from ..data_api import _event_loop  # pyright: ignore [reportPrivateUsage]
+from ..invocation_event import InvocationEvent
+from .function_loader import Function, SyncFunction
+from .profiling import call_profiled
+
+T = TypeVar("T")
+
+# The same default as `ThreadPoolExecutor`, which leaves headroom for functions that are blocked
+# on I/O (such as Data API requests), whilst limiting the resources used on large machines.
+DEFAULT_THREAD_POOL_SIZE = min(32, (os.cpu_count() or 1) + 4)
+
+
+class FunctionThreadPool:
+    """
+    Runs synchronous functions on a pool of threads, so that they don't block the worker's event loop.
+
+    Otherwise a single blocking function invocation would stall every other invocation (and request)
+    being handled by the worker. Once all `max_workers` threads are busy, further calls wait in a queue.
+
+    If set, `on_change` is called (on the event loop) whenever `busy` or `queued` changes, for example
+    to update metrics.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        on_change: Callable[["FunctionThreadPool"], None] | None = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self._pending = 0
+        self._on_change = on_change
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sf-functions-sync"
+        )
+
+    @property
+    def busy(self) -> int:
+        """The number of threads that are currently running a call."""
+        return min(self._pending, self.max_workers)
+
+    @property
+    def queued(self) -> int:
+        """The number of calls that are waiting for a thread to become available."""
+        return max(self._pending - self.max_workers, 0)
+
+    def wrap(self, function: SyncFunction) -> Function:
+        """Wrap a synchronous function, so that it can be awaited like an async function."""
+
+        @functools.wraps(function)
+        async def run_in_thread_pool(
+            event: InvocationEvent[Any], context: Context
+        ) -> Any:
+            return await self.run(function, event, context)
+
+        return run_in_thread_pool
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Call `func` with the given arguments on the thread pool, and wait for the result.
+
+        The call runs in a copy of the current `contextvars` context, so that (for example) log lines
+        include the invocation ID, and `SyncDataAPI` can run requests on the current event loop. If the
+        invocation is being profiled, the call is profiled too.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        context.run(_event_loop.set, loop)
+
+        def call() -> T:
+            return context.run(call_profiled, func, *args)
+
+        future = self._executor.submit(call)
+        self._pending += 1
+        self._notify_change()
+
+        def on_done(_future: "Future[T]") -> None:
+            # This is called on the thread that ran `func`, unless the call was cancelled before starting.
+            # Awaiting the future can be cancelled (for example, when the invocation deadline is reached)
+            # whilst `func` is still running, so the thread is only counted as free once it has finished.
+            with contextlib.suppress(
+                RuntimeError
+            ):  # The event loop has already been closed.
+                loop.call_soon_threadsafe(self._on_call_finished)
+
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        """Cancel any queued calls, without waiting for running calls to finish."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _on_call_finished(self) -> None:
+        self._pending -= 1
+        self._notify_change()
+
+    def _notify_change(self) -> None:
+        if self._on_change is not None:
+            self._on_change(self)
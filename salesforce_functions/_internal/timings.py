@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+
+# The names used for each phase in the `Server-Timing` header and the `x-extra-info` metadata.
+_PHASE_NAMES = {
+    "body_read_ns": "bodyRead",
+    "parse_ns": "parse",
+    "context_ns": "context",
+    "function_ns": "function",
+    "data_api_ns": "dataApi",
+    "serialization_ns": "serialization",
+}
+
+
+@dataclass(kw_only=True, slots=True)
+class InvocationTimings:
+    """
+    How long each phase of handling a function invocation request took, in nanoseconds.
+
+    Phases that weren't reached (for example, since the CloudEvent couldn't be parsed)
+    are `None`, and are omitted from the reported timings.
+    """
+
+    body_read_ns: int | None = None
+    """Reading the request body."""
+    parse_ns: int | None = None
+    """Parsing the CloudEvent."""
+    context_ns: int | None = None
+    """Constructing the `InvocationEvent` and `Context` passed to the function."""
+    function_ns: int | None = None
+    """Executing the function."""
+    data_api_ns: int | None = None
+    """
+    The total duration of the Data API requests made by the function, which is part of `function_ns`.
+
+    If the function makes concurrent requests, this can exceed `function_ns`.
+    """
+    serialization_ns: int | None = None
+    """Serializing the response body."""
+
+    def add_data_api_request(self, duration_ns: int) -> None:
+        self.data_api_ns = (self.data_api_ns or 0) + duration_ns
+
+    def to_milliseconds(self) -> dict[str, float]:
+        """The durations of the phases that were reached, in milliseconds with microsecond precision."""
+        return {
+            name: round(duration_ns / 1_000_000, 3)
+            for attribute, name in _PHASE_NAMES.items()
+            if (duration_ns := getattr(self, attribute)) is not None
+        }
+
+    def to_server_timing(self) -> str:
+        """Format the timings as the value of a `Server-Timing` HTTP response header."""
+        return ", ".join(
+            f"{name};dur={duration_ms}"
+            for name, duration_ms in self.to_milliseconds().items()
+        )
@@ -0,0 +1,212 @@
+import contextlib
+import gc
+import logging
+import os
+import signal
+import socket
+import stat
+import sys
+import traceback
+from types import FrameType
+from typing import NoReturn
+
+import uvicorn
+from uvicorn.server import Server
+
+# The exit code used by uvicorn when the app fails to start (for example, if the function is invalid).
+STARTUP_FAILURE_EXIT_CODE = 3
+
+# The workers use uvicorn's logging config, so this matches the format of uvicorn's own log messages.
+logger = logging.getLogger("uvicorn.error")
+
+
+def serve_forked_workers(
+    config: uvicorn.Config, workers: int, *, reuse_port: bool = False
+) -> int:
+    """
+    Serve the app using `workers` worker processes, that are forked from the current process.
+
+    Unlike uvicorn's own multi-process mode (which spawns fresh interpreters that each have to import
+    the app again), the workers inherit the memory of the current process. This means anything that
+    was imported before calling this (such as the function, when preloaded) is shared copy-on-write
+    by the workers, rather than being imported by each of them.
+
+    By default the sockets are bound in the current process, and are shared by all of the workers.
+    If `reuse_port` is set, each worker instead binds its own sockets using `SO_REUSEPORT`, so that
+    the kernel balances incoming connections across the workers, rather than the workers competing
+    to accept them from the shared sockets (which tends to favour whichever worker is least busy at
+    the instant a connection arrives, leaving the load uneven under bursty traffic).
+
+    Returns the exit code for the current process once all of the workers have exited.
+    """
+    sockets: list[socket.socket] | None = None
+    if config.uds is not None:
+        sockets = [bind_unix_socket(config.uds)]
+        logger.info(
+            "Uvicorn running on unix socket %s (Press CTRL+C to quit)", config.uds
+        )
+    elif reuse_port:
+        logger.info(
+            "Uvicorn running on http://%s:%d using SO_REUSEPORT (Press CTRL+C to quit)",
+            f"[{config.host}]" if ":" in config.host else config.host,
+            config.port,
+        )
+    else:
+        sockets = bind_sockets(config.host, config.port)
+        for sock in sockets:
+            host, port, *_ = sock.getsockname()
+            host = f"[{host}]" if sock.family == socket.AF_INET6 else host
+            logger.info(
+                "Uvicorn running on http://%s:%d (Press CTRL+C to quit)", host, port
+            )
+    logger.info("Started parent process [%d]", os.getpid())
+
+    # Exclude everything allocated so far from garbage collection. Otherwise each worker's garbage
+    # collector would write to the headers of those objects, causing the memory pages that would
+    # otherwise have been shared copy-on-write to be copied into each worker.
+    gc.freeze()
+    worker_pids: set[int] = set()
+
+    try:
+        for _ in range(workers):
+            worker_pids.add(_fork_worker(config, sockets))
+    finally:
+        # The workers have their own copies of the sockets, so they're no longer needed here.
+        for sock in sockets or []:
+            sock.close()
+
+    shutting_down = False
+
+    def shut_down_workers(
+        _signal_number: int | None = None, _frame: FrameType | None = None
+    ) -> None:
+        nonlocal shutting_down
+        if shutting_down:
+            return
+
+        shutting_down = True
+        for pid in worker_pids:
+            # The worker may have already exited, but not yet been waited for.
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, shut_down_workers)
+    signal.signal(signal.SIGTERM, shut_down_workers)
+
+    exit_code = 0
+    while worker_pids:
+        pid, wait_status = os.wait()
+        worker_pids.discard(pid)
+        worker_exit_code = os.waitstatus_to_exitcode(wait_status)
+
+        # If one worker fails (for example, since the function is invalid), then so would the others.
+        if worker_exit_code != 0 and not shutting_down:
+            print(
+                f"Worker process {pid} exited unexpectedly with exit code {worker_exit_code}.",
+                file=sys.stderr,
+            )
+            exit_code = worker_exit_code if worker_exit_code > 0 else 1
+            shut_down_workers()
+
+    return exit_code
+
+
+def bind_sockets(
+    host: str, port: int, *, reuse_port: bool = False
+) -> list[socket.socket]:
+    """
+    Bind listening sockets for all of the addresses that `host` resolves to.
+
+    For example, `localhost` may resolve to both `127.0.0.1` and `::1`, in which case this
+    matches the behaviour of uvicorn (via `asyncio`) of listening on both addresses.
+
+    If `reuse_port` is set, the sockets are bound using `SO_REUSEPORT`, so that other sockets
+    (such as those of the other workers) can listen on the same addresses.
+    """
+    sockets: list[socket.socket] = []
+    addresses = socket.getaddrinfo(
+        host, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE
+    )
+
+    try:
+        for family, socket_type, protocol, _, address in dict.fromkeys(addresses):
+            sock = socket.socket(family, socket_type, protocol)
+            sockets.append(sock)
+            if sys.platform != "win32":
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            if family == socket.AF_INET6:
+                # Otherwise binding to `::` would conflict with binding to `0.0.0.0`.
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            sock.bind(address)
+            sock.listen()
+    except OSError:
+        for sock in sockets:
+            sock.close()
+        raise
+
+    return sockets
+
+
+def bind_unix_socket(path: str) -> socket.socket:
+    """
+    Bind a listening Unix domain socket at `path`, replacing any stale socket left at that path.
+
+    The socket is made accessible to all users (matching uvicorn), so that a local proxy running
+    as a different user can connect to it.
+    """
+    with contextlib.suppress(FileNotFoundError):
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        os.chmod(path, 0o666)
+        sock.listen()
+    except OSError:
+        sock.close()
+        raise
+
+    return sock
+
+
+def _fork_worker(config: uvicorn.Config, sockets: list[socket.socket] | None) -> int:
+    """
+    Fork a worker process that serves the app using the given sockets, returning its PID.
+
+    If `sockets` is `None`, the worker binds its own sockets using `SO_REUSEPORT`.
+    """
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    # Now running in the worker process, which must never return to the caller.
+    _run_worker(config, sockets)
+
+
+def _run_worker(
+    config: uvicorn.Config, sockets: list[socket.socket] | None
+) -> NoReturn:
+    exit_code = 1
+
+    try:
+        if sockets is None:
+            try:
+                sockets = bind_sockets(config.host, config.port, reuse_port=True)
+            except OSError as e:
+                # Matches how uvicorn reports failing to bind (such as when the port is in use).
+                logger.error(e)
+                raise SystemExit(1) from e
+
+        server = Server(config)
+        server.run(sockets=sockets)
+        exit_code = 0 if server.started else STARTUP_FAILURE_EXIT_CODE
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Skips the parent process's cleanup (such as `atexit` handlers and `finally` blocks).
+        os._exit(exit_code)
@@ -1,9 +1,18 @@
-from dataclasses import dataclass
+import functools
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, ParamSpec, TypeVar
 
 from .data_api import DataAPI
 
+if TYPE_CHECKING:
+    from ._internal.process_pool import FunctionProcessPool
+
 __all__ = ["User", "Org", "Context"]
 
+P = ParamSpec("P")
+T = TypeVar("T")
+
 
 @dataclass(frozen=True, kw_only=True, slots=True)
 class User:
@@ -79,3 +88,108 @@ class Context:
 
     org: Org
     """Information about the Salesforce org and the user that invoked the function."""
+    deadline: datetime | None = None
+    """
+    The time by which the function must finish executing, after which the invocation is cancelled.
+
+    This is `None` if the invocation doesn't have a deadline.
+
+    For example: `datetime.datetime(2023, 1, 19, 10, 11, 12, 468085, tzinfo=datetime.timezone.utc)`
+    """
+    _background_tasks: list[Callable[[], Awaitable[Any]]] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+    _process_pool: "FunctionProcessPool | None" = field(
+        default=None, repr=False, compare=False
+    )
+
+    def remaining_time(self) -> timedelta | None:
+        """
+        Return how much time remains before the invocation deadline is reached.
+
+        Use this to decide whether there's enough time left to start a slow operation, such as
+        a large query. Returns `None` if the invocation doesn't have a deadline.
+
+        For example:
+
+        ```python
+        remaining_time = context.remaining_time()
+
+        if remaining_time is not None and remaining_time < timedelta(seconds=5):
+            # ...
+        ```
+        """
+        if self.deadline is None:
+            return None
+
+        return self.deadline - datetime.now(timezone.utc)
+
+    def add_background_task(
+        self,
+        func: Callable[P, Awaitable[Any]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> None:
+        """
+        Schedule an async function to be called with the given arguments, once the function has returned.
+
+        Use this for follow-up work that the caller doesn't need to wait for, such as writing audit
+        records, so that the invocation's response can be returned sooner. Background tasks are only
+        run if the function returns successfully, and aren't subject to the invocation deadline.
+
+        The number of background tasks that run concurrently is limited per worker process, and
+        any that are still running when the function runtime shuts down are waited for. Exceptions
+        raised by background tasks are logged.
+
+        For example:
+
+        ```python
+        async def write_audit_record(data_api: DataAPI, record_id: str) -> None:
+            # ...
+
+        async def function(event: InvocationEvent[Any], context: Context):
+            context.add_background_task(write_audit_record, context.org.data_api, record_id)
+            return record_id
+        ```
+        """
+        self._background_tasks.append(functools.partial(func, *args, **kwargs))
+
+    async def run_in_process(
+        self,
+        func: Callable[P, T],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> T:
+        """
+        Call a CPU-bound synchronous function with the given arguments in a separate process.
+
+        Use this for CPU-heavy work (such as parsing documents or scoring records), which would
+        otherwise hold up the other invocations being handled by the same worker process. The
+        processes are started ahead of time, with their number set using the `--process-pool-size`
+        option of the `serve` subcommand. If that isn't set, `func` is called on a thread instead.
+
+        `func` must be defined at the top level of a module, and both its arguments and return value
+        must be picklable, since they are copied between the processes. Pass it only the data it
+        needs (such as `event.data`), rather than the `InvocationEvent` or `Context`. To use the
+        Data API, `func` can create a `salesforce_functions.data_api.ProcessDataAPI`, whose requests
+        are made by this invocation's `DataAPI` instance.
+
+        If the invocation deadline is reached, `func` isn't interrupted, but its result is discarded.
+
+        For example:
+
+        ```python
+        def count_words(text: str) -> int:
+            # ...
+
+        async def function(event: InvocationEvent[Any], context: Context):
+            return await context.run_in_process(count_words, event.data["text"])
+        ```
+        """
+        if self._process_pool is None:
+            # pylint: disable-next=import-outside-toplevel
+            from ._internal.process_pool import run_in_thread
+
+            return await run_in_thread(self.org.data_api, func, *args, **kwargs)
+
+        return await self._process_pool.run(self.org.data_api, func, *args, **kwargs)
@@ -1,4 +1,7 @@
-from typing import Any, TypeVar
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, TypeVar, cast
 
 import aiohttp
 import orjson
@@ -19,10 +22,29 @@ from .record import Record, RecordQueryResult
 from .reference_id import ReferenceId
 from .unit_of_work import UnitOfWork
 
-__all__ = ["DataAPI"]
+__all__ = ["DataAPI", "SyncDataAPI", "ProcessDataAPI"]
 
 T = TypeVar("T")
 
+# Called with the duration (in nanoseconds) of each Data API HTTP request. This is set by the
+# function runtime for each invocation, so that it can record metrics about Data API usage.
+_request_duration_observer: ContextVar[Callable[[int], None] | None] = ContextVar(
+    "_request_duration_observer", default=None
+)
+
+# The event loop that owns the shared `aiohttp` session. This is set by the function runtime when
+# it calls a synchronous function on its thread pool, so that `SyncDataAPI` can run requests on it.
+_event_loop: ContextVar[asyncio.AbstractEventLoop | None] = ContextVar(
+    "_event_loop", default=None
+)
+
+# Called with the name and arguments of a `DataAPI` method, returning its result. This is set by the
+# function runtime when it runs a callable using `Context.run_in_process()`, so that `ProcessDataAPI`
+# can make the request using the `DataAPI` instance (and so the `aiohttp` session) of the worker.
+_data_api_proxy: ContextVar[Callable[[str, tuple[Any, ...]], Any] | None] = ContextVar(
+    "_data_api_proxy", default=None
+)
+
 
 class DataAPI:
     """
@@ -210,6 +232,7 @@ class DataAPI:
         body = rest_api_request.request_body()
 
         session = self._shared_session or _create_session()
+        start_time_ns = time.perf_counter_ns()
 
         try:
             response = await session.request(
@@ -237,6 +260,7 @@ class DataAPI:
                 f"The server didn't respond with valid JSON: {e.__class__.__name__}: {e}"
             ) from e
         finally:
+            _observe_request_duration(start_time_ns)
             if session != self._shared_session:
                 await session.close()
 
@@ -244,6 +268,7 @@ class DataAPI:
 
     async def _download_file(self, url: str) -> bytes:
         session = self._shared_session or _create_session()
+        start_time_ns = time.perf_counter_ns()
 
         try:
             response = await session.request(
@@ -252,6 +277,7 @@ class DataAPI:
 
             return await response.read()
         finally:
+            _observe_request_duration(start_time_ns)
             if session != self._shared_session:
                 await session.close()
 
@@ -262,6 +288,144 @@ class DataAPI:
         }
 
 
+class SyncDataAPI:
+    """
+    A blocking wrapper around `DataAPI`, for use by synchronous functions.
+
+    Synchronous functions are run on a thread pool rather than on the worker's event loop, so can't
+    `await` the `DataAPI` methods. Instead, each `SyncDataAPI` method runs the request on the event
+    loop, and blocks the function's thread until the request has completed.
+
+    For example:
+
+    ```python
+    from salesforce_functions.data_api import SyncDataAPI
+
+    def function(event: InvocationEvent[Any], context: Context):
+        data_api = SyncDataAPI(context.org.data_api)
+        result = data_api.query("SELECT Id, Name FROM Account")
+        return result.records
+    ```
+
+    `SyncDataAPI` can only be used from the thread that the function runtime calls a synchronous
+    function on (or from threads started using a copy of its `contextvars` context).
+    """
+
+    def __init__(self, data_api: DataAPI) -> None:
+        self.data_api = data_api
+        """The wrapped `DataAPI` instance."""
+
+    def query(self, soql: str) -> RecordQueryResult:
+        """Query for records using the given SOQL string. See `DataAPI.query()`."""
+        return self._run(self.data_api.query(soql))
+
+    def query_more(self, result: RecordQueryResult) -> RecordQueryResult:
+        """Query for more records, based on the given `RecordQueryResult`. See `DataAPI.query_more()`."""
+        return self._run(self.data_api.query_more(result))
+
+    def create(self, record: Record) -> str:
+        """Create a new record based on the given `Record` object. See `DataAPI.create()`."""
+        return self._run(self.data_api.create(record))
+
+    def update(self, record: Record) -> str:
+        """Update an existing record based on the given `Record` object. See `DataAPI.update()`."""
+        return self._run(self.data_api.update(record))
+
+    def delete(self, object_type: str, record_id: str) -> str:
+        """Delete an existing record of the given Salesforce object type and ID. See `DataAPI.delete()`."""
+        return self._run(self.data_api.delete(object_type, record_id))
+
+    def commit_unit_of_work(self, unit_of_work: UnitOfWork) -> dict[ReferenceId, str]:
+        """Commit a `UnitOfWork`, executing all operations registered with it. See `DataAPI.commit_unit_of_work()`."""
+        return self._run(self.data_api.commit_unit_of_work(unit_of_work))
+
+    def _run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            coroutine.close()
+            raise RuntimeError(
+                "SyncDataAPI can't be used from async code, since it would block the event loop."
+                " Await the methods of DataAPI instead."
+            )
+
+        event_loop = _event_loop.get()
+        if event_loop is None:
+            coroutine.close()
+            raise RuntimeError(
+                "SyncDataAPI can only be used by synchronous functions that are called by the function runtime."
+            )
+
+        return asyncio.run_coroutine_threadsafe(coroutine, event_loop).result()
+
+
+class ProcessDataAPI:
+    """
+    A blocking Data API client, for use by code that's run using `Context.run_in_process()`.
+
+    That code runs in a separate process, which doesn't have access to the function's `DataAPI`
+    instance. Instead, each `ProcessDataAPI` method sends the request to the worker process that
+    invoked the code, which makes it using the function's `DataAPI` instance (and so reuses its
+    connection pool), and blocks until the result is returned.
+
+    For example:
+
+    ```python
+    from salesforce_functions.data_api import ProcessDataAPI
+
+    def score_accounts(weights: dict[str, float]) -> list[float]:
+        result = ProcessDataAPI().query("SELECT Id, AnnualRevenue FROM Account")
+        # ...
+
+    async def function(event: InvocationEvent[Any], context: Context):
+        return await context.run_in_process(score_accounts, event.data)
+    ```
+    """
+
+    def query(self, soql: str) -> RecordQueryResult:
+        """Query for records using the given SOQL string. See `DataAPI.query()`."""
+        return cast(RecordQueryResult, self._call("query", soql))
+
+    def query_more(self, result: RecordQueryResult) -> RecordQueryResult:
+        """Query for more records, based on the given `RecordQueryResult`. See `DataAPI.query_more()`."""
+        return cast(RecordQueryResult, self._call("query_more", result))
+
+    def create(self, record: Record) -> str:
+        """Create a new record based on the given `Record` object. See `DataAPI.create()`."""
+        return cast(str, self._call("create", record))
+
+    def update(self, record: Record) -> str:
+        """Update an existing record based on the given `Record` object. See `DataAPI.update()`."""
+        return cast(str, self._call("update", record))
+
+    def delete(self, object_type: str, record_id: str) -> str:
+        """Delete an existing record of the given Salesforce object type and ID. See `DataAPI.delete()`."""
+        return cast(str, self._call("delete", object_type, record_id))
+
+    def commit_unit_of_work(self, unit_of_work: UnitOfWork) -> dict[ReferenceId, str]:
+        """Commit a `UnitOfWork`, executing all operations registered with it. See `DataAPI.commit_unit_of_work()`."""
+        return cast(
+            dict[ReferenceId, str], self._call("commit_unit_of_work", unit_of_work)
+        )
+
+    def _call(self, method_name: str, *args: Any) -> Any:
+        proxy = _data_api_proxy.get()
+        if proxy is None:
+            raise RuntimeError(
+                "ProcessDataAPI can only be used by code that's run using Context.run_in_process()."
+            )
+
+        return proxy(method_name, args)
+
+
+def _observe_request_duration(start_time_ns: int) -> None:
+    observer = _request_duration_observer.get()
+    if observer is not None:
+        observer(time.perf_counter_ns() - start_time_ns)
+
+
 def _create_session() -> aiohttp.ClientSession:
     # Disable cookie storage using `DummyCookieJar`, given that:
     # - The same session will be used by multiple invocation events.
@@ -1,4 +1,6 @@
+import functools
 from dataclasses import dataclass
+from typing import Any
 
 # The order in `__all__` is the in which pdoc3 will display the classes in the docs.
 __all__ = [
@@ -28,6 +30,14 @@ class SalesforceRestApiError(DataApiError):
             f"Salesforce REST API reported the following error(s):\n---\n{errors_list}"
         )
 
+    def __reduce__(self) -> tuple[Any, ...]:
+        # The default implementation (from `BaseException`) can't pickle keyword-only arguments,
+        # which is required to pass the exception between processes (see `ProcessDataAPI`).
+        return (
+            functools.partial(SalesforceRestApiError, api_errors=self.api_errors),
+            (),
+        )
+
 
 @dataclass(frozen=True, kw_only=True, slots=True)
 class InnerSalesforceRestApiError:
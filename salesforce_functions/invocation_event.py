@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Generic, TypeVar
+from typing import TYPE_CHECKING, Any, Callable, Generic, TypeVar
 
 __all__ = ["InvocationEvent"]
 
@@ -37,6 +37,24 @@ class InvocationEvent(Generic[T]):
         # ...
     ```
 
+    If the type is a dataclass or `TypedDict` (or contains them, such as a list of dataclasses),
+    the payload is converted into that type before the function is called, so that it doesn't
+    need converting by hand. For example:
+
+    ```python
+    @dataclass
+    class EventPayload:
+        field_one: str
+        field_two: int
+
+    async def function(event: InvocationEvent[EventPayload], context: Context):
+        # `event.data` is an instance of `EventPayload`.
+    ```
+
+    The conversion is compiled from the type annotations when the function is loaded. Invocations
+    whose payload doesn't match the type (such as a missing field, or a string where an `int` is
+    expected) are rejected with a `400` status code, without calling the function.
+
     For more information, see the [Python typing documentation](https://docs.python.org/3/library/typing.html).
     """
 
@@ -73,6 +91,12 @@ class InvocationEvent(Generic[T]):
     ```python
     InvocationEvent[dict[str, Any]]
     ```
+
+    Unless the type is a dataclass or `TypedDict` (which are converted before the function is called),
+    the payload is only decoded the first time `data` is accessed, so functions that don't use it (such
+    as those that forward `raw_data` as-is) don't spend time decoding it. If the payload turns out not
+    to be valid JSON (or MessagePack), accessing `data` raises an exception, which if not handled by the
+    function results in a `400` status code.
     """
     time: datetime | None
     """
@@ -81,3 +105,63 @@ class InvocationEvent(Generic[T]):
     If the time of the occurrence can't be determined, then this attribute
     may be set to some other time (such as the current time).
     """
+    # These are set by the runtime using `_with_raw_data()`, rather than being passed to the constructor.
+    # They're private, so aren't serialized when the event is.
+    _raw_data: bytes | None = field(default=None, init=False, repr=False, compare=False)
+    _load_data: Callable[[], T] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    """Decodes the data payload, if it's yet to be decoded."""
+
+    @property
+    def raw_data(self) -> bytes | None:
+        """
+        The undecoded data payload of the event, exactly as it was sent in the request body.
+
+        This can be used to forward the payload elsewhere without decoding and re-encoding it, for
+        example by returning it in a `RawResponse`. It's `None` if the payload wasn't sent as the
+        request body, such as for the events of a batch invocation (or events created using `mock_event()`).
+        """
+        return self._raw_data
+
+    @classmethod
+    def _with_raw_data(
+        cls,
+        *,
+        id: str,  # pylint: disable=redefined-builtin
+        type: str,  # pylint: disable=redefined-builtin
+        source: str,
+        data: T,
+        time: datetime | None,
+        raw_data: bytes | None,
+        load_data: Callable[[], T] | None,
+    ) -> "InvocationEvent[T]":
+        """
+        Create an event for the undecoded payload `raw_data`, for use by the runtime.
+
+        If `load_data` is set, `data` is left unset until it's first accessed, at which point
+        `__getattr__()` sets it to the result of `load_data()`. Otherwise `data` is used as-is.
+        """
+        event = cls(id=id, type=type, source=source, data=data, time=time)
+        object.__setattr__(event, "_raw_data", raw_data)
+        if load_data is not None:
+            object.__setattr__(event, "_load_data", load_data)
+            # Unsets the `data` slot, so that accessing it falls back to `__getattr__()`.
+            object.__delattr__(event, "data")
+        return event
+
+    if not TYPE_CHECKING:
+        # Hidden from type checkers, since otherwise they'd treat every unknown attribute as valid.
+
+        def __getattr__(self, name: str) -> Any:
+            # Only called for attributes that aren't set, which includes `data` for events created
+            # by `_with_raw_data()`, until it's first accessed.
+            load_data = self._load_data if name == "data" else None
+            if load_data is None:
+                raise AttributeError(
+                    f"'{self.__class__.__name__}' object has no attribute '{name}'"
+                )
+            data = load_data()
+            object.__setattr__(self, "data", data)
+            object.__setattr__(self, "_load_data", None)
+            return data
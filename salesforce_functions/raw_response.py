@@ -0,0 +1,37 @@
+from dataclasses import dataclass
+from typing import BinaryIO
+
+__all__ = ["RawResponse"]
+
+
+@dataclass(frozen=True, slots=True)
+class RawResponse:
+    """
+    A response body that has already been encoded, which the function can return to have it sent as-is.
+
+    Normally the function's return value is serialized to JSON to form the response body. However, if
+    the function already has the encoded body (for example, since it's proxying JSON returned by another
+    API), decoding it only for it to be re-encoded is wasted work, which can be avoided using:
+
+    ```python
+    async def function(event: InvocationEvent[Any], context: Context):
+        async with session.get(url) as upstream_response:
+            return RawResponse(await upstream_response.read())
+    ```
+
+    The body and content type are sent as-is, without being validated, so the body must be valid for
+    the content type. With `--fast-path`, a `memoryview` or `bytearray` body is sent without being
+    copied. A binary file object is read on a thread, so that reading it doesn't block other
+    invocations, and is then closed.
+
+    To embed pre-encoded JSON within a larger return value instead, use `orjson.Fragment`:
+
+    ```python
+    return {"account": orjson.Fragment(account_json), "fetchedAt": fetched_at}
+    ```
+    """
+
+    body: bytes | bytearray | memoryview | BinaryIO
+    """The encoded response body, or a binary file object to read it from."""
+    content_type: str = "application/json"
+    """The `Content-Type` of the body, such as `application/octet-stream` for arbitrary binary data."""
@@ -88,6 +88,7 @@ def mock_context(
     username: str = "user@example.tld",
     on_behalf_of_user_id: str = "005JS000000H456",
     client_api_version: str = "56.0",
+    deadline: datetime | None = None,
 ) -> Context:
     """
     Create an example `Context` instance for use in unit tests.
@@ -118,5 +119,6 @@ def mock_context(
                 username=username,
                 on_behalf_of_user_id=on_behalf_of_user_id,
             ),
-        )
+        ),
+        deadline=deadline,
     )
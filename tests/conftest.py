@@ -0,0 +1,17 @@
+import asyncio
+
+import pytest
+from _pytest.fixtures import FixtureDef
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_fixture_post_finalizer(fixturedef: FixtureDef[object]) -> None:
+    """
+    Close the unused event loop that pytest-asyncio sets after each async test.
+
+    Otherwise that event loop is only closed once it's garbage collected, which can happen
+    during an unrelated later test (such as one that runs uvicorn, which replaces the current
+    event loop), where the resulting `ResourceWarning` causes the test to fail.
+    """
+    if fixturedef.argname == "event_loop":
+        asyncio.get_event_loop_policy().get_event_loop().close()
@@ -0,0 +1,17 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+async def write_file(path: Path, content: str, *, delay: float) -> None:
+    await asyncio.sleep(delay)
+    path.write_text(content)
+
+
+async def function(event: InvocationEvent[Any], context: Context) -> str:
+    context.add_background_task(
+        write_file, Path(event.data["path"]), "Written in the background", delay=0.2
+    )
+    return "Scheduled background task"
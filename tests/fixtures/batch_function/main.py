@@ -0,0 +1,19 @@
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+async def function(event: InvocationEvent[Any], _context: Context) -> Any:
+    return event.data
+
+
+async def batch_function(
+    events: list[InvocationEvent[Any]], _context: Context
+) -> list[Any]:
+    if any(event.data == "raise" for event in events):
+        raise ValueError("Some error")
+
+    if any(event.data == "wrong_length" for event in events):
+        return []
+
+    return [{"data": event.data, "batchSize": len(events)} for event in events]
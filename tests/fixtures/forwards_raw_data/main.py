@@ -0,0 +1,8 @@
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent, RawResponse
+
+
+async def function(event: InvocationEvent[Any], _context: Context) -> RawResponse:
+    assert event.raw_data is not None
+    return RawResponse(event.raw_data)
@@ -0,0 +1,12 @@
+import asyncio
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+async def init() -> None:
+    await asyncio.sleep(10)
+
+
+async def function(_event: InvocationEvent[Any], _context: Context) -> None:
+    return None
@@ -0,0 +1,11 @@
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+async def function(_event: InvocationEvent[Any], _context: Context) -> None:
+    return None
+
+
+def batch_function(events: list[InvocationEvent[Any]], _context: Context) -> list[None]:
+    return [None for _ in events]
@@ -0,0 +1,7 @@
+from typing import Any, Iterator
+
+from salesforce_functions import Context, InvocationEvent
+
+
+def function(_event: InvocationEvent[Any], _context: Context) -> Iterator[str]:
+    yield "Hello"
@@ -0,0 +1,11 @@
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+async def shutdown(_context: Context) -> None:
+    pass
+
+
+async def function(_event: InvocationEvent[Any], _context: Context) -> None:
+    return None
@@ -1,5 +0,0 @@
-from salesforce_functions import Context, InvocationEvent
-
-
-def function(_event: InvocationEvent[None], _context: Context) -> None:
-    return None
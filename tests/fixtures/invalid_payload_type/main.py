@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+@dataclass
+class Payload:
+    account: "UndefinedType"  # type: ignore[name-defined] # noqa: F821
+
+
+async def function(_event: InvocationEvent[Payload], _context: Context) -> Any:
+    return None
@@ -0,0 +1,21 @@
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent, get_logger
+
+logger = get_logger()
+
+lookup_table: dict[str, int] = {}
+
+
+async def init() -> None:
+    lookup_table.update(one=1, two=2)
+    logger.info("Initialized lookup table")
+
+
+async def shutdown() -> None:
+    lookup_table.clear()
+    logger.info("Cleared lookup table")
+
+
+async def function(_event: InvocationEvent[Any], _context: Context) -> dict[str, int]:
+    return lookup_table
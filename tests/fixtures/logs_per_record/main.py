@@ -0,0 +1,14 @@
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent, get_logger
+
+logger = get_logger()
+
+
+async def function(event: InvocationEvent[Any], _context: Context) -> None:
+    for index in range(event.data["count"]):
+        logger.info("Processing record", index=index)
+        if index % 10 == 9:
+            logger.info("Processed batch of records", index=index)
+
+    logger.warning("Finished processing records")
@@ -0,0 +1,20 @@
+import os
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+from salesforce_functions.data_api import ProcessDataAPI
+
+
+def sum_of_squares(numbers: list[int]) -> dict[str, Any]:
+    return {"result": sum(number * number for number in numbers), "pid": os.getpid()}
+
+
+def query(soql: str) -> int:
+    return ProcessDataAPI().query(soql).total_size
+
+
+async def function(event: InvocationEvent[Any], context: Context) -> dict[str, Any]:
+    if "soql" in event.data:
+        return {"totalSize": await context.run_in_process(query, event.data["soql"])}
+
+    return await context.run_in_process(sum_of_squares, event.data["numbers"])
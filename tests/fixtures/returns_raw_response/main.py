@@ -0,0 +1,43 @@
+import io
+from array import array
+from typing import Any, BinaryIO
+
+import orjson
+
+from salesforce_functions import Context, InvocationEvent, RawResponse
+
+UPSTREAM_JSON = b'{"records":[{"Name":"Example Account"}],"totalSize":1}'
+
+# The files opened for `disk_file` bodies, so that tests can check the runtime closes them.
+opened_files: list[BinaryIO] = []
+
+
+async def function(event: InvocationEvent[Any], _context: Context) -> Any:
+    body_type = event.data["bodyType"]
+
+    if body_type == "bytes":
+        return RawResponse(UPSTREAM_JSON)
+    if body_type == "memoryview":
+        return RawResponse(memoryview(bytearray(UPSTREAM_JSON)))
+    if body_type == "array_memoryview":
+        return RawResponse(
+            memoryview(array("d", [1.0, 2.0])), content_type="application/octet-stream"
+        )
+    if body_type == "large_memoryview":
+        return RawResponse(memoryview(b"[" + b",".join([UPSTREAM_JSON] * 100) + b"]"))
+    if body_type == "file":
+        return RawResponse(io.BytesIO(UPSTREAM_JSON))
+    if body_type == "disk_file":
+        file = open(event.data["path"], "rb")  # pylint: disable=consider-using-with
+        opened_files.append(file)
+        return RawResponse(file)
+    if body_type == "text":
+        return RawResponse(b"hello", content_type="text/plain")
+    if body_type == "binary":
+        return RawResponse(b"\x89PNG\r\n", content_type="image/png")
+    if body_type == "fragment":
+        return orjson.Fragment(UPSTREAM_JSON)
+    if body_type == "nested_fragment":
+        return {"upstream": orjson.Fragment(UPSTREAM_JSON)}
+
+    raise ValueError(f"Unknown body type: {body_type}")
@@ -0,0 +1,9 @@
+import asyncio
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+async def function(event: InvocationEvent[Any], _context: Context) -> str:
+    await asyncio.sleep(event.data["seconds"])
+    return "Finished sleeping"
@@ -0,0 +1,29 @@
+import asyncio
+from typing import Any, AsyncIterator
+
+from salesforce_functions import Context, InvocationEvent
+
+
+async def function(
+    event: InvocationEvent[Any], _context: Context
+) -> AsyncIterator[dict[str, Any]]:
+    # Yields `count` records, optionally raising an exception or sleeping before the record at an index.
+    try:
+        if event.data.get("ignoreCancellation"):
+            # Misbehaves by carrying on regardless of being cancelled (such as by the deadline).
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                pass
+
+        for index in range(event.data["count"]):
+            if index == event.data.get("raiseAt"):
+                raise ValueError(f"Unable to fetch record {index}")
+            if index == event.data.get("sleepAt"):
+                await asyncio.sleep(10)
+            if index == event.data.get("unserializableAt"):
+                yield {"index": index, "name": {f"Record {index}"}}
+            yield {"index": index, "name": f"Record {index}"}
+    finally:
+        if event.data.get("printOnClose"):
+            print("Closed")
@@ -0,0 +1,18 @@
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent, Record
+from salesforce_functions.data_api import SyncDataAPI
+
+
+def function(_event: InvocationEvent[Any], context: Context) -> str:
+    data_api = SyncDataAPI(context.org.data_api)
+    record_id = data_api.create(
+        Record(
+            type="Movie__c",
+            fields={
+                "Name": "Star Wars Episode V: The Empire Strikes Back",
+                "Rating__c": "Excellent",
+            },
+        )
+    )
+    return record_id
@@ -0,0 +1,11 @@
+import threading
+import time
+from typing import Any
+
+from salesforce_functions import Context, InvocationEvent
+
+
+def function(event: InvocationEvent[Any], _context: Context) -> dict[str, Any]:
+    # This would block every other invocation, if it weren't run on the thread pool.
+    time.sleep(event.data["seconds"])
+    return {"thread": threading.current_thread().name}
@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+from typing import Any, TypedDict
+
+from salesforce_functions import Context, InvocationEvent
+
+
+class Contact(TypedDict):
+    email: str
+    phone: str | None
+
+
+@dataclass
+class Payload:
+    account_name: str
+    contacts: list[Contact] = field(default_factory=list)
+    annual_revenue: float | None = None
+
+
+async def function(event: InvocationEvent[Payload], _context: Context) -> Any:
+    payload = event.data
+    return {
+        "type": type(payload).__name__,
+        "accountName": payload.account_name,
+        "emails": [contact["email"] for contact in payload.contacts],
+        "annualRevenue": payload.annual_revenue,
+    }
@@ -0,0 +1,184 @@
+import asyncio
+
+import pytest
+
+from salesforce_functions._internal.admission import (
+    AdmissionClosedError,
+    AdmissionController,
+    AdmissionRejectedError,
+)
+
+
+async def test_unlimited() -> None:
+    admission_controller = AdmissionController(max_in_flight=None, max_queued=0)
+
+    async with admission_controller.admit() as first_admission:
+        async with admission_controller.admit() as second_admission:
+            assert first_admission is None
+            assert second_admission is None
+            assert admission_controller.in_flight == 2
+            assert admission_controller.queued == 0
+
+    assert admission_controller.in_flight == 0
+
+
+async def test_admitted_immediately() -> None:
+    admission_controller = AdmissionController(max_in_flight=2, max_queued=0)
+
+    async with admission_controller.admit() as admission:
+        assert admission is not None
+        assert admission.queue_depth == 0
+        assert admission_controller.in_flight == 1
+
+    assert admission_controller.in_flight == 0
+
+
+async def test_queued_until_slot_available() -> None:
+    admission_controller = AdmissionController(max_in_flight=1, max_queued=5)
+    order: list[str] = []
+
+    async def invocation(name: str, duration: float) -> int | None:
+        async with admission_controller.admit() as admission:
+            order.append(name)
+            await asyncio.sleep(duration)
+            return admission.queue_depth if admission else None
+
+    first = asyncio.create_task(invocation("first", 0.05))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(invocation("second", 0))
+    third = asyncio.create_task(invocation("third", 0))
+    await asyncio.sleep(0)
+
+    assert admission_controller.in_flight == 1
+    assert admission_controller.queued == 2
+
+    assert list(await asyncio.gather(first, second, third)) == [0, 0, 1]
+    assert order == ["first", "second", "third"]
+    assert admission_controller.in_flight == 0
+    assert admission_controller.queued == 0
+
+
+async def test_rejected_when_queue_full() -> None:
+    admission_controller = AdmissionController(max_in_flight=1, max_queued=1)
+    release = asyncio.Event()
+
+    async def invocation() -> None:
+        async with admission_controller.admit():
+            await release.wait()
+
+    first = asyncio.create_task(invocation())
+    second = asyncio.create_task(invocation())
+    await asyncio.sleep(0)
+
+    expected_message = (
+        r"The maximum number of queued invocations \(1\) has been reached,"
+        r" while waiting for one of the 1 in-flight invocations to finish\.$"
+    )
+    with pytest.raises(AdmissionRejectedError, match=expected_message):
+        async with admission_controller.admit():
+            pass  # pragma: no cover
+
+    release.set()
+    await asyncio.gather(first, second)
+    assert admission_controller.in_flight == 0
+
+
+async def test_cancelled_while_queued() -> None:
+    admission_controller = AdmissionController(max_in_flight=1, max_queued=5)
+    release = asyncio.Event()
+
+    async def invocation() -> None:
+        async with admission_controller.admit():
+            await release.wait()
+
+    first = asyncio.create_task(invocation())
+    second = asyncio.create_task(invocation())
+    await asyncio.sleep(0)
+    assert admission_controller.queued == 1
+
+    second.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await second
+
+    assert admission_controller.queued == 0
+    assert admission_controller.cancelled == 1
+    release.set()
+    await first
+    assert admission_controller.in_flight == 0
+
+
+async def test_on_change() -> None:
+    changes: list[tuple[int, int]] = []
+    admission_controller = AdmissionController(
+        max_in_flight=1,
+        max_queued=5,
+        on_change=lambda controller: changes.append(
+            (controller.in_flight, controller.queued)
+        ),
+    )
+
+    async def invocation() -> None:
+        async with admission_controller.admit():
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(invocation(), invocation())
+
+    assert changes == [(1, 0), (1, 1), (1, 0), (0, 0)]
+
+
+async def test_drain() -> None:
+    admission_controller = AdmissionController(max_in_flight=1, max_queued=5)
+    order: list[str] = []
+
+    async def invocation(name: str) -> None:
+        async with admission_controller.admit():
+            await asyncio.sleep(0.05)
+            order.append(name)
+
+    first = asyncio.create_task(invocation("first"))
+    second = asyncio.create_task(invocation("second"))
+    await asyncio.sleep(0)
+    drain = asyncio.create_task(admission_controller.drain(timeout=1))
+    await asyncio.sleep(0)
+
+    # New invocations are rejected, but those that are already queued are still executed.
+    assert admission_controller.closed
+    with pytest.raises(
+        AdmissionClosedError,
+        match=r"^The worker is shutting down, so isn't accepting new invocations\.$",
+    ):
+        async with admission_controller.admit():
+            pass  # pragma: no cover
+
+    assert await drain == 0
+    assert order == ["first", "second"]
+    assert admission_controller.in_flight == 0
+    await asyncio.gather(first, second)
+
+
+async def test_drain_without_invocations() -> None:
+    admission_controller = AdmissionController(max_in_flight=None)
+
+    assert await admission_controller.drain(timeout=0) == 0
+    assert admission_controller.closed
+
+
+async def test_drain_timeout() -> None:
+    admission_controller = AdmissionController(max_in_flight=1, max_queued=5)
+    release = asyncio.Event()
+
+    async def invocation() -> None:
+        async with admission_controller.admit():
+            await release.wait()
+
+    invocations = [asyncio.create_task(invocation()) for _ in range(3)]
+    await asyncio.sleep(0)
+    invocations[2].cancel()
+    await asyncio.sleep(0)
+
+    # One invocation is in flight, one is queued, and one was cancelled.
+    assert await admission_controller.drain(timeout=0.01) == 3
+
+    release.set()
+    await asyncio.gather(*invocations, return_exceptions=True)
+    assert admission_controller.in_flight == 0
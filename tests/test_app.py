@@ -1,22 +1,66 @@
+# pylint: disable=too-many-lines
+import asyncio
 import os
+import pstats
 import re
+import signal
 import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
 from typing import Any
 from unittest.mock import patch
 
 import orjson
 import pytest
+import structlog
+from httpx import Response
 from pytest import CaptureFixture
 from starlette.testclient import TestClient
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from salesforce_functions._internal.app import PROJECT_PATH_ENV_VAR, asgi_app
+from salesforce_functions import get_logger
+from salesforce_functions._internal.app import (
+    _preloaded_functions,  # pyright: ignore [reportPrivateUsage]
+)
+from salesforce_functions._internal.app import (
+    _watch_for_shutdown_signals,  # pyright: ignore [reportPrivateUsage]
+)
+from salesforce_functions._internal.app import (
+    COMPRESSION_MIN_SIZE_ENV_VAR,
+    INIT_TIMEOUT_ENV_VAR,
+    LOG_QUEUE_SIZE_ENV_VAR,
+    LOG_RATE_LIMIT_ENV_VAR,
+    LOG_SAMPLE_RATE_ENV_VAR,
+    MAX_IN_FLIGHT_ENV_VAR,
+    MAX_QUEUED_ENV_VAR,
+    METRICS_DIR_ENV_VAR,
+    PROCESS_POOL_SIZE_ENV_VAR,
+    PROFILE_DIR_ENV_VAR,
+    PROJECT_PATH_ENV_VAR,
+    SHUTDOWN_TIMEOUT_ENV_VAR,
+    THREAD_POOL_SIZE_ENV_VAR,
+    asgi_app,
+    fast_asgi_app,
+    preload_function,
+)
+from salesforce_functions._internal.cloud_event import (
+    BATCH_CONTENT_TYPE,
+    sf_context_cache_info,
+)
+from salesforce_functions._internal.function_loader import FUNCTION_MODULE_NAME
 
 from .utils import (
     WIREMOCK_SERVER_URL,
     encode_cloud_event_extension,
+    generate_batch_event,
     generate_cloud_event_headers,
+    generate_deadline,
     generate_sf_context,
     invoke_function,
+    without_shutdown_log_line,
 )
 
 
@@ -36,7 +80,7 @@ def test_health_check(capsys: CaptureFixture[str]) -> None:
     }
 
     output = capsys.readouterr()
-    assert output.out == ""
+    assert without_shutdown_log_line(output.out) == ""
     assert output.err == ""
 
 
@@ -48,15 +92,31 @@ def test_empty_payload_and_response(capsys: CaptureFixture[str]) -> None:
 
     extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
     exec_time_ms: int = extra_info.pop("execTimeMs")
+    timings_ms: dict[str, float] = extra_info.pop("timingsMs")
     assert extra_info == {
         "requestId": "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179",
         "source": "urn:event:from:salesforce/JS/56.0/00DJS0000000123ABC/apex/ExampleClass:example_function():7",
         "statusCode": 200,
     }
     assert 0 <= exec_time_ms < 1000
+    assert list(timings_ms) == [
+        "bodyRead",
+        "parse",
+        "context",
+        "function",
+        "dataApi",
+        "serialization",
+    ]
+    assert all(0 <= duration_ms < 1000 for duration_ms in timings_ms.values())
+    assert timings_ms["dataApi"] == 0
+    assert re.fullmatch(
+        r"bodyRead;dur=[\d.]+, parse;dur=[\d.]+, context;dur=[\d.]+, function;dur=[\d.]+,"
+        r" dataApi;dur=0\.0, serialization;dur=[\d.]+",
+        response.headers["Server-Timing"],
+    )
 
     output = capsys.readouterr()
-    assert output.out == ""
+    assert without_shutdown_log_line(output.out) == ""
     assert output.err == ""
 
 
@@ -92,10 +152,15 @@ def test_minimal_event_attributes() -> None:
 
 def test_context_attributes() -> None:
     payload = {"record_id": 12345}
-    response = invoke_function("tests/fixtures/returns_context", json=payload)
+    response = invoke_function(
+        "tests/fixtures/returns_context",
+        headers=generate_cloud_event_headers(deadline="2999-01-19T10:11:12.468085Z"),
+        json=payload,
+    )
     assert response.status_code == 200
     assert response.headers.get("Content-Type") == "application/json"
     assert response.json() == {
+        "deadline": "2999-01-19T10:11:12.468085+00:00",
         "org": {
             "base_url": "https://example-base-url.my.salesforce-sites.com",
             "data_api": "REMOVED",
@@ -118,6 +183,7 @@ def test_minimal_context_attributes() -> None:
     assert response.status_code == 200
     assert response.headers.get("Content-Type") == "application/json"
     assert response.json() == {
+        "deadline": None,
         "org": {
             "base_url": "https://example-base-url.my.salesforce-sites.com",
             "data_api": "REMOVED",
@@ -146,6 +212,80 @@ def test_data_api() -> None:
     assert response.headers.get("Content-Type") == "application/json"
     assert response.json() == "a00B000000FSkcvIAD"
 
+    extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
+    timings_ms: dict[str, float] = extra_info["timingsMs"]
+    assert 0 < timings_ms["dataApi"] <= timings_ms["function"]
+
+
+def test_sync_function() -> None:
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/sync_function",
+        THREAD_POOL_SIZE_ENV_VAR: "2",
+    }
+    headers = generate_cloud_event_headers()
+
+    with patch.dict(os.environ, env):
+        with TestClient(asgi_app) as client:
+            with ThreadPoolExecutor() as executor:
+                blocking = executor.submit(
+                    client.post, "/", headers=headers, json={"seconds": 1}
+                )
+                time.sleep(0.2)
+                # The blocked thread doesn't stop other invocations from being handled.
+                start_time = time.perf_counter()
+                response = client.post("/", headers=headers, json={"seconds": 0})
+                assert time.perf_counter() - start_time < 0.5
+                blocking_response = blocking.result()
+
+    for result in (response, blocking_response):
+        assert result.status_code == 200
+        assert result.json()["thread"].startswith("sf-functions-sync")
+
+
+@pytest.mark.requires_wiremock
+def test_sync_function_data_api() -> None:
+    sf_context = generate_sf_context()
+    assert isinstance(sf_context["userContext"], dict)
+    sf_context["userContext"]["orgDomainUrl"] = WIREMOCK_SERVER_URL
+
+    headers = generate_cloud_event_headers()
+    headers["ce-sfcontext"] = encode_cloud_event_extension(sf_context)
+    response = invoke_function("tests/fixtures/sync_data_api", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == "a00B000000FSkcvIAD"
+
+    extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
+    timings_ms: dict[str, float] = extra_info["timingsMs"]
+    assert 0 < timings_ms["dataApi"] <= timings_ms["function"]
+
+
+def test_process_pool() -> None:
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/process_pool",
+        PROCESS_POOL_SIZE_ENV_VAR: "2",
+    }
+
+    with patch.dict(os.environ, env):
+        with TestClient(asgi_app) as client:
+            response = client.post(
+                "/", headers=generate_cloud_event_headers(), json={"numbers": [1, 2, 3]}
+            )
+
+    assert response.status_code == 200
+    assert response.json()["result"] == 14
+    assert response.json()["pid"] != os.getpid()
+
+
+def test_process_pool_disabled() -> None:
+    response = invoke_function(
+        "tests/fixtures/process_pool", json={"numbers": [1, 2, 3]}
+    )
+
+    # Without a process pool, the callable is run on a thread in the current process instead.
+    assert response.status_code == 200
+    assert response.json() == {"result": 14, "pid": os.getpid()}
+
 
 def test_logging(capsys: CaptureFixture[str]) -> None:
     response = invoke_function("tests/fixtures/logging")
@@ -153,9 +293,9 @@ def test_logging(capsys: CaptureFixture[str]) -> None:
 
     output = capsys.readouterr()
     # Only `info` log levels and above should be output by default.
-    assert "level=debug" not in output.out
+    assert "level=debug" not in without_shutdown_log_line(output.out)
     assert (
-        output.out
+        without_shutdown_log_line(output.out)
         == """Print works but output isn't structured
 invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=info msg="Info message"
 invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=warning msg="Warning message"
@@ -167,6 +307,64 @@ record_id=12345 invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179
     assert output.err == ""
 
 
+def test_log_sampling(capsys: CaptureFixture[str]) -> None:
+    with patch.dict(os.environ, {LOG_SAMPLE_RATE_ENV_VAR: "0.1"}):
+        response = invoke_function(
+            "tests/fixtures/logs_per_record", json={"count": 100}
+        )
+    assert response.status_code == 200
+
+    invocation_id = "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179"
+    output = capsys.readouterr()
+    # Each call site is sampled separately, and warnings are never sampled.
+    assert without_shutdown_log_line(output.out) == (
+        "".join(
+            f'index={index} invocationId={invocation_id} level=info msg="Processing record"\n'
+            + (
+                f'index=9 invocationId={invocation_id} level=info msg="Processed batch of records"\n'
+                if index == 0
+                else ""
+            )
+            for index in range(0, 100, 10)
+        )
+        + f'invocationId={invocation_id} level=warning msg="Finished processing records"\n'
+        + f"droppedBySampling=99 droppedByRateLimit=0 invocationId={invocation_id} level=info"
+        ' msg="Suppressed log lines due to log sampling or rate limiting"\n'
+    )
+
+
+def test_log_rate_limit(capsys: CaptureFixture[str]) -> None:
+    events = [
+        generate_batch_event(f"example-id-{index}", data={"count": 100})
+        for index in range(1, 3)
+    ]
+    with patch.dict(os.environ, {LOG_RATE_LIMIT_ENV_VAR: "2"}):
+        response, results = invoke_batch("tests/fixtures/logs_per_record", events)
+    assert response.status_code == 200
+    assert [result["statusCode"] for result in results] == [200, 200]
+
+    # The events of a batch are limited separately, each with their own summary.
+    lines = capsys.readouterr().out.splitlines()
+    for invocation_id in ["example-id-1", "example-id-2"]:
+        event_lines = [
+            line for line in lines if f"invocationId={invocation_id} " in line
+        ]
+        assert len(event_lines) == 6
+        assert event_lines[-1] == (
+            f"droppedBySampling=0 droppedByRateLimit=106 invocationId={invocation_id}"
+            ' level=info msg="Suppressed log lines due to log sampling or rate limiting"'
+        )
+
+
+def test_log_limits_not_exceeded(capsys: CaptureFixture[str]) -> None:
+    with patch.dict(os.environ, {LOG_RATE_LIMIT_ENV_VAR: "10"}):
+        response = invoke_function("tests/fixtures/logs_per_record", json={"count": 5})
+    assert response.status_code == 200
+
+    # The summary is only logged if lines were suppressed.
+    assert "Suppressed log lines" not in capsys.readouterr().out
+
+
 def test_template_function() -> None:
     # TODO: Create a WireMock mapping for the template function's data API usage, and make
     # this test actually invoke the function, rather than just performing a health check.
@@ -180,6 +378,50 @@ def test_template_function() -> None:
     assert response.json() == "OK"
 
 
+def test_preloaded_function() -> None:
+    project_path = Path("tests/fixtures/basic")
+    preload_function(project_path)
+
+    try:
+        with patch(
+            "salesforce_functions._internal.app.load_function"
+        ) as mock_load_function:
+            response = invoke_function(str(project_path))
+            mock_load_function.assert_not_called()
+    finally:
+        _preloaded_functions.clear()
+
+    assert response.status_code == 200
+
+
+def test_preloaded_function_logging(capsys: CaptureFixture[str]) -> None:
+    project_path = Path("tests/fixtures/logging")
+    # Undoes the logging configuration of earlier tests, as if the function were being preloaded by the CLI.
+    structlog.reset_defaults()
+
+    try:
+        with patch.dict(os.environ, {LOG_QUEUE_SIZE_ENV_VAR: "100"}):
+            preload_function(project_path)
+            # Logging is configured before the function is imported, so lines logged before the app
+            # starts (such as when the function's module is imported) are output in logfmt format,
+            # by the same log writer that the app then uses (and closes on shutdown).
+            get_logger().info("Logged when preloaded")
+            response = invoke_function(str(project_path))
+    finally:
+        _preloaded_functions.clear()
+
+    assert response.status_code == 200
+
+    output = capsys.readouterr()
+    lines = output.out.splitlines()
+    assert 'level=info msg="Logged when preloaded"' in lines
+    assert (
+        'invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=info msg="Info message"'
+        in lines
+    )
+    assert output.err == ""
+
+
 def test_invalid_config() -> None:
     expected_message = (
         r"Unable to load function: Didn't find a project.toml file at .+\.$"
@@ -218,11 +460,66 @@ def test_invalid_function() -> None:
             pass
 
 
+def test_lifecycle_hooks(capsys: CaptureFixture[str]) -> None:
+    response = invoke_function("tests/fixtures/lifecycle_hooks")
+
+    assert response.status_code == 200
+    assert response.json() == {"one": 1, "two": 2}
+
+    output = capsys.readouterr()
+    assert re.fullmatch(
+        r"""level=info msg="Initialized lookup table"
+initDurationMs=\d+ level=info msg="Finished executing the function's 'init' hook"
+level=info msg="Cleared lookup table"
+""",
+        without_shutdown_log_line(output.out),
+    )
+
+
+def test_init_hook_raises_exception() -> None:
+    expected_message = (
+        r"Unable to load function: Exception occurred while executing the 'init' hook:\n\n"
+        r"Traceback \(most recent call last\):\n.+ValueError: Some init error\n$"
+    )
+
+    try:
+        with pytest.raises(RuntimeError, match=re.compile(expected_message, re.DOTALL)):
+            invoke_function("tests/fixtures/init_raises_exception")
+
+        assert getattr(sys, "tracebacklimit", None) == 0
+    finally:
+        try:
+            # Prevent the traceback output in later tests from being truncated too.
+            del sys.tracebacklimit
+        except AttributeError:
+            pass
+
+
+def test_init_hook_exceeds_timeout() -> None:
+    expected_message = (
+        r"Unable to load function: The 'init' hook didn't finish within 0\.1 seconds\.$"
+    )
+
+    try:
+        with patch.dict(os.environ, {INIT_TIMEOUT_ENV_VAR: "0.1"}):
+            with pytest.raises(RuntimeError, match=expected_message):
+                invoke_function("tests/fixtures/init_exceeds_timeout")
+
+        assert getattr(sys, "tracebacklimit", None) == 0
+    finally:
+        try:
+            # Prevent the traceback output in later tests from being truncated too.
+            del sys.tracebacklimit
+        except AttributeError:
+            pass
+
+
 def test_cloud_event_headers_missing(capsys: CaptureFixture[str]) -> None:
     response = invoke_function("tests/fixtures/basic", headers={})
 
     expected_message = (
-        "Couldn't parse CloudEvent: Content-Type must be 'application/json' not ''"
+        "Couldn't parse CloudEvent: Content-Type must be 'application/json'"
+        " or 'application/msgpack' not ''"
     )
     assert response.status_code == 400
     assert response.headers.get("Content-Type") == "application/json"
@@ -230,28 +527,34 @@ def test_cloud_event_headers_missing(capsys: CaptureFixture[str]) -> None:
 
     extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
     stack: str = extra_info.pop("stack")
+    timings_ms: dict[str, float] = extra_info.pop("timingsMs")
     assert extra_info == {
         "isFunctionError": False,
         "requestId": "n/a",
         "source": "n/a",
         "statusCode": 400,
     }
+    assert list(timings_ms) == ["bodyRead", "parse", "serialization"]
     assert re.fullmatch(
         r"""Traceback \(most recent call last\):
   .+
-salesforce_functions._internal.cloud_event.CloudEventError: Content-Type must be 'application/json' not ''
+salesforce_functions._internal.cloud_event.CloudEventError: Content-Type must be .+ not ''
 """,
         stack,
         flags=re.DOTALL,
     )
 
     output = capsys.readouterr()
-    assert output.out == f'level=error msg="{expected_message}"\n'
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'level=error msg="{expected_message}"\n'
+    )
     assert output.err == ""
 
 
 def test_cloud_event_body_not_json(capsys: CaptureFixture[str]) -> None:
-    response = invoke_function("tests/fixtures/basic", content="Not json")
+    # The payload is only decoded once the function accesses `event.data`.
+    response = invoke_function("tests/fixtures/sleeps", content="Not json")
 
     expected_message = (
         "Couldn't parse CloudEvent: Data payload isn't valid JSON:"
@@ -263,12 +566,15 @@ def test_cloud_event_body_not_json(capsys: CaptureFixture[str]) -> None:
 
     extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
     stack: str = extra_info.pop("stack")
+    extra_info.pop("execTimeMs")
+    timings_ms: dict[str, float] = extra_info.pop("timingsMs")
     assert extra_info == {
         "isFunctionError": False,
-        "requestId": "n/a",
-        "source": "n/a",
+        "requestId": "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179",
+        "source": "urn:event:from:salesforce/JS/56.0/00DJS0000000123ABC/apex/ExampleClass:example_function():7",
         "statusCode": 400,
     }
+    assert "function" in timings_ms
     assert re.fullmatch(
         r"""Traceback \(most recent call last\):
   .+
@@ -279,10 +585,39 @@ salesforce_functions._internal.cloud_event.CloudEventError: Data payload isn't v
     )
 
     output = capsys.readouterr()
-    assert output.out == f'level=error msg="{expected_message}"\n'
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=error msg="{expected_message}"\n'
+    )
     assert output.err == ""
 
 
+def test_cloud_event_body_not_json_unused() -> None:
+    # Functions that don't access `event.data` don't pay for (or fail due to) decoding the payload.
+    response = invoke_function("tests/fixtures/basic", content="Not json")
+
+    assert response.status_code == 200
+    assert response.json() is None
+
+
+@pytest.mark.parametrize("content", [b'{"records":[1,2,3]}', b"Not json"])
+def test_raw_data(content: bytes) -> None:
+    response = invoke_function("tests/fixtures/forwards_raw_data", content=content)
+
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_typed_payload_not_json() -> None:
+    # Payloads that need converting to the function's annotated type are still decoded up front.
+    response = invoke_function("tests/fixtures/typed_payload", content="Not json")
+
+    assert response.status_code == 400
+    assert response.json().startswith(
+        "Couldn't parse CloudEvent: Data payload isn't valid JSON:"
+    )
+
+
 def test_function_raises_exception_at_runtime(capsys: CaptureFixture[str]) -> None:
     assert not hasattr(sys, "tracebacklimit"), (
         "A custom `sys.tracebacklimit` is still defined but should not be, otherwise it"
@@ -298,6 +633,7 @@ def test_function_raises_exception_at_runtime(capsys: CaptureFixture[str]) -> No
 
     extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
     exec_time_ms: int = extra_info.pop("execTimeMs")
+    extra_info.pop("timingsMs")
     stack: str = extra_info.pop("stack")
     assert extra_info == {
         "isFunctionError": True,
@@ -326,7 +662,31 @@ ZeroDivisionError: division by zero
 ZeroDivisionError: division by zero
 invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=error msg="{expected_message}"
 """,
-        output.out,
+        without_shutdown_log_line(output.out),
+        flags=re.DOTALL,
+    )
+    assert output.err == ""
+
+
+def test_queued_logging(capsys: CaptureFixture[str]) -> None:
+    with patch.dict(os.environ, {LOG_QUEUE_SIZE_ENV_VAR: "100"}):
+        response = invoke_function("tests/fixtures/raises_exception_at_runtime")
+
+    expected_message = "Exception occurred while executing function: ZeroDivisionError: division by zero"
+    assert response.status_code == 500
+
+    # The log lines are written by the log writer's thread, which is flushed on shutdown, and the
+    # output matches that when logging synchronously.
+    output = capsys.readouterr()
+    assert re.fullmatch(
+        rf"""Traceback \(most recent call last\):
+  File ".+app.py", line \d+, in _handle_function_invocation
+    function_result = await function\(event, context\)
+  .+
+ZeroDivisionError: division by zero
+invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=error msg="{expected_message}"
+""",
+        without_shutdown_log_line(output.out),
         flags=re.DOTALL,
     )
     assert output.err == ""
@@ -342,6 +702,7 @@ def test_return_value_not_serializable(capsys: CaptureFixture[str]) -> None:
 
     extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
     exec_time_ms: int = extra_info.pop("execTimeMs")
+    extra_info.pop("timingsMs")
     stack: str = extra_info.pop("stack")
     assert extra_info == {
         "isFunctionError": True,
@@ -361,75 +722,1307 @@ TypeError: Type is not JSON serializable: set
 
     output = capsys.readouterr()
     assert (
-        output.out
+        without_shutdown_log_line(output.out)
         == f'invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=error msg="{expected_message}"\n'
     )
     assert output.err == ""
 
 
-def test_internal_error(capsys: CaptureFixture[str]) -> None:
-    with patch(
-        "salesforce_functions._internal.app.SalesforceFunctionsCloudEvent.from_http",
-        side_effect=ValueError("Some internal error"),
-    ):
-        response = invoke_function(
-            "tests/fixtures/basic", raise_server_exceptions=False
-        )
+def test_function_exceeds_deadline(capsys: CaptureFixture[str]) -> None:
+    response = invoke_function(
+        "tests/fixtures/sleeps",
+        headers=generate_cloud_event_headers(
+            deadline=generate_deadline(timedelta(milliseconds=200))
+        ),
+        json={"seconds": 10},
+    )
 
-    expected_message = "Internal error: ValueError: Some internal error"
-    assert response.status_code == 503
+    expected_message = "Function didn't finish executing before the invocation deadline"
+    assert response.status_code == 504
     assert response.headers.get("Content-Type") == "application/json"
     assert response.json() == expected_message
 
     extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
-    stack: str = extra_info.pop("stack")
+    exec_time_ms: int = extra_info.pop("execTimeMs")
+    timings_ms: dict[str, float] = extra_info.pop("timingsMs")
     assert extra_info == {
-        "isFunctionError": False,
-        "requestId": "n/a",
-        "source": "n/a",
-        "statusCode": 503,
+        "isFunctionError": True,
+        "requestId": "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179",
+        "source": "urn:event:from:salesforce/JS/56.0/00DJS0000000123ABC/apex/ExampleClass:example_function():7",
+        "statusCode": 504,
     }
-    assert re.fullmatch(
-        r"""Traceback \(most recent call last\):
-  .+
-ValueError: Some internal error
-""",
-        stack,
-        flags=re.DOTALL,
+    assert 0 < exec_time_ms < 5000
+    assert 0 < timings_ms["function"] < 5000
+
+    output = capsys.readouterr()
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=error msg="{expected_message}"\n'
+    )
+    assert output.err == ""
+
+
+def test_function_finishes_before_deadline() -> None:
+    response = invoke_function(
+        "tests/fixtures/sleeps",
+        headers=generate_cloud_event_headers(
+            deadline=generate_deadline(timedelta(seconds=30))
+        ),
+        json={"seconds": 0},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == "Finished sleeping"
+
+
+def test_deadline_already_passed(capsys: CaptureFixture[str]) -> None:
+    response = invoke_function(
+        "tests/fixtures/sleeps",
+        headers=generate_cloud_event_headers(deadline="2023-01-19T10:11:12.468085Z"),
+        json={"seconds": 0},
+    )
+
+    expected_message = (
+        "Function invocation deadline passed before the function started executing"
     )
+    assert response.status_code == 504
+    assert response.headers.get("Content-Type") == "application/json"
+    assert response.json() == expected_message
+
+    extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
+    timings_ms: dict[str, float] = extra_info.pop("timingsMs")
+    assert extra_info == {
+        "isFunctionError": True,
+        "requestId": "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179",
+        "source": "urn:event:from:salesforce/JS/56.0/00DJS0000000123ABC/apex/ExampleClass:example_function():7",
+        "statusCode": 504,
+    }
+    # The function was never executed.
+    assert list(timings_ms) == ["bodyRead", "parse", "context", "serialization"]
 
     output = capsys.readouterr()
-    assert re.fullmatch(
-        rf"""Traceback \(most recent call last\):
-  .+
-ValueError: Some internal error
-level=error msg="{expected_message}"
-""",
-        output.out,
-        flags=re.DOTALL,
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179 level=error msg="{expected_message}"\n'
     )
     assert output.err == ""
 
 
-def test_nonexistent_path() -> None:
-    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+def test_admission_control(  # pylint: disable=too-many-locals
+    capsys: CaptureFixture[str],
+) -> None:
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/sleeps",
+        MAX_IN_FLIGHT_ENV_VAR: "1",
+        MAX_QUEUED_ENV_VAR: "1",
+    }
+    headers = generate_cloud_event_headers()
+
+    with patch.dict(os.environ, env):
         with TestClient(asgi_app) as client:
-            response = client.post("/nonexistent")
+            with ThreadPoolExecutor() as executor:
+                in_flight = executor.submit(
+                    client.post, "/", headers=headers, json={"seconds": 1}
+                )
+                time.sleep(0.2)
+                queued = executor.submit(
+                    client.post, "/", headers=headers, json={"seconds": 0}
+                )
+                time.sleep(0.2)
+                rejected_response = client.post(
+                    "/", headers=headers, json={"seconds": 0}
+                )
+                in_flight_response = in_flight.result()
+                queued_response = queued.result()
+
+    assert in_flight_response.status_code == 200
+    in_flight_extra_info = orjson.loads(in_flight_response.headers["x-extra-info"])
+    assert in_flight_extra_info["queueDepth"] == 0
+    assert 0 <= in_flight_extra_info["queueWaitMs"] < 100
+
+    assert queued_response.status_code == 200
+    queued_extra_info = orjson.loads(queued_response.headers["x-extra-info"])
+    assert queued_extra_info["queueDepth"] == 0
+    assert 500 <= queued_extra_info["queueWaitMs"] < 2000
+
+    expected_message = "Function invocation rejected since the worker is at capacity"
+    expected_reason = (
+        "The maximum number of queued invocations (1) has been reached,"
+        " while waiting for one of the 1 in-flight invocations to finish."
+    )
+    assert rejected_response.status_code == 429
+    assert rejected_response.json() == expected_message
+    rejected_extra_info = orjson.loads(rejected_response.headers["x-extra-info"])
+    assert list(rejected_extra_info.pop("timingsMs")) == [
+        "bodyRead",
+        "parse",
+        "serialization",
+    ]
+    assert rejected_extra_info == {
+        "isFunctionError": False,
+        "reason": expected_reason,
+        "requestId": "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179",
+        "source": "urn:event:from:salesforce/JS/56.0/00DJS0000000123ABC/apex/ExampleClass:example_function():7",
+        "statusCode": 429,
+    }
 
-    assert response.status_code == 404
+    output = capsys.readouterr()
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'reason="{expected_reason}" invocationId=00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179'
+        f' level=warning msg="{expected_message}"\n'
+    )
 
 
-def test_unsupported_http_method_get() -> None:
-    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+def test_background_tasks(tmp_path: Path) -> None:
+    path = tmp_path.joinpath("output.txt")
+
+    with patch.dict(
+        os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/background_tasks"}
+    ):
         with TestClient(asgi_app) as client:
-            response = client.get("/")
+            response = client.post(
+                "/", headers=generate_cloud_event_headers(), json={"path": str(path)}
+            )
+            # The response is returned before the background task has finished.
+            assert response.status_code == 200
+            assert response.json() == "Scheduled background task"
+            assert not path.exists()
 
-    assert response.status_code == 405
+        # Background tasks are drained when the app shuts down.
+        assert path.read_text() == "Written in the background"
 
 
-def test_unsupported_http_method_delete() -> None:
-    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
-        with TestClient(asgi_app) as client:
-            response = client.delete("/")
+def test_shutdown_drains_in_flight_invocations(capsys: CaptureFixture[str]) -> None:
+    headers = generate_cloud_event_headers()
 
-    assert response.status_code == 405
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/sleeps"}):
+        with ThreadPoolExecutor() as executor:
+            with TestClient(asgi_app) as client:
+                in_flight = executor.submit(
+                    client.post, "/", headers=headers, json={"seconds": 0.5}
+                )
+                time.sleep(0.2)
+            # The app has shut down, but only once the in-flight invocation finished.
+            assert in_flight.done()
+
+    response = in_flight.result()
+    assert response.status_code == 200
+    assert response.json() == "Finished sleeping"
+
+    output = capsys.readouterr()
+    assert re.fullmatch(
+        r"shutdownDurationMs=\d+ abortedInvocations=0 level=info"
+        r' msg="Finished draining in-flight work before shutting down"\n',
+        output.out,
+    )
+
+
+def test_shutdown_timeout(capsys: CaptureFixture[str]) -> None:
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/sleeps",
+        SHUTDOWN_TIMEOUT_ENV_VAR: "0.1",
+    }
+    headers = generate_cloud_event_headers()
+
+    with patch.dict(os.environ, env):
+        with ThreadPoolExecutor() as executor:
+            with TestClient(asgi_app) as client:
+                in_flight = executor.submit(
+                    client.post, "/", headers=headers, json={"seconds": 0.5}
+                )
+                time.sleep(0.2)
+
+    # The invocation isn't cancelled, but would fail if it used the Data API after shutdown.
+    assert in_flight.result().status_code == 200
+
+    output = capsys.readouterr()
+    assert re.fullmatch(
+        r"shutdownDurationMs=\d+ abortedInvocations=1 level=warning"
+        r' msg="Finished draining in-flight work before shutting down"\n',
+        output.out,
+    )
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires SIGTERM handlers")
+async def test_watch_for_shutdown_signals() -> None:
+    received_signals: list[int] = []
+    original_handler = signal.signal(
+        signal.SIGTERM, lambda signum, _frame: received_signals.append(signum)
+    )
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    shutdown_started = asyncio.Event()
+
+    try:
+        stop_watching = _watch_for_shutdown_signals(shutdown_started.set)
+        signal.raise_signal(signal.SIGTERM)
+        await asyncio.wait_for(shutdown_started.wait(), timeout=5)
+
+        # The signal is still passed on to the previous handler (which is uvicorn's when serving).
+        assert received_signals == [signal.SIGTERM]
+
+        stop_watching()
+        assert signal.getsignal(signal.SIGTERM) is previous_handler
+    finally:
+        signal.signal(signal.SIGTERM, original_handler)
+
+
+def invoke_batch(
+    fixture_path: str, events: list[Any], app: ASGIApp = asgi_app
+) -> tuple[Response, list[dict[str, Any]]]:
+    response = invoke_function(
+        fixture_path,
+        headers={"Content-Type": BATCH_CONTENT_TYPE},
+        content=orjson.dumps(events),
+        app=app,
+    )
+    results: list[dict[str, Any]] = (
+        response.json() if response.status_code == 200 else []
+    )
+    return response, results
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_batch(app: ASGIApp, capsys: CaptureFixture[str]) -> None:
+    invalid_event = generate_batch_event("example-id-4")
+    invalid_event.pop("id")
+    events = [
+        generate_batch_event(f"example-id-{index}", data={"seconds": 0.5})
+        for index in range(1, 4)
+    ]
+
+    start_time = time.perf_counter()
+    response, results = invoke_batch(
+        "tests/fixtures/sleeps", [*events, invalid_event], app=app
+    )
+
+    # The events are invoked concurrently.
+    assert time.perf_counter() - start_time < 1.4
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "application/json"
+    assert list(orjson.loads(response.headers["x-extra-info"])["timingsMs"]) == [
+        "bodyRead",
+        "parse",
+        "serialization",
+    ]
+
+    assert [result["statusCode"] for result in results] == [200, 200, 200, 400]
+    for index, result in enumerate(results[:3], start=1):
+        assert result["data"] == "Finished sleeping"
+        assert result["extraInfo"]["requestId"] == f"example-id-{index}"
+        assert result["extraInfo"]["statusCode"] == 200
+        assert "function" in result["extraInfo"]["timingsMs"]
+
+    expected_message = "Couldn't parse CloudEvent: Missing required attribute 'id'"
+    assert results[3]["data"] == expected_message
+    assert results[3]["extraInfo"]["isFunctionError"] is False
+
+    output = capsys.readouterr()
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'level=error msg="{expected_message}"\n'
+    )
+
+
+def test_batch_invalid_payload(capsys: CaptureFixture[str]) -> None:
+    response, _ = invoke_batch(
+        "tests/fixtures/basic", generate_batch_event("example-id-1")  # type: ignore[arg-type]
+    )
+
+    expected_message = (
+        "Couldn't parse CloudEvent batch: Batch payload must be a JSON array of events"
+    )
+    assert response.status_code == 400
+    assert response.json() == expected_message
+
+    output = capsys.readouterr()
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'level=error msg="{expected_message}"\n'
+    )
+
+
+def test_batch_function() -> None:
+    events = [
+        generate_batch_event("example-id-1", data=1),
+        generate_batch_event("example-id-2", data=2, access_token="OTHER-TOKEN"),
+        generate_batch_event("example-id-3", data=3),
+    ]
+    response, results = invoke_batch("tests/fixtures/batch_function", events)
+
+    assert response.status_code == 200
+    # The events are grouped by org and user, with the results returned in the original order.
+    assert [result["data"] for result in results] == [
+        {"data": 1, "batchSize": 2},
+        {"data": 2, "batchSize": 1},
+        {"data": 3, "batchSize": 2},
+    ]
+    assert [result["extraInfo"]["requestId"] for result in results] == [
+        "example-id-1",
+        "example-id-2",
+        "example-id-3",
+    ]
+
+
+def test_batch_function_raises_exception(capsys: CaptureFixture[str]) -> None:
+    events = [
+        generate_batch_event("example-id-1", data="raise"),
+        generate_batch_event("example-id-2", data=2),
+        generate_batch_event("example-id-3", data=3, access_token="OTHER-TOKEN"),
+    ]
+    _, results = invoke_batch("tests/fixtures/batch_function", events)
+
+    # Every event in the group that raised the exception fails, but the other groups don't.
+    expected_message = (
+        "Exception occurred while executing function: ValueError: Some error"
+    )
+    assert [result["statusCode"] for result in results] == [500, 500, 200]
+    assert results[0]["data"] == expected_message
+    assert results[1]["data"] == expected_message
+    assert results[1]["extraInfo"]["isFunctionError"] is True
+    assert results[1]["extraInfo"]["stack"].endswith("ValueError: Some error\n")
+
+    output = capsys.readouterr()
+    assert (
+        f'invocationId=example-id-1,example-id-2 level=error msg="{expected_message}"\n'
+        in output.out
+    )
+
+
+def test_batch_function_wrong_number_of_results(capsys: CaptureFixture[str]) -> None:
+    events = [
+        generate_batch_event("example-id-1", data="wrong_length"),
+        generate_batch_event("example-id-2", data=2),
+    ]
+    _, results = invoke_batch("tests/fixtures/batch_function", events)
+
+    expected_message = (
+        "Function batch_function() must return a list containing one result per event"
+        " (expected 2 results)"
+    )
+    assert [result["statusCode"] for result in results] == [500, 500]
+    assert results[0]["data"] == expected_message
+
+    output = capsys.readouterr()
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'invocationId=example-id-1,example-id-2 level=error msg="{expected_message}"\n'
+    )
+
+
+def test_batch_function_deadline_already_passed() -> None:
+    events = [
+        generate_batch_event("example-id-1", data=1),
+        generate_batch_event(
+            "example-id-2", data=2, deadline="2023-01-19T10:11:12.468085Z"
+        ),
+    ]
+    _, results = invoke_batch("tests/fixtures/batch_function", events)
+
+    # The group shares the earliest deadline of any of its events.
+    assert [result["statusCode"] for result in results] == [504, 504]
+
+
+def test_batch_metrics() -> None:
+    events = [generate_batch_event(f"example-id-{index}") for index in range(3)]
+
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+        with TestClient(asgi_app) as client:
+            client.post(
+                "/",
+                headers={"Content-Type": BATCH_CONTENT_TYPE},
+                content=orjson.dumps(events),
+            )
+            metrics = client.get("/metrics").text
+
+    # Each event counts as an invocation, whereas the batch is parsed once.
+    assert 'sf_functions_invocations_total{status_code="200"} 3\n' in metrics
+    assert "sf_functions_cloudevent_parse_duration_seconds_count 1\n" in metrics
+    assert "sf_functions_function_execution_duration_seconds_count 3\n" in metrics
+    assert "sf_functions_request_size_bytes_count 1\n" in metrics
+
+
+def invoke_with_compression(
+    data: Any,
+    accept_encoding: str,
+    compression_min_size: str | None = "1024",
+    app: ASGIApp = asgi_app,
+) -> Response:
+    env = {}
+    if compression_min_size is not None:
+        env[COMPRESSION_MIN_SIZE_ENV_VAR] = compression_min_size
+
+    with patch.dict(os.environ, env):
+        return invoke_function(
+            "tests/fixtures/returns_event",
+            headers={
+                **generate_cloud_event_headers(),
+                "Accept-Encoding": accept_encoding,
+            },
+            json=data,
+            app=app,
+        )
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_response_compression(app: ASGIApp) -> None:
+    data = [
+        {"Id": f"001B000001{index:08}", "Name": "Example Account"}
+        for index in range(1000)
+    ]
+    response = invoke_with_compression(data, "br;q=0.5, gzip", app=app)
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "accept-encoding"
+    # The response is transparently decompressed by the client.
+    assert response.json()["data"] == data
+    assert response.num_bytes_downloaded < len(response.content) / 10
+    assert int(response.headers["Content-Length"]) == response.num_bytes_downloaded
+
+
+@pytest.mark.parametrize(
+    "data,accept_encoding,compression_min_size",
+    [
+        # The body is smaller than the minimum size.
+        ("A" * 100, "gzip", "1024"),
+        # Compression is disabled by default.
+        ("A" * 2000, "gzip", None),
+        # The client doesn't accept any supported encodings.
+        ("A" * 2000, "identity, gzip;q=0", "1024"),
+    ],
+)
+def test_response_compression_not_used(
+    data: str, accept_encoding: str, compression_min_size: str | None
+) -> None:
+    response = invoke_with_compression(data, accept_encoding, compression_min_size)
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+    assert response.json()["data"] == data
+
+
+def test_metrics_response_compression() -> None:
+    event = generate_batch_event("example-id-1", data="A" * 2000)
+
+    with patch.dict(
+        os.environ,
+        {
+            PROJECT_PATH_ENV_VAR: "tests/fixtures/returns_event",
+            COMPRESSION_MIN_SIZE_ENV_VAR: "1024",
+        },
+    ):
+        with TestClient(asgi_app) as client:
+            response = client.post(
+                "/",
+                headers={"Content-Type": BATCH_CONTENT_TYPE, "Accept-Encoding": "gzip"},
+                content=orjson.dumps([event]),
+            )
+            metrics = client.get("/metrics").text
+
+    # Batch responses are compressed as a whole.
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert 'sf_functions_compressed_responses_total{encoding="gzip"} 1\n' in metrics
+    assert 'sf_functions_compressed_responses_total{encoding="br"} 0\n' in metrics
+    assert "sf_functions_response_compression_duration_seconds_count 1\n" in metrics
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_msgpack(app: ASGIApp) -> None:
+    ormsgpack = pytest.importorskip("ormsgpack")
+    headers = {
+        **generate_cloud_event_headers(),
+        "Content-Type": "application/msgpack",
+        "Accept": "application/msgpack",
+    }
+    data = {"binary": b"\x00\x01", "numbers": [1, 2.5]}
+
+    response = invoke_function(
+        "tests/fixtures/returns_event",
+        headers=headers,
+        content=ormsgpack.packb(data),
+        app=app,
+    )
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "application/msgpack"
+    event = ormsgpack.unpackb(response.content)
+    assert event["data"] == data
+    assert event["id"] == "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179"
+    # The extra info header is always JSON.
+    assert orjson.loads(response.headers["x-extra-info"])["statusCode"] == 200
+
+
+def test_msgpack_request_json_response() -> None:
+    ormsgpack = pytest.importorskip("ormsgpack")
+    headers = {**generate_cloud_event_headers(), "Content-Type": "application/msgpack"}
+
+    response = invoke_function(
+        "tests/fixtures/returns_event",
+        headers=headers,
+        content=ormsgpack.packb({"numbers": [1, 2.5]}),
+    )
+
+    # Without an `Accept` header that requests MessagePack, the response is JSON.
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "application/json"
+    assert response.json()["data"] == {"numbers": [1, 2.5]}
+
+
+def test_msgpack_error_response(capsys: CaptureFixture[str]) -> None:
+    ormsgpack = pytest.importorskip("ormsgpack")
+    headers = {**generate_cloud_event_headers(), "Accept": "application/msgpack"}
+
+    response = invoke_function(
+        "tests/fixtures/return_value_not_serializable", headers=headers
+    )
+
+    assert response.status_code == 500
+    assert response.headers.get("Content-Type") == "application/msgpack"
+    expected_message = "Function return value can't be serialized: TypeError: Type is not msgpack serializable: set"
+    assert ormsgpack.unpackb(response.content) == expected_message
+
+    output = capsys.readouterr()
+    assert expected_message in output.out
+
+
+def test_typed_payload() -> None:
+    data = {
+        "account_name": "Example",
+        "contacts": [{"email": "a@example.com", "phone": None}],
+        "annual_revenue": 1000,
+    }
+    response = invoke_function("tests/fixtures/typed_payload", json=data)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "type": "Payload",
+        "accountName": "Example",
+        "emails": ["a@example.com"],
+        "annualRevenue": 1000.0,
+    }
+
+
+def test_typed_payload_invalid(capsys: CaptureFixture[str]) -> None:
+    data = {"account_name": "Example", "contacts": [{"email": "a@example.com"}]}
+    response = invoke_function("tests/fixtures/typed_payload", json=data)
+
+    expected_message = (
+        "Couldn't parse CloudEvent: Data payload doesn't match the function's type annotation:"
+        " Missing required field 'phone' at data.contacts[0]"
+    )
+    assert response.status_code == 400
+    assert response.json() == expected_message
+    assert orjson.loads(response.headers["x-extra-info"])["isFunctionError"] is False
+
+    output = capsys.readouterr()
+    assert (
+        without_shutdown_log_line(output.out)
+        == f'level=error msg="{expected_message}"\n'
+    )
+
+
+def test_typed_payload_batch() -> None:
+    events = [
+        generate_batch_event("example-id-1", data={"account_name": "Example"}),
+        generate_batch_event("example-id-2", data={"account_name": 1}),
+    ]
+    _, results = invoke_batch("tests/fixtures/typed_payload", events)
+
+    # Only the invalid event in the batch fails.
+    assert [result["statusCode"] for result in results] == [200, 400]
+    assert results[0]["data"]["type"] == "Payload"
+    assert results[1]["data"] == (
+        "Couldn't parse CloudEvent: Data payload doesn't match the function's type annotation:"
+        " Expected string but found integer at data.account_name"
+    )
+
+
+UPSTREAM_JSON = b'{"records":[{"Name":"Example Account"}],"totalSize":1}'
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+@pytest.mark.parametrize("body_type", ["bytes", "memoryview", "file", "fragment"])
+def test_raw_response(app: ASGIApp, body_type: str) -> None:
+    response = invoke_function(
+        "tests/fixtures/returns_raw_response", json={"bodyType": body_type}, app=app
+    )
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "application/json"
+    assert response.headers.get("Content-Length") == str(len(UPSTREAM_JSON))
+    # The pre-encoded body is sent as-is.
+    assert response.content == UPSTREAM_JSON
+
+
+def test_raw_response_disk_file(tmp_path: Path) -> None:
+    path = tmp_path / "upstream.json"
+    path.write_bytes(UPSTREAM_JSON)
+    response = invoke_function(
+        "tests/fixtures/returns_raw_response",
+        json={"bodyType": "disk_file", "path": str(path)},
+    )
+
+    assert response.status_code == 200
+    assert response.content == UPSTREAM_JSON
+    # The function can't close the file itself, so the runtime must close it once it's been read.
+    opened_files = sys.modules[FUNCTION_MODULE_NAME].opened_files
+    assert len(opened_files) == 1
+    assert opened_files[0].closed
+
+
+def test_raw_response_binary() -> None:
+    response = invoke_function(
+        "tests/fixtures/returns_raw_response", json={"bodyType": "binary"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "image/png"
+    assert response.content == b"\x89PNG\r\n"
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_raw_response_text(app: ASGIApp) -> None:
+    response = invoke_function(
+        "tests/fixtures/returns_raw_response", json={"bodyType": "text"}, app=app
+    )
+
+    # The content type is sent exactly as given, without a charset being added to it.
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "text/plain"
+    assert response.content == b"hello"
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_raw_response_array_memoryview(app: ASGIApp) -> None:
+    response = invoke_function(
+        "tests/fixtures/returns_raw_response",
+        json={"bodyType": "array_memoryview"},
+        app=app,
+    )
+
+    # The body's length is its size in bytes, rather than the number of items in the array.
+    assert response.status_code == 200
+    assert response.headers.get("Content-Length") == "16"
+    assert response.content == array("d", [1.0, 2.0]).tobytes()
+
+
+def test_raw_response_batch(capsys: CaptureFixture[str]) -> None:
+    events = [
+        generate_batch_event("example-id-1", data={"bodyType": "bytes"}),
+        generate_batch_event("example-id-2", data={"bodyType": "binary"}),
+    ]
+    response, results = invoke_batch("tests/fixtures/returns_raw_response", events)
+
+    # Results are embedded in the JSON response body, so only JSON raw responses can be used.
+    expected_message = "RawResponse must be JSON in batch invocations, not 'image/png'"
+    assert response.status_code == 200
+    assert [result["statusCode"] for result in results] == [200, 500]
+    assert results[0]["data"] == orjson.loads(UPSTREAM_JSON)
+    assert results[1]["data"] == expected_message
+    assert results[1]["extraInfo"]["requestId"] == "example-id-2"
+
+    output = capsys.readouterr()
+    assert (
+        f'invocationId=example-id-2 level=error msg="{expected_message}"\n'
+        in output.out
+    )
+
+
+def test_raw_response_nested_fragment() -> None:
+    response = invoke_function(
+        "tests/fixtures/returns_raw_response", json={"bodyType": "nested_fragment"}
+    )
+
+    assert response.status_code == 200
+    assert response.content == b'{"upstream":' + UPSTREAM_JSON + b"}"
+
+
+def test_raw_response_fragment_msgpack_requested() -> None:
+    pytest.importorskip("ormsgpack")
+    response = invoke_function(
+        "tests/fixtures/returns_raw_response",
+        headers=generate_cloud_event_headers() | {"Accept": "application/msgpack"},
+        json={"bodyType": "fragment"},
+    )
+
+    # Pre-encoded JSON can't be converted to MessagePack without decoding it, so is sent as JSON.
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "application/json"
+    assert response.content == UPSTREAM_JSON
+
+
+def test_raw_response_compressed() -> None:
+    with patch.dict(
+        os.environ,
+        {
+            PROJECT_PATH_ENV_VAR: "tests/fixtures/returns_raw_response",
+            COMPRESSION_MIN_SIZE_ENV_VAR: "0",
+        },
+    ):
+        with TestClient(fast_asgi_app) as client:
+            response = client.post(
+                "/",
+                headers=generate_cloud_event_headers() | {"Accept-Encoding": "gzip"},
+                json={"bodyType": "large_memoryview"},
+            )
+
+    assert response.headers.get("Content-Encoding") == "gzip"
+    assert len(response.json()) == 100
+
+
+def invoke_streaming(
+    data: Any, headers: dict[str, str] | None = None, app: ASGIApp = asgi_app
+) -> Response:
+    return invoke_function(
+        "tests/fixtures/streaming",
+        headers=generate_cloud_event_headers() | (headers or {}),
+        json=data,
+        app=app,
+    )
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_streaming(app: ASGIApp) -> None:
+    response = invoke_streaming({"count": 3}, app=app)
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "application/json"
+    # The body is streamed using chunked transfer encoding, so its length isn't known up front.
+    assert "Content-Length" not in response.headers
+    assert response.json() == [
+        {"index": 0, "name": "Record 0"},
+        {"index": 1, "name": "Record 1"},
+        {"index": 2, "name": "Record 2"},
+    ]
+
+    extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
+    assert extra_info["statusCode"] == 200
+    assert "function" in extra_info["timingsMs"]
+
+
+def test_streaming_ndjson() -> None:
+    response = invoke_streaming({"count": 2}, {"Accept": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Type") == "application/x-ndjson"
+    assert response.content == (
+        b'{"index":0,"name":"Record 0"}\n{"index":1,"name":"Record 1"}\n'
+    )
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_streaming_ndjson_metadata_frame(app: ASGIApp) -> None:
+    response = invoke_streaming(
+        {"count": 3, "raiseAt": 2},
+        {"Accept": "application/x-ndjson", "x-stream-metadata": "true"},
+        app=app,
+    )
+
+    # The final metadata is sent as the last line, since the test client doesn't support trailers.
+    assert response.status_code == 200
+    *items, metadata_line = response.content.splitlines()
+    assert items == [
+        b'{"index":0,"name":"Record 0"}',
+        b'{"index":1,"name":"Record 1"}',
+    ]
+    extra_info: dict[str, Any] = orjson.loads(metadata_line)["extraInfo"]
+    assert extra_info["statusCode"] == 500
+    assert extra_info["streamedItems"] == 2
+
+
+def test_streaming_json_array_metadata_frame() -> None:
+    response = invoke_streaming({"count": 2}, {"x-stream-metadata": "true"})
+
+    # The metadata can't be added to a JSON array, so isn't.
+    assert response.status_code == 200
+    assert response.json() == [
+        {"index": 0, "name": "Record 0"},
+        {"index": 1, "name": "Record 1"},
+    ]
+
+
+def test_streaming_empty() -> None:
+    response = invoke_streaming({"count": 0})
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_streaming_large() -> None:
+    response = invoke_streaming({"count": 10_000})
+
+    assert response.status_code == 200
+    assert len(response.json()) == 10_000
+
+
+def test_streaming_raises_exception_before_first_result(
+    capsys: CaptureFixture[str],
+) -> None:
+    response = invoke_streaming({"count": 3, "raiseAt": 0})
+
+    # The function hasn't produced any results, so the error is reported as usual.
+    expected_message = "Exception occurred while executing function: ValueError: Unable to fetch record 0"
+    assert response.status_code == 500
+    assert response.json() == expected_message
+    assert expected_message in capsys.readouterr().out
+
+
+def test_streaming_raises_exception_after_first_result(
+    capsys: CaptureFixture[str],
+) -> None:
+    response = invoke_streaming({"count": 3, "raiseAt": 2})
+
+    # The status code has already been sent, so the body is left incomplete instead.
+    assert response.status_code == 200
+    assert response.content == (
+        b'[{"index":0,"name":"Record 0"},{"index":1,"name":"Record 1"}'
+    )
+
+    output = capsys.readouterr()
+    assert (
+        'level=error msg="Exception occurred while streaming function results:'
+        ' ValueError: Unable to fetch record 2"' in output.out
+    )
+
+
+def test_streaming_exceeds_deadline(capsys: CaptureFixture[str]) -> None:
+    response = invoke_streaming(
+        {"count": 3, "sleepAt": 1},
+        generate_cloud_event_headers(
+            deadline=generate_deadline(timedelta(milliseconds=200))
+        ),
+    )
+
+    assert response.status_code == 200
+    assert response.content == b'[{"index":0,"name":"Record 0"}'
+
+    output = capsys.readouterr()
+    assert without_shutdown_log_line(output.out).endswith(
+        'level=error msg="Function didn\'t finish streaming its results before the invocation deadline"\n'
+    )
+
+
+def test_streaming_first_result_not_serializable(capsys: CaptureFixture[str]) -> None:
+    response = invoke_streaming(
+        {"count": 3, "unserializableAt": 0, "printOnClose": True}
+    )
+
+    assert response.status_code == 500
+    assert response.json().startswith("Function return value can't be serialized:")
+    # The function's generator is closed straight away (before the error is logged), rather than
+    # being left suspended until it's garbage collected.
+    assert capsys.readouterr().out.startswith("Closed\n")
+
+
+def test_streaming_ignores_deadline(capsys: CaptureFixture[str]) -> None:
+    response = invoke_streaming(
+        {"count": 3, "ignoreCancellation": True, "printOnClose": True},
+        generate_cloud_event_headers(
+            deadline=generate_deadline(timedelta(milliseconds=200))
+        ),
+    )
+
+    # The function produced its first result despite being cancelled, but it's too late to stream it.
+    assert response.status_code == 504
+    assert (
+        response.json()
+        == "Function didn't finish executing before the invocation deadline"
+    )
+    # The function's generator is closed straight away (before the error is logged), rather than
+    # being left suspended until it's garbage collected.
+    assert capsys.readouterr().out.startswith("Closed\n")
+
+
+@pytest.mark.parametrize("raise_at,expected_status_code", [(None, 200), (2, 500)])
+def test_streaming_trailers(raise_at: int | None, expected_status_code: int) -> None:
+    trailers: list[Any] = []
+
+    async def app_with_trailers(scope: Scope, receive: Receive, send: Send) -> None:
+        # Emulates a server that supports the ASGI HTTP trailers extension.
+        scope["extensions"] = {"http.response.trailers": {}}
+
+        async def send_or_capture_trailers(message: Message) -> None:
+            if message["type"] == "http.response.trailers":
+                trailers.append(message)
+            else:
+                await send(message)
+
+        await fast_asgi_app(scope, receive, send_or_capture_trailers)
+
+    invoke_streaming({"count": 3, "raiseAt": raise_at}, app=app_with_trailers)
+
+    assert len(trailers) == 1
+    ((name, value),) = trailers[0]["headers"]
+    assert name == b"x-extra-info"
+    extra_info: dict[str, Any] = orjson.loads(value)
+    assert extra_info["statusCode"] == expected_status_code
+    assert extra_info["streamedItems"] == (raise_at if raise_at is not None else 3)
+    assert extra_info["execTimeMs"] >= 0
+    assert list(extra_info["timingsMs"]) == [
+        "bodyRead",
+        "parse",
+        "context",
+        "function",
+        "dataApi",
+        "serialization",
+    ]
+
+
+def test_streaming_metrics() -> None:
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/streaming"}):
+        with TestClient(asgi_app) as client:
+            response = client.post(
+                "/", headers=generate_cloud_event_headers(), json={"count": 3}
+            )
+            metrics = client.get("/metrics").text
+
+    # The metrics are recorded once, after the response has finished streaming.
+    assert 'sf_functions_invocations_total{status_code="200"} 1\n' in metrics
+    assert "sf_functions_function_execution_duration_seconds_count 1\n" in metrics
+    assert "sf_functions_response_size_bytes_count 1\n" in metrics
+    assert f"sf_functions_response_size_bytes_sum {len(response.content)}" in metrics
+    # The execution slot is released once the response has finished streaming.
+    assert "sf_functions_in_flight_invocations 0\n" in metrics
+
+
+def test_streaming_batch(capsys: CaptureFixture[str]) -> None:
+    response, _ = invoke_batch(
+        "tests/fixtures/streaming", [generate_batch_event("example-id")]
+    )
+
+    expected_message = (
+        "Batch invocations aren't supported by functions that stream their results,"
+        " unless the function also defines a batch_function()"
+    )
+    assert response.status_code == 400
+    assert response.json() == expected_message
+    assert expected_message in capsys.readouterr().out
+
+
+def test_internal_error(capsys: CaptureFixture[str]) -> None:
+    with patch(
+        "salesforce_functions._internal.app.SalesforceFunctionsCloudEvent.from_http",
+        side_effect=ValueError("Some internal error"),
+    ):
+        response = invoke_function(
+            "tests/fixtures/basic", raise_server_exceptions=False
+        )
+
+    expected_message = "Internal error: ValueError: Some internal error"
+    assert response.status_code == 503
+    assert response.headers.get("Content-Type") == "application/json"
+    assert response.json() == expected_message
+
+    extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
+    stack: str = extra_info.pop("stack")
+    assert extra_info == {
+        "isFunctionError": False,
+        "requestId": "n/a",
+        "source": "n/a",
+        "statusCode": 503,
+    }
+    assert re.fullmatch(
+        r"""Traceback \(most recent call last\):
+  .+
+ValueError: Some internal error
+""",
+        stack,
+        flags=re.DOTALL,
+    )
+
+    output = capsys.readouterr()
+    assert re.fullmatch(
+        rf"""Traceback \(most recent call last\):
+  .+
+ValueError: Some internal error
+level=error msg="{expected_message}"
+""",
+        without_shutdown_log_line(output.out),
+        flags=re.DOTALL,
+    )
+    assert output.err == ""
+
+
+def test_metrics(tmp_path: Path) -> None:
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/basic",
+        METRICS_DIR_ENV_VAR: str(tmp_path),
+    }
+
+    with patch.dict(os.environ, env):
+        with TestClient(asgi_app) as client:
+            client.post("/", headers=generate_cloud_event_headers())
+            client.post("/", headers=generate_cloud_event_headers())
+            client.post("/", headers={"x-health-check": "true"})
+            client.post("/", content=b"")
+            response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert (
+        response.headers.get("Content-Type")
+        == "text/plain; version=0.0.4; charset=utf-8"
+    )
+
+    # Health checks aren't counted as invocations.
+    metrics = response.text
+    assert 'sf_functions_invocations_total{status_code="200"} 2\n' in metrics
+    assert 'sf_functions_invocations_total{status_code="400"} 1\n' in metrics
+    assert 'sf_functions_invocations_total{status_code="503"} 0\n' in metrics
+    assert "sf_functions_in_flight_invocations 0\n" in metrics
+    assert "sf_functions_queued_invocations 0\n" in metrics
+    assert "sf_functions_cloudevent_parse_duration_seconds_count 2\n" in metrics
+    assert "sf_functions_function_execution_duration_seconds_count 2\n" in metrics
+    assert "sf_functions_response_serialization_duration_seconds_count 3\n" in metrics
+    assert "sf_functions_data_api_request_duration_seconds_count 0\n" in metrics
+    assert "sf_functions_request_size_bytes_count 3\n" in metrics
+    assert "sf_functions_response_size_bytes_count 3\n" in metrics
+
+    # The worker's metrics file is kept after shutdown, so that its counters remain in the totals.
+    assert [path.name for path in tmp_path.iterdir()] == [
+        f"worker-{os.getpid()}.metrics"
+    ]
+
+
+def test_metrics_sf_context_cache() -> None:
+    # The cache is shared by the whole process, so may already contain the sfcontext used here.
+    initial_hits, initial_misses = sf_context_cache_info()
+
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+        with TestClient(asgi_app) as client:
+            client.post("/", headers=generate_cloud_event_headers())
+            client.post("/", headers=generate_cloud_event_headers())
+            response = client.get("/metrics")
+
+    hits, misses = sf_context_cache_info()
+    assert hits + misses == initial_hits + initial_misses + 2
+    assert hits > initial_hits
+    assert (
+        f'sf_functions_sfcontext_cache_lookups_total{{result="hit"}} {hits}\n'
+        in response.text
+    )
+    assert (
+        f'sf_functions_sfcontext_cache_lookups_total{{result="miss"}} {misses}\n'
+        in response.text
+    )
+
+
+@pytest.mark.requires_wiremock
+def test_metrics_data_api() -> None:
+    sf_context = generate_sf_context()
+    assert isinstance(sf_context["userContext"], dict)
+    sf_context["userContext"]["orgDomainUrl"] = WIREMOCK_SERVER_URL
+
+    headers = generate_cloud_event_headers()
+    headers["ce-sfcontext"] = encode_cloud_event_extension(sf_context)
+
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/data_api"}):
+        with TestClient(asgi_app) as client:
+            client.post("/", headers=headers)
+            response = client.get("/metrics")
+
+    assert "sf_functions_data_api_request_duration_seconds_count 1\n" in response.text
+
+
+def test_metrics_thread_pool() -> None:
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/sync_function",
+        THREAD_POOL_SIZE_ENV_VAR: "1",
+    }
+    headers = generate_cloud_event_headers()
+
+    with patch.dict(os.environ, env):
+        with TestClient(asgi_app) as client:
+            with ThreadPoolExecutor() as executor:
+                busy = executor.submit(
+                    client.post, "/", headers=headers, json={"seconds": 0.5}
+                )
+                time.sleep(0.1)
+                queued = executor.submit(
+                    client.post, "/", headers=headers, json={"seconds": 0}
+                )
+                time.sleep(0.1)
+                in_progress_metrics = client.get("/metrics").text
+                assert busy.result().status_code == 200
+                assert queued.result().status_code == 200
+            finished_metrics = client.get("/metrics").text
+
+    assert "sf_functions_thread_pool_size 1\n" in in_progress_metrics
+    assert "sf_functions_thread_pool_busy_threads 1\n" in in_progress_metrics
+    assert "sf_functions_thread_pool_queued_calls 1\n" in in_progress_metrics
+    assert "sf_functions_thread_pool_busy_threads 0\n" in finished_metrics
+    assert "sf_functions_thread_pool_queued_calls 0\n" in finished_metrics
+
+
+@pytest.mark.parametrize("app", [asgi_app, fast_asgi_app])
+def test_profiling(app: ASGIApp, tmp_path: Path) -> None:
+    profile_dir = tmp_path.joinpath("profiles")
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/returns_event",
+        PROFILE_DIR_ENV_VAR: str(profile_dir),
+    }
+    headers = generate_cloud_event_headers()
+
+    with patch.dict(os.environ, env):
+        with TestClient(app) as client:
+            profiled_response = client.post(
+                "/", headers=headers | {"x-profile": "true"}, json={}
+            )
+            unprofiled_response = client.post("/", headers=headers, json={})
+
+    assert profiled_response.status_code == 200
+    profile_path = Path(
+        orjson.loads(profiled_response.headers["x-extra-info"])["profilePath"]
+    )
+    assert profile_path.parent == profile_dir
+    assert "function" in {
+        function[2] for function in pstats.Stats(str(profile_path)).stats  # type: ignore[attr-defined]
+    }
+
+    assert unprofiled_response.status_code == 200
+    assert "profilePath" not in orjson.loads(
+        unprofiled_response.headers["x-extra-info"]
+    )
+    assert list(profile_dir.iterdir()) == [profile_path]
+
+
+def test_profiling_sync_function(tmp_path: Path) -> None:
+    env = {
+        PROJECT_PATH_ENV_VAR: "tests/fixtures/sync_function",
+        PROFILE_DIR_ENV_VAR: str(tmp_path),
+    }
+    headers = generate_cloud_event_headers() | {"x-profile": "true"}
+
+    with patch.dict(os.environ, env):
+        with TestClient(asgi_app) as client:
+            response = client.post("/", headers=headers, json={"seconds": 0})
+
+    # The function runs on the thread pool, which `cProfile` wouldn't profile unless enabled there too.
+    assert response.status_code == 200
+    profile_path = orjson.loads(response.headers["x-extra-info"])["profilePath"]
+    assert any(
+        Path(filename).parts[-2:] == ("sync_function", "main.py")
+        and function_name == "function"
+        for filename, _, function_name in pstats.Stats(profile_path).stats  # type: ignore[attr-defined]
+    )
+
+
+def test_profiling_disabled() -> None:
+    headers = generate_cloud_event_headers() | {"x-profile": "true"}
+    response = invoke_function("tests/fixtures/returns_event", headers=headers)
+
+    assert response.status_code == 200
+    assert "profilePath" not in orjson.loads(response.headers["x-extra-info"])
+
+
+def test_nonexistent_path() -> None:
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+        with TestClient(asgi_app) as client:
+            response = client.post("/nonexistent")
+
+    assert response.status_code == 404
+
+
+def test_unsupported_http_method_get() -> None:
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+        with TestClient(asgi_app) as client:
+            response = client.get("/")
+
+    assert response.status_code == 405
+
+
+def test_unsupported_http_method_delete() -> None:
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+        with TestClient(asgi_app) as client:
+            response = client.delete("/")
+
+    assert response.status_code == 405
+
+
+@pytest.mark.parametrize(
+    ("fixture", "kwargs"),
+    [
+        ("tests/fixtures/basic", {"headers": {"x-health-check": "true"}}),
+        ("tests/fixtures/returns_event", {"json": {"record_id": 12345}}),
+        (
+            "tests/fixtures/returns_context",
+            {
+                "headers": generate_cloud_event_headers(
+                    deadline="2999-01-19T10:11:12.468085Z"
+                )
+            },
+        ),
+        ("tests/fixtures/basic", {"headers": {}}),
+        ("tests/fixtures/basic", {"content": "Not json"}),
+        ("tests/fixtures/raises_exception_at_runtime", {}),
+        ("tests/fixtures/return_value_not_serializable", {}),
+    ],
+)
+def test_fast_asgi_app_matches_asgi_app(fixture: str, kwargs: dict[str, Any]) -> None:
+    asgi_app_response = invoke_function(fixture, **kwargs)
+    fast_asgi_app_response = invoke_function(fixture, app=fast_asgi_app, **kwargs)
+
+    def normalize_extra_info(response: Response) -> dict[str, Any]:
+        extra_info: dict[str, Any] = orjson.loads(response.headers["x-extra-info"])
+        extra_info.pop("execTimeMs", None)
+        # The durations differ between the two apps, but the phases that were timed shouldn't.
+        if "timingsMs" in extra_info:
+            extra_info["timingsMs"] = list(extra_info["timingsMs"])
+        # The file paths and line numbers in the traceback differ between the two apps.
+        if "stack" in extra_info:
+            extra_info["stack"] = extra_info["stack"].splitlines()[-1]
+        return extra_info
+
+    assert fast_asgi_app_response.status_code == asgi_app_response.status_code
+    assert fast_asgi_app_response.content == asgi_app_response.content
+    assert normalize_extra_info(fast_asgi_app_response) == normalize_extra_info(
+        asgi_app_response
+    )
+    assert fast_asgi_app_response.headers.keys() == asgi_app_response.headers.keys()
+    assert (
+        fast_asgi_app_response.headers["Content-Type"]
+        == asgi_app_response.headers["Content-Type"]
+    )
+    assert (
+        fast_asgi_app_response.headers["Content-Length"]
+        == asgi_app_response.headers["Content-Length"]
+    )
+
+
+def test_fast_asgi_app_internal_error(capsys: CaptureFixture[str]) -> None:
+    with patch(
+        "salesforce_functions._internal.app.SalesforceFunctionsCloudEvent.from_http",
+        side_effect=ValueError("Some internal error"),
+    ):
+        response = invoke_function(
+            "tests/fixtures/basic", raise_server_exceptions=False, app=fast_asgi_app
+        )
+
+    assert response.status_code == 503
+    assert response.headers.get("Content-Type") == "application/json"
+    assert response.json() == "Internal error: ValueError: Some internal error"
+
+    output = capsys.readouterr()
+    assert without_shutdown_log_line(output.out).endswith(
+        'level=error msg="Internal error: ValueError: Some internal error"\n'
+    )
+
+
+@pytest.mark.parametrize(
+    ("method", "path", "expected_status_code"),
+    [
+        ("POST", "/nonexistent", 404),
+        ("GET", "/", 405),
+        ("DELETE", "/", 405),
+        ("GET", "/metrics", 200),
+    ],
+)
+def test_fast_asgi_app_passes_through_other_requests(
+    method: str, path: str, expected_status_code: int
+) -> None:
+    with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: "tests/fixtures/basic"}):
+        with TestClient(fast_asgi_app) as client:
+            response = client.request(method, path)
+
+    assert response.status_code == expected_status_code
@@ -0,0 +1,90 @@
+import asyncio
+import re
+from unittest.mock import Mock
+
+from salesforce_functions._internal.background_tasks import BackgroundTaskRunner
+
+
+async def test_runs_tasks() -> None:
+    runner = BackgroundTaskRunner(max_concurrent=10, logger=Mock())
+    results: list[str] = []
+
+    async def task(name: str) -> None:
+        await asyncio.sleep(0)
+        results.append(name)
+
+    runner.schedule([lambda: task("first"), lambda: task("second")])
+    assert runner.pending == 2
+
+    await runner.drain()
+
+    assert results == ["first", "second"]
+    assert runner.pending == 0
+
+
+async def test_concurrency_limit() -> None:
+    runner = BackgroundTaskRunner(max_concurrent=2, logger=Mock())
+    running = 0
+    max_running = 0
+
+    async def task() -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    runner.schedule([task] * 5)
+    await runner.drain()
+
+    assert max_running == 2
+
+
+async def test_exception_logged() -> None:
+    logger = Mock()
+    runner = BackgroundTaskRunner(max_concurrent=1, logger=logger)
+    results: list[str] = []
+
+    async def failing_task() -> None:
+        raise ValueError("Some error")
+
+    async def task() -> None:
+        results.append("ran")
+
+    runner.schedule([failing_task, task])
+    await runner.drain()
+
+    # A failing task doesn't prevent subsequent tasks from running.
+    assert results == ["ran"]
+    logger.exception.assert_called_once_with(
+        "Exception occurred while executing background task: ValueError: Some error"
+    )
+
+
+async def test_drain_timeout() -> None:
+    logger = Mock()
+    runner = BackgroundTaskRunner(max_concurrent=10, logger=logger)
+    cancelled = asyncio.Event()
+
+    async def slow_task() -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    runner.schedule([slow_task])
+    await runner.drain(timeout=0.05)
+
+    assert cancelled.is_set()
+    assert runner.pending == 0
+    logger.warning.assert_called_once()
+    assert re.fullmatch(
+        r"Cancelling 1 background task\(s\) that didn't finish within 0.05 seconds of shutdown",
+        logger.warning.call_args.args[0],
+    )
+
+
+async def test_drain_without_tasks() -> None:
+    runner = BackgroundTaskRunner(max_concurrent=1, logger=Mock())
+    await runner.drain()
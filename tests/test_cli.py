@@ -1,6 +1,7 @@
 import os
 import subprocess
 import sys
+import time
 from pathlib import Path
 from typing import Any
 from unittest.mock import patch
@@ -10,8 +11,31 @@ import pytest
 from pytest import CaptureFixture
 
 from salesforce_functions.__version__ import __version__
-from salesforce_functions._internal.app import PROJECT_PATH_ENV_VAR
-from salesforce_functions._internal.cli import ASGI_APP_IMPORT_STRING, main
+from salesforce_functions._internal.app import (
+    _preloaded_functions,  # pyright: ignore [reportPrivateUsage]
+)
+from salesforce_functions._internal.app import (
+    COMPRESSION_MIN_SIZE_ENV_VAR,
+    INIT_TIMEOUT_ENV_VAR,
+    LOG_OVERFLOW_ENV_VAR,
+    LOG_QUEUE_SIZE_ENV_VAR,
+    LOG_RATE_LIMIT_ENV_VAR,
+    LOG_SAMPLE_RATE_ENV_VAR,
+    MAX_BACKGROUND_TASKS_ENV_VAR,
+    MAX_IN_FLIGHT_ENV_VAR,
+    MAX_QUEUED_ENV_VAR,
+    METRICS_DIR_ENV_VAR,
+    PROCESS_POOL_SIZE_ENV_VAR,
+    PROFILE_DIR_ENV_VAR,
+    PROJECT_PATH_ENV_VAR,
+    SHUTDOWN_TIMEOUT_ENV_VAR,
+    THREAD_POOL_SIZE_ENV_VAR,
+)
+from salesforce_functions._internal.cli import (
+    ASGI_APP_IMPORT_STRING,
+    FAST_ASGI_APP_IMPORT_STRING,
+    main,
+)
 
 
 def test_base_help(capsys: CaptureFixture[str]) -> None:
@@ -124,6 +148,48 @@ def test_check_subcommand_invalid_function(capsys: CaptureFixture[str]) -> None:
     )
 
 
+def test_check_subcommand_invalid_lifecycle_hook(capsys: CaptureFixture[str]) -> None:
+    fixture = "tests/fixtures/invalid_hook_not_async"
+
+    exit_code = main(args=["check", fixture])
+    assert exit_code == 1
+
+    output = capsys.readouterr()
+    assert output.out == ""
+    assert output.err == (
+        "Function failed validation: The 'init' hook in main.py must be an async function."
+        " Change the function definition from 'def init' to 'async def init'.\n"
+    )
+
+
+def test_check_subcommand_invalid_batch_function(capsys: CaptureFixture[str]) -> None:
+    fixture = "tests/fixtures/invalid_batch_function_not_async"
+
+    exit_code = main(args=["check", fixture])
+    assert exit_code == 1
+
+    output = capsys.readouterr()
+    assert output.out == ""
+    assert output.err == (
+        "Function failed validation: The function named 'batch_function' in main.py must be an async"
+        " function. Change the function definition from 'def batch_function' to 'async def batch_function'.\n"
+    )
+
+
+def test_check_subcommand_invalid_payload_type(capsys: CaptureFixture[str]) -> None:
+    fixture = "tests/fixtures/invalid_payload_type"
+
+    exit_code = main(args=["check", fixture])
+    assert exit_code == 1
+
+    output = capsys.readouterr()
+    assert output.out == ""
+    assert output.err == (
+        "Function failed validation: Couldn't build a decoder for the event data type of the function"
+        " named 'function' in main.py: NameError: name 'UndefinedType' is not defined\n"
+    )
+
+
 def test_serve_subcommand_help(capsys: CaptureFixture[str]) -> None:
     with pytest.raises(SystemExit) as exc_info:
         main(args=["serve", "--help"])
@@ -134,7 +200,21 @@ def test_serve_subcommand_help(capsys: CaptureFixture[str]) -> None:
     output = capsys.readouterr()
     assert (
         output.out
-        == r"""usage: sf-functions-python serve [-h] [--host HOST] [-p PORT] [-w WORKERS]
+        == r"""usage: sf-functions-python serve [-h] [--host HOST] [-p PORT] [--uds PATH]
+                                 [-w WORKERS] [--max-in-flight MAX_IN_FLIGHT]
+                                 [--max-queued MAX_QUEUED]
+                                 [--max-background-tasks MAX_BACKGROUND_TASKS]
+                                 [--thread-pool-size THREAD_POOL_SIZE]
+                                 [--process-pool-size PROCESS_POOL_SIZE]
+                                 [--compression-min-size BYTES]
+                                 [--log-queue-size LINES]
+                                 [--log-overflow {block,drop-newest,drop-oldest}]
+                                 [--log-sample-rate FRACTION]
+                                 [--log-rate-limit LINES]
+                                 [--init-timeout INIT_TIMEOUT]
+                                 [--shutdown-timeout SHUTDOWN_TIMEOUT]
+                                 [--fast-path] [--preload] [--reuse-port]
+                                 [--profile-dir PROFILE_DIR]
                                  <project-path>
 
 positional arguments:
@@ -146,8 +226,77 @@ options:
                         localhost)
   -p PORT, --port PORT  The port on which the web server listens (default:
                         8080)
+  --uds PATH            Bind to a Unix domain socket at this path instead of
+                        --host and --port, for when the function runtime is
+                        fronted by a local proxy (not supported on Windows)
   -w WORKERS, --workers WORKERS
                         The number of worker processes (default: 1)
+  --max-in-flight MAX_IN_FLIGHT
+                        The maximum number of invocations each worker process
+                        executes concurrently (default: unlimited)
+  --max-queued MAX_QUEUED
+                        The maximum number of invocations each worker process
+                        queues once --max-in-flight is reached, after which
+                        invocations are rejected (default: 100)
+  --max-background-tasks MAX_BACKGROUND_TASKS
+                        The maximum number of background tasks (scheduled
+                        using Context.add_background_task()) each worker
+                        process runs concurrently (default: 10)
+  --thread-pool-size THREAD_POOL_SIZE
+                        The number of threads each worker process uses to run
+                        synchronous (non-async) functions (default: the number
+                        of CPUs plus 4, up to 32)
+  --process-pool-size PROCESS_POOL_SIZE
+                        The number of processes each worker process starts for
+                        running CPU-bound code passed to
+                        Context.run_in_process() (default: no process pool, so
+                        the code is run on a thread instead)
+  --compression-min-size BYTES
+                        Compress response bodies of at least this size (in
+                        bytes) using gzip (or zstd/brotli, if installed), if
+                        accepted by the request's Accept-Encoding header
+                        (default: compression disabled)
+  --log-queue-size LINES
+                        Write log lines to stdout from a background thread,
+                        queueing up to this many lines, so that a slow log
+                        drain doesn't stall invocations (default: log lines
+                        are written synchronously)
+  --log-overflow {block,drop-newest,drop-oldest}
+                        What to do with log lines once the log queue is full:
+                        wait for space, drop the new line, or drop the oldest
+                        queued line (default: drop-newest)
+  --log-sample-rate FRACTION
+                        Log only this fraction (between 0 and 1) of the info
+                        log lines from each line of code in each invocation,
+                        starting with the first (default: all lines are
+                        logged)
+  --log-rate-limit LINES
+                        Log at most this many info log lines per second from
+                        each line of code in each invocation, after an initial
+                        burst of this many lines (default: no rate limit)
+  --init-timeout INIT_TIMEOUT
+                        How long (in seconds) to wait for the function's
+                        init() hook to finish when each worker process starts,
+                        before startup fails (default: 60.0)
+  --shutdown-timeout SHUTDOWN_TIMEOUT
+                        How long (in seconds) each worker process has to shut
+                        down, from when it's told to, which covers waiting for
+                        in-flight invocations (which are then aborted) and
+                        background tasks to finish, and the function's
+                        shutdown() hook (default: 30.0)
+  --fast-path           Handle function invocations using a lower overhead
+                        ASGI handler that bypasses Starlette's routing
+  --preload             Load the function once before starting the worker
+                        processes, which are then forked so that they share
+                        its memory (not supported on Windows)
+  --reuse-port          Have each worker process bind its own socket (using
+                        SO_REUSEPORT), so that the kernel balances connections
+                        across them, rather than sharing a single socket (not
+                        supported on Windows)
+  --profile-dir PROFILE_DIR
+                        Profile invocations that set the 'x-profile: true'
+                        request header, writing the cProfile results to this
+                        directory (default: profiling disabled)
 """
     )
 
@@ -168,23 +317,43 @@ def test_serve_subcommand_default_options(capsys: CaptureFixture[str]) -> None:
     # Still a relative path, but with the path separators adjusted for the current OS.
     normalised_path = str(Path(project_path))
 
-    def check_project_path_env_var(*_args: Any, **_kwargs: Any) -> None:
-        assert os.environ.get(PROJECT_PATH_ENV_VAR) == normalised_path
+    metrics_dirs: list[Path] = []
 
-    with patch(
-        "uvicorn.run", side_effect=check_project_path_env_var
-    ) as mock_uvicorn_run:
+    def check_env_vars(*_args: Any, **_kwargs: Any) -> None:
+        assert os.environ.get(PROJECT_PATH_ENV_VAR) == normalised_path
+        assert MAX_IN_FLIGHT_ENV_VAR not in os.environ
+        assert os.environ.get(MAX_QUEUED_ENV_VAR) == "100"
+        assert os.environ.get(MAX_BACKGROUND_TASKS_ENV_VAR) == "10"
+        assert THREAD_POOL_SIZE_ENV_VAR not in os.environ
+        assert os.environ.get(PROCESS_POOL_SIZE_ENV_VAR) == "0"
+        assert COMPRESSION_MIN_SIZE_ENV_VAR not in os.environ
+        assert LOG_QUEUE_SIZE_ENV_VAR not in os.environ
+        assert os.environ.get(LOG_OVERFLOW_ENV_VAR) == "drop-newest"
+        assert LOG_SAMPLE_RATE_ENV_VAR not in os.environ
+        assert LOG_RATE_LIMIT_ENV_VAR not in os.environ
+        assert os.environ.get(INIT_TIMEOUT_ENV_VAR) == "60.0"
+        assert os.environ.get(SHUTDOWN_TIMEOUT_ENV_VAR) == "30.0"
+        assert PROFILE_DIR_ENV_VAR not in os.environ
+        metrics_dirs.append(Path(os.environ[METRICS_DIR_ENV_VAR]))
+        assert metrics_dirs[0].is_dir()
+
+    with patch("uvicorn.run", side_effect=check_env_vars) as mock_uvicorn_run:
         main(args=["serve", project_path])
 
         mock_uvicorn_run.assert_called_once_with(
             ASGI_APP_IMPORT_STRING,
             host="localhost",
             port=8080,
+            uds=None,
             workers=1,
             access_log=False,
+            timeout_graceful_shutdown=30,
         )
 
     assert PROJECT_PATH_ENV_VAR not in os.environ
+    assert METRICS_DIR_ENV_VAR not in os.environ
+    # The metrics directory is cleaned up once the server exits.
+    assert not metrics_dirs[0].exists()
 
     output = capsys.readouterr()
     assert output.err == ""
@@ -199,12 +368,23 @@ def test_serve_subcommand_custom_options(capsys: CaptureFixture[str]) -> None:
     # Still a relative path, but with the path separators adjusted for the current OS.
     normalised_path = str(Path(project_path))
 
-    def check_project_path_env_var(*_args: Any, **_kwargs: Any) -> None:
+    def check_env_vars(*_args: Any, **_kwargs: Any) -> None:
         assert os.environ.get(PROJECT_PATH_ENV_VAR) == normalised_path
-
-    with patch(
-        "uvicorn.run", side_effect=check_project_path_env_var
-    ) as mock_uvicorn_run:
+        assert os.environ.get(MAX_IN_FLIGHT_ENV_VAR) == "10"
+        assert os.environ.get(MAX_QUEUED_ENV_VAR) == "20"
+        assert os.environ.get(MAX_BACKGROUND_TASKS_ENV_VAR) == "3"
+        assert os.environ.get(THREAD_POOL_SIZE_ENV_VAR) == "8"
+        assert os.environ.get(PROCESS_POOL_SIZE_ENV_VAR) == "2"
+        assert os.environ.get(COMPRESSION_MIN_SIZE_ENV_VAR) == "1024"
+        assert os.environ.get(LOG_QUEUE_SIZE_ENV_VAR) == "5000"
+        assert os.environ.get(LOG_OVERFLOW_ENV_VAR) == "block"
+        assert os.environ.get(LOG_SAMPLE_RATE_ENV_VAR) == "0.1"
+        assert os.environ.get(LOG_RATE_LIMIT_ENV_VAR) == "50.0"
+        assert os.environ.get(INIT_TIMEOUT_ENV_VAR) == "2.5"
+        assert os.environ.get(SHUTDOWN_TIMEOUT_ENV_VAR) == "5.0"
+        assert os.environ.get(PROFILE_DIR_ENV_VAR) == str(Path("path/to/profiles"))
+
+    with patch("uvicorn.run", side_effect=check_env_vars) as mock_uvicorn_run:
         main(
             args=[
                 "serve",
@@ -214,6 +394,32 @@ def test_serve_subcommand_custom_options(capsys: CaptureFixture[str]) -> None:
                 "12345",
                 "--workers",
                 "5",
+                "--max-in-flight",
+                "10",
+                "--max-queued",
+                "20",
+                "--max-background-tasks",
+                "3",
+                "--thread-pool-size",
+                "8",
+                "--process-pool-size",
+                "2",
+                "--compression-min-size",
+                "1024",
+                "--log-queue-size",
+                "5000",
+                "--log-overflow",
+                "block",
+                "--log-sample-rate",
+                "0.1",
+                "--log-rate-limit",
+                "50",
+                "--init-timeout",
+                "2.5",
+                "--shutdown-timeout",
+                "5",
+                "--profile-dir",
+                "path/to/profiles",
                 project_path,
             ]
         )
@@ -222,11 +428,26 @@ def test_serve_subcommand_custom_options(capsys: CaptureFixture[str]) -> None:
             ASGI_APP_IMPORT_STRING,
             host="0.0.0.0",
             port=12345,
+            uds=None,
             workers=5,
             access_log=False,
+            timeout_graceful_shutdown=5,
         )
 
     assert PROJECT_PATH_ENV_VAR not in os.environ
+    assert MAX_IN_FLIGHT_ENV_VAR not in os.environ
+    assert MAX_QUEUED_ENV_VAR not in os.environ
+    assert PROFILE_DIR_ENV_VAR not in os.environ
+    assert MAX_BACKGROUND_TASKS_ENV_VAR not in os.environ
+    assert THREAD_POOL_SIZE_ENV_VAR not in os.environ
+    assert PROCESS_POOL_SIZE_ENV_VAR not in os.environ
+    assert COMPRESSION_MIN_SIZE_ENV_VAR not in os.environ
+    assert LOG_QUEUE_SIZE_ENV_VAR not in os.environ
+    assert LOG_OVERFLOW_ENV_VAR not in os.environ
+    assert LOG_SAMPLE_RATE_ENV_VAR not in os.environ
+    assert LOG_RATE_LIMIT_ENV_VAR not in os.environ
+    assert INIT_TIMEOUT_ENV_VAR not in os.environ
+    assert SHUTDOWN_TIMEOUT_ENV_VAR not in os.environ
 
     output = capsys.readouterr()
     assert output.err == ""
@@ -236,6 +457,21 @@ def test_serve_subcommand_custom_options(capsys: CaptureFixture[str]) -> None:
     )
 
 
+def test_serve_subcommand_fast_path() -> None:
+    with patch("uvicorn.run") as mock_uvicorn_run:
+        main(args=["serve", "--fast-path", "path/to/function"])
+
+        mock_uvicorn_run.assert_called_once_with(
+            FAST_ASGI_APP_IMPORT_STRING,
+            host="localhost",
+            port=8080,
+            uds=None,
+            workers=1,
+            access_log=False,
+            timeout_graceful_shutdown=30,
+        )
+
+
 def test_serve_subcommand_valid_function() -> None:
     fixture = "tests/fixtures/basic"
     port = 41234
@@ -270,6 +506,241 @@ def test_serve_subcommand_valid_function() -> None:
     assert ipv6_response.json() == "OK"
 
 
+def test_serve_subcommand_preload() -> None:
+    project_path = Path("tests/fixtures/basic")
+
+    try:
+        # The app isn't started (so doesn't use the preloaded logging config), so it's reset afterwards.
+        with patch("uvicorn.run") as mock_uvicorn_run, patch(
+            "salesforce_functions._internal.app._preloaded_logging", None
+        ):
+            main(args=["serve", "--preload", str(project_path)])
+
+            # With a single worker, the app is run in the same process as the preloaded function.
+            mock_uvicorn_run.assert_called_once_with(
+                ASGI_APP_IMPORT_STRING,
+                host="localhost",
+                port=8080,
+                uds=None,
+                workers=1,
+                access_log=False,
+                timeout_graceful_shutdown=30,
+            )
+
+        assert list(_preloaded_functions) == [project_path]
+    finally:
+        _preloaded_functions.clear()
+
+
+def test_serve_subcommand_preload_invalid_function(
+    capsys: CaptureFixture[str],
+) -> None:
+    fixture = "tests/fixtures/invalid_missing_main_py"
+    main_py_path = Path(fixture).resolve().joinpath("main.py")
+
+    with patch("uvicorn.run") as mock_uvicorn_run:
+        exit_code = main(args=["serve", "--preload", fixture])
+        mock_uvicorn_run.assert_not_called()
+
+    assert exit_code == 1
+
+    output = capsys.readouterr()
+    assert (
+        output.err
+        == f"Function failed validation: Didn't find a main.py file at {main_py_path}.\n"
+    )
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires os.fork()")
+def test_serve_subcommand_preload_multiple_workers() -> None:
+    fixture = "tests/fixtures/basic"
+    port = 41235
+
+    with subprocess.Popen(
+        [
+            "python",
+            "-m",
+            "salesforce_functions",
+            "serve",
+            "--preload",
+            "--workers",
+            "2",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            fixture,
+        ]
+    ) as server_process:
+        try:
+            with httpx.Client(transport=httpx.HTTPTransport(retries=5)) as client:
+                responses = [
+                    client.post(
+                        f"http://127.0.0.1:{port}", headers={"x-health-check": "true"}
+                    )
+                    for _ in range(5)
+                ]
+        finally:
+            server_process.terminate()
+            try:
+                server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server_process.kill()
+
+    assert server_process.returncode == 0
+
+    for response in responses:
+        assert response.status_code == 200
+        assert response.json() == "OK"
+
+
+def test_serve_subcommand_uds() -> None:
+    with patch("uvicorn.run") as mock_uvicorn_run:
+        main(args=["serve", "--uds", "/tmp/function.sock", "path/to/function"])
+
+        mock_uvicorn_run.assert_called_once_with(
+            ASGI_APP_IMPORT_STRING,
+            host="localhost",
+            port=8080,
+            uds="/tmp/function.sock",
+            workers=1,
+            access_log=False,
+            timeout_graceful_shutdown=30,
+        )
+
+
+def test_serve_subcommand_reuse_port_with_uds(capsys: CaptureFixture[str]) -> None:
+    with pytest.raises(SystemExit) as exc_info:
+        main(
+            args=[
+                "serve",
+                "--reuse-port",
+                "--uds",
+                "/tmp/function.sock",
+                "path/to/function",
+            ]
+        )
+
+    assert exc_info.value.code == 2
+    output = capsys.readouterr()
+    assert "error: --reuse-port can't be used with --uds" in output.err
+
+
+@pytest.mark.parametrize(
+    "args,expected_error",
+    [
+        (
+            ["--log-sample-rate", "0"],
+            "--log-sample-rate must be greater than 0, and at most 1",
+        ),
+        (
+            ["--log-sample-rate", "1.5"],
+            "--log-sample-rate must be greater than 0, and at most 1",
+        ),
+        (["--log-rate-limit", "0"], "--log-rate-limit must be greater than 0"),
+    ],
+)
+def test_serve_subcommand_invalid_log_limits(
+    capsys: CaptureFixture[str], args: list[str], expected_error: str
+) -> None:
+    with pytest.raises(SystemExit) as exc_info:
+        main(args=["serve", *args, "path/to/function"])
+
+    assert exc_info.value.code == 2
+    output = capsys.readouterr()
+    assert f"error: {expected_error}" in output.err
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires os.fork()")
+def test_serve_subcommand_preload_multiple_workers_uds(tmp_path: Path) -> None:
+    fixture = "tests/fixtures/basic"
+    socket_path = tmp_path.joinpath("function.sock")
+
+    with subprocess.Popen(
+        [
+            "python",
+            "-m",
+            "salesforce_functions",
+            "serve",
+            "--preload",
+            "--workers",
+            "2",
+            "--uds",
+            str(socket_path),
+            fixture,
+        ]
+    ) as server_process:
+        try:
+            transport = httpx.HTTPTransport(uds=str(socket_path), retries=5)
+            with httpx.Client(transport=transport) as client:
+                _wait_for_path(socket_path)
+                response = client.post(
+                    "http://localhost", headers={"x-health-check": "true"}
+                )
+        finally:
+            server_process.terminate()
+            try:
+                server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server_process.kill()
+
+    assert server_process.returncode == 0
+    assert response.status_code == 200
+    assert response.json() == "OK"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires SO_REUSEPORT")
+def test_serve_subcommand_reuse_port() -> None:
+    fixture = "tests/fixtures/basic"
+    port = 41236
+
+    with subprocess.Popen(
+        [
+            "python",
+            "-m",
+            "salesforce_functions",
+            "serve",
+            "--reuse-port",
+            "--workers",
+            "2",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            fixture,
+        ]
+    ) as server_process:
+        try:
+            with httpx.Client(transport=httpx.HTTPTransport(retries=5)) as client:
+                responses = [
+                    client.post(
+                        f"http://127.0.0.1:{port}",
+                        headers={"x-health-check": "true", "Connection": "close"},
+                    )
+                    for _ in range(5)
+                ]
+        finally:
+            server_process.terminate()
+            try:
+                server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server_process.kill()
+
+    assert server_process.returncode == 0
+
+    for response in responses:
+        assert response.status_code == 200
+        assert response.json() == "OK"
+
+
+def _wait_for_path(path: Path) -> None:
+    # Unlike TCP connections, connecting to a Unix socket that doesn't exist yet isn't retried.
+    for _ in range(50):
+        if path.exists():
+            return
+        time.sleep(0.1)
+
+
 def test_serve_subcommand_invalid_config(capsys: CaptureFixture[str]) -> None:
     fixture = "tests/fixtures/project_toml_file_missing"
     project_toml_path = Path(fixture).resolve().joinpath("project.toml")
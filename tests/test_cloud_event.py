@@ -1,21 +1,26 @@
 import binascii
 import sys
 from datetime import datetime, timezone
+from unittest.mock import patch
+from uuid import uuid4
 
 import orjson
 import pytest
 from starlette.datastructures import Headers
 
 from salesforce_functions._internal.cloud_event import (
+    BATCH_CONTENT_TYPE,
     CloudEventError,
     SalesforceContext,
     SalesforceFunctionContext,
     SalesforceFunctionsCloudEvent,
     SalesforceUserContext,
+    sf_context_cache_info,
 )
 
 from .utils import (
     encode_cloud_event_extension,
+    generate_batch_event,
     generate_cloud_event_headers,
     generate_sf_context,
     generate_sf_function_context,
@@ -23,7 +28,7 @@ from .utils import (
 
 
 def test_cloud_event() -> None:
-    headers = generate_cloud_event_headers()
+    headers = generate_cloud_event_headers(deadline="2023-01-19T10:11:12.468085Z")
     body = orjson.dumps({"record_id": 123})
     cloud_event = SalesforceFunctionsCloudEvent.from_http(Headers(headers), body)
 
@@ -57,6 +62,7 @@ def test_cloud_event() -> None:
             apex_id="apexId TODO",
             apex_fqn="ExampleClass:example_function():7",
             resource="https://examplefunction-cod-mni.crag-123abc.evergreen.space",
+            deadline=datetime(2023, 1, 19, 10, 11, 12, 468085, tzinfo=timezone.utc),
         ),
     )
 
@@ -96,13 +102,31 @@ def test_minimal_cloud_event() -> None:
             apex_id=None,
             apex_fqn=None,
             resource=None,
+            deadline=None,
         ),
     )
 
 
+def test_sf_context_is_cached() -> None:
+    sf_context = generate_sf_context()
+    assert isinstance(sf_context["userContext"], dict)
+    # Ensures the header value hasn't already been cached by an earlier test.
+    sf_context["userContext"]["username"] = f"{uuid4()}@example.tld"
+    header_value = encode_cloud_event_extension(sf_context)
+    initial_hits, initial_misses = sf_context_cache_info()
+
+    first_sf_context = SalesforceContext.from_base64_json(header_value)
+    second_sf_context = SalesforceContext.from_base64_json(header_value)
+    assert second_sf_context is first_sf_context
+
+    assert sf_context_cache_info() == (initial_hits + 1, initial_misses + 1)
+
+
 def test_invalid_content_type_missing() -> None:
     headers: dict[str, str] = {}
-    expected_message = r"Content-Type must be 'application/json' not ''$"
+    expected_message = (
+        r"Content-Type must be 'application/json' or 'application/msgpack' not ''$"
+    )
 
     with pytest.raises(CloudEventError, match=expected_message):
         SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"")
@@ -110,7 +134,7 @@ def test_invalid_content_type_missing() -> None:
 
 def test_invalid_content_type_unsupported() -> None:
     headers = {"Content-Type": "text/plain"}
-    expected_message = r"Content-Type must be 'application/json' not 'text/plain'$"
+    expected_message = r"Content-Type must be 'application/json' or 'application/msgpack' not 'text/plain'$"
 
     with pytest.raises(CloudEventError, match=expected_message):
         SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"")
@@ -125,6 +149,79 @@ def test_invalid_body_not_json() -> None:
         SalesforceFunctionsCloudEvent.from_http(Headers(headers), body)
 
 
+def test_lazy_data() -> None:
+    headers = generate_cloud_event_headers()
+    body = b'{"records":[1,2,3]}'
+
+    cloud_event = SalesforceFunctionsCloudEvent.from_http(
+        Headers(headers), body, lazy_data=True
+    )
+
+    assert cloud_event.data is None
+    assert cloud_event.raw_data is body
+    assert cloud_event.load_data is not None
+    assert cloud_event.load_data() == {"records": [1, 2, 3]}
+
+
+def test_lazy_data_invalid_body_not_json() -> None:
+    headers = generate_cloud_event_headers()
+
+    # Invalid payloads are only reported once the data is loaded.
+    cloud_event = SalesforceFunctionsCloudEvent.from_http(
+        Headers(headers), b"Not json", lazy_data=True
+    )
+
+    assert cloud_event.load_data is not None
+    with pytest.raises(CloudEventError, match="Data payload isn't valid JSON: .+"):
+        cloud_event.load_data()
+
+
+def test_lazy_data_empty_body() -> None:
+    headers = generate_cloud_event_headers()
+
+    cloud_event = SalesforceFunctionsCloudEvent.from_http(
+        Headers(headers), b"", lazy_data=True
+    )
+
+    assert cloud_event.data is None
+    assert cloud_event.load_data is None
+
+
+@pytest.mark.parametrize(
+    "content_type", ["application/msgpack", "application/x-msgpack"]
+)
+def test_msgpack(content_type: str) -> None:
+    ormsgpack = pytest.importorskip("ormsgpack")
+    headers = generate_cloud_event_headers()
+    headers["Content-Type"] = content_type
+    body = ormsgpack.packb({"binary": b"\x00\x01", "numbers": [1, 2.5]})
+
+    cloud_event = SalesforceFunctionsCloudEvent.from_http(Headers(headers), body)
+
+    assert cloud_event.data == {"binary": b"\x00\x01", "numbers": [1, 2.5]}
+    assert cloud_event.data_content_type == content_type
+
+
+def test_invalid_body_not_msgpack() -> None:
+    pytest.importorskip("ormsgpack")
+    headers = generate_cloud_event_headers()
+    headers["Content-Type"] = "application/msgpack"
+    expected_message = r"Data payload isn't valid MessagePack: .+"
+
+    with pytest.raises(CloudEventError, match=expected_message):
+        SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"\xc1")
+
+
+def test_msgpack_not_installed() -> None:
+    headers = generate_cloud_event_headers()
+    headers["Content-Type"] = "application/msgpack"
+    expected_message = r"Content-Type 'application/msgpack' requires the optional 'ormsgpack' package to be installed$"
+
+    with patch("salesforce_functions._internal.cloud_event.MSGPACK_CODEC", None):
+        with pytest.raises(CloudEventError, match=expected_message):
+            SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"\x01")
+
+
 def test_invalid_event_time() -> None:
     headers = generate_cloud_event_headers()
     headers["ce-time"] = "12:00"
@@ -138,6 +235,29 @@ def test_invalid_event_time() -> None:
         SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"")
 
 
+def test_deadline_without_offset() -> None:
+    headers = generate_cloud_event_headers(deadline="2023-01-19T10:11:12.468085")
+    cloud_event = SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"")
+
+    assert cloud_event.sf_function_context.deadline == datetime(
+        2023, 1, 19, 10, 11, 12, 468085, tzinfo=timezone.utc
+    )
+
+
+def test_invalid_deadline() -> None:
+    headers = generate_cloud_event_headers(deadline="12:00")
+
+    if sys.version_info < (3, 11):
+        expected_message = r"Unable to parse sffncontext deadline: invalid literal .+"
+    else:
+        expected_message = (
+            r"Unable to parse sffncontext deadline: Invalid isoformat string: .+"
+        )
+
+    with pytest.raises(CloudEventError, match=expected_message):
+        SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"")
+
+
 @pytest.mark.parametrize(
     "header_name",
     [
@@ -210,3 +330,79 @@ def test_invalid_sffncontext_extension_field_missing() -> None:
 
     with pytest.raises(CloudEventError, match=expected_message):
         SalesforceFunctionsCloudEvent.from_http(Headers(headers), b"")
+
+
+def test_batch() -> None:
+    headers = {"Content-Type": BATCH_CONTENT_TYPE}
+    body = orjson.dumps(
+        [
+            generate_batch_event("example-id-1", data={"record_id": 123}),
+            generate_batch_event("example-id-2"),
+        ]
+    )
+    cloud_events = SalesforceFunctionsCloudEvent.batch_from_http(Headers(headers), body)
+
+    assert len(cloud_events) == 2
+    assert isinstance(cloud_events[0], SalesforceFunctionsCloudEvent)
+    assert cloud_events[0].id == "example-id-1"
+    assert cloud_events[0].type == "com.salesforce.function.invoke.async"
+    assert cloud_events[0].data == {"record_id": 123}
+    assert cloud_events[0].data_content_type == "application/json"
+    assert cloud_events[0].time == datetime(
+        2023, 1, 19, 10, 9, 12, 476684, tzinfo=timezone.utc
+    )
+    assert cloud_events[0].sf_context.user_context.org_id == "00DJS0000000123ABC"
+    assert cloud_events[0].sf_function_context.access_token == "EXAMPLE-TOKEN"
+    assert isinstance(cloud_events[1], SalesforceFunctionsCloudEvent)
+    assert cloud_events[1].id == "example-id-2"
+    assert cloud_events[1].data is None
+
+
+def test_batch_invalid_events() -> None:
+    headers = {"Content-Type": BATCH_CONTENT_TYPE}
+    missing_attribute = generate_batch_event("example-id-2")
+    missing_attribute.pop("sffncontext")
+    unsupported_content_type = generate_batch_event("example-id-3")
+    unsupported_content_type["datacontenttype"] = "text/plain"
+    body = orjson.dumps(
+        [
+            generate_batch_event("example-id-1"),
+            missing_attribute,
+            unsupported_content_type,
+            "Not an object",
+        ]
+    )
+    cloud_events = SalesforceFunctionsCloudEvent.batch_from_http(Headers(headers), body)
+
+    # Invalid events don't prevent the rest of the batch from being parsed.
+    assert isinstance(cloud_events[0], SalesforceFunctionsCloudEvent)
+    assert [str(error) for error in cloud_events[1:]] == [
+        "Missing required attribute 'sffncontext'",
+        "datacontenttype must be 'application/json' not 'text/plain'",
+        "Event must be a JSON object not 'str'",
+    ]
+
+
+def test_batch_invalid_content_type() -> None:
+    headers = {"Content-Type": "application/json"}
+    expected_message = r"Content-Type must be 'application/cloudevents-batch\+json' not 'application/json'$"
+
+    with pytest.raises(CloudEventError, match=expected_message):
+        SalesforceFunctionsCloudEvent.batch_from_http(Headers(headers), b"[]")
+
+
+def test_batch_invalid_body_not_json() -> None:
+    headers = {"Content-Type": BATCH_CONTENT_TYPE}
+    expected_message = r"Batch payload isn't valid JSON: unexpected character: .+"
+
+    with pytest.raises(CloudEventError, match=expected_message):
+        SalesforceFunctionsCloudEvent.batch_from_http(Headers(headers), b"Not json")
+
+
+def test_batch_invalid_body_not_array() -> None:
+    headers = {"Content-Type": BATCH_CONTENT_TYPE}
+    body = orjson.dumps(generate_batch_event("example-id-1"))
+    expected_message = r"Batch payload must be a JSON array of events$"
+
+    with pytest.raises(CloudEventError, match=expected_message):
+        SalesforceFunctionsCloudEvent.batch_from_http(Headers(headers), body)
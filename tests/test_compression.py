@@ -0,0 +1,65 @@
+import gzip
+import threading
+
+import pytest
+
+from salesforce_functions._internal.compression import (
+    ResponseCompressor,
+    available_compressors,
+)
+
+
+def test_available_compressors() -> None:
+    compressors = available_compressors()
+
+    # gzip is always available, and is the least preferred.
+    assert list(compressors)[-1] == "gzip"
+    assert gzip.decompress(compressors["gzip"](b"Example")) == b"Example"
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected_encoding",
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("GZIP", "gzip"),
+        ("x-gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("gzip, br;q=0.5", "gzip"),
+        ("zstd;q=0.8, br;q=0.9, gzip;q=0.1", "br"),
+        ("*", "zstd"),
+        ("*, zstd;q=0", "br"),
+        ("gzip;q=0", None),
+        ("gzip;q=invalid", None),
+        ("identity", None),
+        ("deflate", None),
+    ],
+)
+def test_negotiate(accept_encoding: str, expected_encoding: str | None) -> None:
+    compressor = ResponseCompressor(
+        min_size=0,
+        compressors={"zstd": bytes, "br": bytes, "gzip": bytes},
+    )
+
+    assert compressor.negotiate(accept_encoding) == expected_encoding
+
+
+async def test_compress() -> None:
+    threads: list[threading.Thread] = []
+
+    def compress(body: bytes) -> bytes:
+        threads.append(threading.current_thread())
+        return gzip.compress(body)
+
+    compressor = ResponseCompressor(
+        min_size=0, thread_min_size=100, compressors={"gzip": compress}
+    )
+
+    small_body = await compressor.compress(b"A" * 99, "gzip")
+    large_body = await compressor.compress(b"A" * 100, "gzip")
+
+    assert gzip.decompress(small_body) == b"A" * 99
+    assert gzip.decompress(large_body) == b"A" * 100
+    # Only large bodies are compressed on a thread, rather than on the event loop.
+    assert threads[0] is threading.current_thread()
+    assert threads[1] is not threading.current_thread()
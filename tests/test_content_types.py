@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import pytest
+
+from salesforce_functions._internal.content_types import (
+    JSON_CODEC,
+    MSGPACK_CODEC,
+    negotiate_response_codec,
+)
+
+
+@pytest.mark.parametrize(
+    "accept,expected_content_type",
+    [
+        ("", "application/json"),
+        ("*/*", "application/json"),
+        ("application/json", "application/json"),
+        ("application/msgpack", "application/msgpack"),
+        ("application/x-msgpack", "application/msgpack"),
+        ("application/msgpack, */*", "application/msgpack"),
+        ("application/msgpack;q=0.5, application/json", "application/json"),
+        ("application/json;q=0.5, application/msgpack", "application/msgpack"),
+        ("application/msgpack;q=0", "application/json"),
+        ("text/html", "application/json"),
+    ],
+)
+def test_negotiate_response_codec(accept: str, expected_content_type: str) -> None:
+    if MSGPACK_CODEC is None:
+        pytest.skip("Requires the optional 'ormsgpack' package")
+
+    assert negotiate_response_codec(accept).content_type == expected_content_type
+
+
+def test_negotiate_response_codec_msgpack_not_installed() -> None:
+    negotiate_response_codec.cache_clear()
+
+    try:
+        with patch("salesforce_functions._internal.content_types.MSGPACK_CODEC", None):
+            # Responses fall back to JSON, which is always supported.
+            assert negotiate_response_codec("application/msgpack") is JSON_CODEC
+    finally:
+        negotiate_response_codec.cache_clear()
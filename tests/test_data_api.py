@@ -1,3 +1,4 @@
+import asyncio
 from hashlib import md5
 
 import pytest
@@ -13,7 +14,13 @@ from salesforce_functions import (
 from salesforce_functions.data_api import (
     _create_session,  # pyright: ignore [reportPrivateUsage]
 )
-from salesforce_functions.data_api import DataAPI
+from salesforce_functions.data_api import (
+    _event_loop,  # pyright: ignore [reportPrivateUsage]
+)
+from salesforce_functions.data_api import (
+    _request_duration_observer,  # pyright: ignore [reportPrivateUsage]
+)
+from salesforce_functions.data_api import DataAPI, ProcessDataAPI, SyncDataAPI
 from salesforce_functions.data_api.exceptions import (
     ClientError,
     InnerSalesforceRestApiError,
@@ -42,6 +49,59 @@ async def test_client_error() -> None:
         await data_api.query("SELECT Name FROM Account")
 
 
+async def test_request_duration_observer() -> None:
+    data_api = DataAPI(org_domain_url="", api_version="", access_token="")
+    durations: list[int] = []
+    _request_duration_observer.set(durations.append)
+
+    # The duration is reported even if the request fails.
+    with pytest.raises(ClientError):
+        await data_api.query("SELECT Name FROM Account")
+
+    assert len(durations) == 1
+    assert durations[0] >= 0
+
+
+async def test_sync_data_api() -> None:
+    data_api = SyncDataAPI(DataAPI(org_domain_url="", api_version="", access_token=""))
+    expected_message = r"An error occurred while making the request: InvalidURL: .+$"
+    _event_loop.set(asyncio.get_running_loop())
+
+    # The request is run on the event loop, with its result (or exception) returned to the thread.
+    with pytest.raises(ClientError, match=expected_message):
+        await asyncio.to_thread(data_api.query, "SELECT Name FROM Account")
+
+
+async def test_sync_data_api_used_from_async_code() -> None:
+    data_api = SyncDataAPI(new_data_api())
+    expected_message = (
+        r"SyncDataAPI can't be used from async code, since it would block the event loop\."
+        r" Await the methods of DataAPI instead\.$"
+    )
+    _event_loop.set(asyncio.get_running_loop())
+
+    with pytest.raises(RuntimeError, match=expected_message):
+        data_api.query("SELECT Name FROM Account")
+
+
+async def test_sync_data_api_used_outside_function_runtime() -> None:
+    data_api = SyncDataAPI(new_data_api())
+    expected_message = (
+        r"SyncDataAPI can only be used by synchronous functions that are called by the"
+        r" function runtime\.$"
+    )
+
+    with pytest.raises(RuntimeError, match=expected_message):
+        await asyncio.to_thread(data_api.query, "SELECT Name FROM Account")
+
+
+def test_process_data_api_used_outside_process_pool() -> None:
+    expected_message = r"ProcessDataAPI can only be used by code that's run using Context\.run_in_process\(\)\.$"
+
+    with pytest.raises(RuntimeError, match=expected_message):
+        ProcessDataAPI().query("SELECT Name FROM Account")
+
+
 @pytest.mark.requires_wiremock
 async def test_unexpected_response() -> None:
     data_api = new_data_api()
@@ -7,7 +7,10 @@ import pytest
 
 from salesforce_functions._internal.function_loader import (
     LoadFunctionError,
+    load_batch_function,
     load_function,
+    load_lifecycle_hooks,
+    load_payload_decoder,
 )
 
 
@@ -97,11 +100,26 @@ def test_invalid_function_not_a_function() -> None:
         load_function(fixture)
 
 
-def test_invalid_function_not_async() -> None:
-    fixture = Path("tests/fixtures/invalid_not_async")
+def test_sync_function() -> None:
+    fixture = Path("tests/fixtures/sync_function")
+    function = load_function(fixture)
+    assert not inspect.iscoroutinefunction(function)
+    assert function.__name__ == "function"
+
+
+def test_streaming_function() -> None:
+    fixture = Path("tests/fixtures/streaming")
+    function = load_function(fixture)
+    assert inspect.isasyncgenfunction(function)
+    assert function.__name__ == "function"
+
+
+def test_invalid_function_generator() -> None:
+    fixture = Path("tests/fixtures/invalid_generator")
     expected_message = (
-        r"The function named 'function' in main\.py must be an async function\."
-        r" Change the function definition from 'def function' to 'async def function'\.$"
+        r"The function named 'function' in main\.py must return its result rather than being a"
+        r" generator\. Replace any 'yield' statements with a 'return' statement, or to stream the"
+        r" results, change the function definition from 'def function' to 'async def function'\.$"
     )
 
     with pytest.raises(LoadFunctionError, match=expected_message):
@@ -117,3 +135,102 @@ def test_invalid_function_number_of_args() -> None:
 
     with pytest.raises(LoadFunctionError, match=expected_message):
         load_function(fixture)
+
+
+def test_lifecycle_hooks() -> None:
+    fixture = Path("tests/fixtures/lifecycle_hooks")
+    lifecycle_hooks = load_lifecycle_hooks(load_function(fixture))
+    assert lifecycle_hooks.init is not None
+    assert lifecycle_hooks.init.__name__ == "init"
+    assert lifecycle_hooks.shutdown is not None
+    assert lifecycle_hooks.shutdown.__name__ == "shutdown"
+
+
+def test_lifecycle_hooks_not_defined() -> None:
+    fixture = Path("tests/fixtures/basic")
+    lifecycle_hooks = load_lifecycle_hooks(load_function(fixture))
+    assert lifecycle_hooks.init is None
+    assert lifecycle_hooks.shutdown is None
+
+
+def test_invalid_lifecycle_hook_not_async() -> None:
+    fixture = Path("tests/fixtures/invalid_hook_not_async")
+    expected_message = (
+        r"The 'init' hook in main\.py must be an async function\."
+        r" Change the function definition from 'def init' to 'async def init'\.$"
+    )
+
+    with pytest.raises(LoadFunctionError, match=expected_message):
+        load_lifecycle_hooks(load_function(fixture))
+
+
+def test_invalid_lifecycle_hook_number_of_args() -> None:
+    fixture = Path("tests/fixtures/invalid_hook_number_of_args")
+    expected_message = (
+        r"The 'shutdown' hook in main\.py has the wrong number of parameters"
+        r" \(expected 0 but found 1\)\.$"
+    )
+
+    with pytest.raises(LoadFunctionError, match=expected_message):
+        load_lifecycle_hooks(load_function(fixture))
+
+
+def test_batch_function() -> None:
+    fixture = Path("tests/fixtures/batch_function")
+    batch_function = load_batch_function(load_function(fixture))
+
+    assert batch_function is not None
+    assert inspect.iscoroutinefunction(batch_function)
+    assert batch_function.__name__ == "batch_function"
+
+
+def test_batch_function_not_defined() -> None:
+    fixture = Path("tests/fixtures/basic")
+    assert load_batch_function(load_function(fixture)) is None
+
+
+def test_invalid_batch_function_not_async() -> None:
+    fixture = Path("tests/fixtures/invalid_batch_function_not_async")
+    expected_message = (
+        r"The function named 'batch_function' in main\.py must be an async function\."
+        r" Change the function definition from 'def batch_function' to 'async def batch_function'\.$"
+    )
+
+    with pytest.raises(LoadFunctionError, match=expected_message):
+        load_batch_function(load_function(fixture))
+
+
+def test_invalid_batch_function_number_of_args() -> None:
+    fixture = Path("tests/fixtures/invalid_batch_function_number_of_args")
+    expected_message = (
+        r"The function named 'batch_function' in main\.py has the wrong number of parameters"
+        r" \(expected 2 but found 1\)\.$"
+    )
+
+    with pytest.raises(LoadFunctionError, match=expected_message):
+        load_batch_function(load_function(fixture))
+
+
+def test_payload_decoder() -> None:
+    fixture = Path("tests/fixtures/typed_payload")
+    decoder = load_payload_decoder(load_function(fixture))
+
+    assert decoder is not None
+    payload = decoder({"account_name": "Example"})
+    assert type(payload).__name__ == "Payload"
+
+
+def test_payload_decoder_not_needed() -> None:
+    fixture = Path("tests/fixtures/basic")
+    assert load_payload_decoder(load_function(fixture)) is None
+
+
+def test_invalid_payload_type() -> None:
+    fixture = Path("tests/fixtures/invalid_payload_type")
+    expected_message = (
+        r"Couldn't build a decoder for the event data type of the function named 'function' in main\.py:"
+        r" NameError: name 'UndefinedType' is not defined$"
+    )
+
+    with pytest.raises(LoadFunctionError, match=expected_message):
+        load_payload_decoder(load_function(fixture))
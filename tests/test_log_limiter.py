@@ -0,0 +1,129 @@
+import contextvars
+from types import CodeType
+from unittest.mock import patch
+
+from pytest import CaptureFixture
+
+from salesforce_functions._internal.log_limiter import (
+    InvocationLogLimiter,
+    LogLimits,
+    start_invocation_log_limiter,
+)
+from salesforce_functions._internal.logging import configure_logging, get_logger
+
+
+def call_site_key(line: int) -> tuple[CodeType, int]:
+    return (call_site_key.__code__, line)
+
+
+def test_no_limits() -> None:
+    log_limiter = InvocationLogLimiter(LogLimits())
+
+    assert all(log_limiter.allow(call_site_key(1)) for _ in range(1000))
+    assert log_limiter.dropped_by_sampling == 0
+    assert log_limiter.dropped_by_rate_limit == 0
+
+
+def test_sampling() -> None:
+    log_limiter = InvocationLogLimiter(LogLimits(sample_rate=0.25))
+
+    allowed = [log_limiter.allow(call_site_key(1)) for _ in range(10)]
+
+    # The first line is always logged, then every fourth line after it.
+    assert allowed == [
+        True,
+        False,
+        False,
+        False,
+        True,
+        False,
+        False,
+        False,
+        True,
+        False,
+    ]
+    assert log_limiter.dropped_by_sampling == 7
+    # Each call site is sampled separately.
+    assert log_limiter.allow(call_site_key(2))
+
+
+def test_rate_limit() -> None:
+    log_limiter = InvocationLogLimiter(LogLimits(rate_limit=3))
+
+    with patch("time.monotonic", return_value=100.0) as mock_monotonic:
+        # An initial burst of lines is allowed, after which lines are limited to the rate.
+        allowed = [log_limiter.allow(call_site_key(1)) for _ in range(5)]
+        assert allowed == [True, True, True, False, False]
+        assert log_limiter.allow(call_site_key(2))
+
+        mock_monotonic.return_value = 100.5
+        allowed = [log_limiter.allow(call_site_key(1)) for _ in range(3)]
+        assert allowed == [True, False, False]
+
+        # The burst is capped at the rate limit, however long the call site is idle.
+        mock_monotonic.return_value = 200.0
+        allowed = [log_limiter.allow(call_site_key(1)) for _ in range(4)]
+        assert allowed == [True, True, True, False]
+
+    assert log_limiter.dropped_by_rate_limit == 5
+    assert log_limiter.dropped_by_sampling == 0
+
+
+def test_rate_limit_less_than_one() -> None:
+    log_limiter = InvocationLogLimiter(LogLimits(rate_limit=0.5))
+
+    with patch("time.monotonic", return_value=100.0) as mock_monotonic:
+        assert log_limiter.allow(call_site_key(1))
+        assert not log_limiter.allow(call_site_key(1))
+
+        mock_monotonic.return_value = 102.0
+        assert log_limiter.allow(call_site_key(1))
+
+
+def test_finish() -> None:
+    log_limiter = InvocationLogLimiter(LogLimits(sample_rate=0.1))
+    log_limiter.allow(call_site_key(1))
+    assert not log_limiter.allow(call_site_key(1))
+
+    log_limiter.finish()
+
+    assert log_limiter.allow(call_site_key(1))
+    assert log_limiter.dropped_by_sampling == 1
+
+
+def log_invocation(log_limits: LogLimits) -> InvocationLogLimiter:
+    logger = get_logger()
+
+    # Lines aren't limited outside of an invocation.
+    for _ in range(2):
+        logger.info("Before invocation")
+
+    log_limiter = start_invocation_log_limiter(log_limits)
+    for index in range(4):
+        logger.info("Info message", index=index)
+        logger.warning("Warning message", index=index)
+
+    return log_limiter
+
+
+def test_processor(capsys: CaptureFixture[str]) -> None:
+    log_limits = LogLimits(sample_rate=0.5)
+    configure_logging(log_limits=log_limits)
+
+    try:
+        # Run in a copy of the context, so that the limiter doesn't affect later tests.
+        log_limiter = contextvars.copy_context().run(log_invocation, log_limits)
+    finally:
+        configure_logging()
+
+    assert log_limiter.dropped_by_sampling == 2
+    assert capsys.readouterr().out == (
+        'level=info msg="Before invocation"\n'
+        'level=info msg="Before invocation"\n'
+        'index=0 level=info msg="Info message"\n'
+        'index=0 level=warning msg="Warning message"\n'
+        'index=1 level=warning msg="Warning message"\n'
+        'index=2 level=info msg="Info message"\n'
+        'index=2 level=warning msg="Warning message"\n'
+        'index=3 level=warning msg="Warning message"\n'
+    )
@@ -0,0 +1,171 @@
+import io
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from salesforce_functions._internal.log_writer import QueuedLogWriter
+
+
+class BlockingFile(io.StringIO):
+    """A file whose writes block until `unblock()` is called, like stdout when the log drain is slow."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.write_started = threading.Event()
+        self._unblocked = threading.Event()
+
+    def unblock(self) -> None:
+        self._unblocked.set()
+
+    def write(self, s: str) -> int:
+        self.write_started.set()
+        self._unblocked.wait()
+        return super().write(s)
+
+
+def start_blocked_writer(
+    overflow_policy: str, max_queued: int = 2
+) -> tuple[QueuedLogWriter, BlockingFile, list[int]]:
+    file = BlockingFile()
+    dropped_counts: list[int] = []
+    writer = QueuedLogWriter(
+        max_queued=max_queued,
+        overflow_policy=overflow_policy,  # type: ignore[arg-type]
+        file=file,
+        on_dropped=dropped_counts.append,
+    )
+    # The writer thread takes the first line, and then blocks writing it.
+    writer.write("line 1")
+    assert file.write_started.wait(timeout=5)
+    return writer, file, dropped_counts
+
+
+def test_writes_lines_in_order() -> None:
+    file = io.StringIO()
+    writer = QueuedLogWriter(max_queued=100, overflow_policy="block", file=file)
+
+    for index in range(50):
+        writer.write(f"line {index}")
+
+    assert writer.flush(timeout=5)
+    assert file.getvalue() == "".join(f"line {index}\n" for index in range(50))
+    assert writer.close(timeout=5)
+
+
+def test_drop_newest() -> None:
+    writer, file, dropped_counts = start_blocked_writer("drop-newest")
+
+    for index in range(2, 6):
+        writer.write(f"line {index}")
+
+    assert writer.queued == 2
+    assert writer.dropped == 2
+
+    file.unblock()
+    assert writer.close(timeout=5)
+    assert file.getvalue() == (
+        "line 1\n"
+        "line 2\n"
+        "line 3\n"
+        'level=warning msg="Dropped log lines since the log queue was full" droppedLines=2\n'
+    )
+    assert dropped_counts == [2]
+
+
+def test_drop_oldest() -> None:
+    writer, file, dropped_counts = start_blocked_writer("drop-oldest")
+
+    for index in range(2, 6):
+        writer.write(f"line {index}")
+
+    assert writer.queued == 2
+    assert writer.dropped == 2
+
+    file.unblock()
+    assert writer.close(timeout=5)
+    assert file.getvalue() == (
+        "line 1\n"
+        "line 4\n"
+        "line 5\n"
+        'level=warning msg="Dropped log lines since the log queue was full" droppedLines=2\n'
+    )
+    assert dropped_counts == [2]
+
+
+def test_block() -> None:
+    writer, file, dropped_counts = start_blocked_writer("block", max_queued=1)
+    writer.write("line 2")
+
+    # The queue is full, so the next write waits until the writer thread makes room.
+    blocked_write = threading.Thread(target=writer.write, args=["line 3"])
+    blocked_write.start()
+    blocked_write.join(timeout=0.1)
+    assert blocked_write.is_alive()
+
+    file.unblock()
+    blocked_write.join(timeout=5)
+    assert not blocked_write.is_alive()
+
+    assert writer.close(timeout=5)
+    assert file.getvalue() == "line 1\nline 2\nline 3\n"
+    assert writer.dropped == 0
+    assert not dropped_counts
+
+
+def test_flush_timeout() -> None:
+    writer, file, _ = start_blocked_writer("drop-newest")
+
+    assert not writer.flush(timeout=0.01)
+
+    file.unblock()
+    assert writer.flush(timeout=5)
+    assert writer.close(timeout=5)
+
+
+def test_write_after_close() -> None:
+    file = io.StringIO()
+    writer = QueuedLogWriter(max_queued=10, overflow_policy="drop-newest", file=file)
+    writer.write("line 1")
+
+    assert writer.close(timeout=5)
+    assert file.getvalue() == "line 1\n"
+
+    # Once closed, lines are written directly.
+    writer.write("line 2")
+    assert file.getvalue() == "line 1\nline 2\n"
+    assert writer.flush(timeout=5)
+
+
+def test_closed_file() -> None:
+    file = io.StringIO()
+    file.close()
+    writer = QueuedLogWriter(max_queued=10, overflow_policy="drop-newest", file=file)
+
+    # Errors writing to the file are ignored, rather than stopping the writer thread.
+    writer.write("line 1")
+    assert writer.close(timeout=5)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires os.fork()")
+def test_fork(tmp_path: Path) -> None:
+    log_path = tmp_path.joinpath("log.txt")
+    with log_path.open("w", encoding="utf-8") as file:
+        writer = QueuedLogWriter(max_queued=10, overflow_policy="block", file=file)
+        writer.write("line 1")
+        assert writer.flush(timeout=5)
+
+        pid = os.fork()
+        if pid == 0:
+            # The writer thread isn't copied into the forked process, so is restarted there.
+            writer.write("line 2")
+            os._exit(0 if writer.close(timeout=5) else 1)
+
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        writer.write("line 3")
+        assert writer.close(timeout=5)
+
+    assert log_path.read_text(encoding="utf-8") == "line 1\nline 2\nline 3\n"
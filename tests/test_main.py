@@ -43,3 +43,68 @@ def test_entry_point_script() -> None:
     assert process.returncode == 0
     assert process.stderr == ""
     assert "usage: sf-functions-python" in process.stdout
+
+
+def _import_times(*args: str) -> dict[str, int]:
+    """Run Python with `-X importtime`, returning the cumulative import time (in microseconds) of each module."""
+    process = subprocess.run(
+        ["python", "-X", "importtime", *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    import_times: dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        import_times[module.strip()] = int(cumulative)
+
+    return import_times
+
+
+# A generous budget, so that the test isn't flaky on slower machines. The check for which
+# dependencies were imported is what catches most regressions.
+IMPORT_TIME_BUDGET_MICROSECONDS = 50_000
+
+# Dependencies that should only be imported once they are used.
+HEAVY_DEPENDENCIES = ["aiohttp", "orjson", "starlette", "structlog", "uvicorn"]
+
+
+def test_package_import_time() -> None:
+    import_times = _import_times("-c", "import salesforce_functions")
+
+    assert import_times["salesforce_functions"] < IMPORT_TIME_BUDGET_MICROSECONDS
+    for dependency in HEAVY_DEPENDENCIES:
+        assert dependency not in import_times
+
+
+def test_version_subcommand_import_time() -> None:
+    import_times = _import_times("-m", "salesforce_functions", "version")
+
+    assert (
+        import_times["salesforce_functions._internal.cli"]
+        < IMPORT_TIME_BUDGET_MICROSECONDS
+    )
+    for dependency in HEAVY_DEPENDENCIES:
+        assert dependency not in import_times
+
+
+def test_public_api_lazily_imported() -> None:
+    process = subprocess.run(
+        [
+            "python",
+            "-c",
+            "import sys, salesforce_functions;"
+            " assert 'aiohttp' not in sys.modules;"
+            " from salesforce_functions import Context, UnitOfWork, get_logger;"
+            " assert 'aiohttp' in sys.modules;"
+            " print(Context.__name__, UnitOfWork.__name__, get_logger.__name__)",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    assert process.stdout == "Context UnitOfWork get_logger\n"
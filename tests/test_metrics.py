@@ -0,0 +1,174 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from salesforce_functions._internal.admission import AdmissionController
+from salesforce_functions._internal.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    RuntimeMetrics,
+)
+
+
+def test_render() -> None:
+    registry = MetricsRegistry()
+    counter = Counter(
+        registry,
+        "example_total",
+        "An example counter.",
+        label_name="status_code",
+        label_values=["200", "500"],
+    )
+    gauge = Gauge(registry, "example_gauge", "An example gauge.")
+    histogram = Histogram(
+        registry, "example_seconds", "An example histogram.", buckets=(0.1, 1.0)
+    )
+    registry.open(None)
+
+    counter.inc("200")
+    counter.inc("200")
+    counter.inc("500", 3)
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe_ns(2_500_000_000)
+
+    assert registry.render() == (
+        "# HELP example_total An example counter.\n"
+        "# TYPE example_total counter\n"
+        'example_total{status_code="200"} 2\n'
+        'example_total{status_code="500"} 3\n'
+        "# HELP example_gauge An example gauge.\n"
+        "# TYPE example_gauge gauge\n"
+        "example_gauge 1\n"
+        "# HELP example_seconds An example histogram.\n"
+        "# TYPE example_seconds histogram\n"
+        'example_seconds_bucket{le="0.1"} 1\n'
+        'example_seconds_bucket{le="1.0"} 2\n'
+        'example_seconds_bucket{le="+Inf"} 3\n'
+        "example_seconds_sum 3.1\n"
+        "example_seconds_count 3\n"
+    )
+
+
+def test_define_after_open() -> None:
+    registry = MetricsRegistry()
+    registry.open(None)
+
+    with pytest.raises(
+        RuntimeError, match="Metrics can't be defined once the registry is open."
+    ):
+        Gauge(registry, "example_gauge", "An example gauge.")
+
+
+def test_aggregates_across_workers(tmp_path: Path) -> None:
+    first_worker = RuntimeMetrics(status_codes=[200, 500])
+    second_worker = RuntimeMetrics(status_codes=[200, 500])
+
+    with patch("os.getpid", return_value=1001):
+        first_worker.registry.open(tmp_path)
+    with patch("os.getpid", return_value=1002):
+        second_worker.registry.open(tmp_path)
+
+    first_worker.invocations.inc("200")
+    first_worker.in_flight_invocations.inc()
+    first_worker.request_size.observe(100)
+    second_worker.invocations.inc("200")
+    second_worker.invocations.inc("500")
+    second_worker.in_flight_invocations.inc()
+    second_worker.request_size.observe(2000)
+
+    for worker in (first_worker, second_worker):
+        rendered = worker.registry.render()
+        assert 'sf_functions_invocations_total{status_code="200"} 2\n' in rendered
+        assert 'sf_functions_invocations_total{status_code="500"} 1\n' in rendered
+        assert "sf_functions_in_flight_invocations 2\n" in rendered
+        assert 'sf_functions_request_size_bytes_bucket{le="256.0"} 1\n' in rendered
+        assert "sf_functions_request_size_bytes_sum 2100\n" in rendered
+        assert "sf_functions_request_size_bytes_count 2\n" in rendered
+
+    # Once a worker exits, its gauges no longer count towards the totals, but its counters do.
+    second_worker.registry.close()
+    rendered = first_worker.registry.render()
+    assert 'sf_functions_invocations_total{status_code="200"} 2\n' in rendered
+    assert "sf_functions_in_flight_invocations 1\n" in rendered
+
+    # Values recorded after closing are discarded.
+    second_worker.invocations.inc("200")
+    assert 'sf_functions_invocations_total{status_code="200"} 2\n' in (
+        first_worker.registry.render()
+    )
+
+    first_worker.registry.close()
+
+
+def test_reopened_by_worker_with_same_pid(tmp_path: Path) -> None:
+    with patch("os.getpid", return_value=1001):
+        previous_worker = RuntimeMetrics(status_codes=[200])
+        previous_worker.registry.open(tmp_path)
+        previous_worker.invocations.inc("200")
+        previous_worker.queued_invocations.inc()
+        # Simulate the worker being killed, and so not closing the registry.
+
+        worker = RuntimeMetrics(status_codes=[200])
+        worker.registry.open(tmp_path)
+
+    rendered = worker.registry.render()
+    assert 'sf_functions_invocations_total{status_code="200"} 1\n' in rendered
+    assert "sf_functions_queued_invocations 0\n" in rendered
+
+    worker.registry.close()
+    previous_worker.registry.close()
+
+
+def test_update_sf_context_cache_counters(tmp_path: Path) -> None:
+    with patch("os.getpid", return_value=1001):
+        previous_worker = RuntimeMetrics(status_codes=[200])
+        previous_worker.registry.open(tmp_path)
+        previous_worker.update_sf_context_cache_counters(hits=5, misses=2)
+
+        # The cache totals of a new worker start from zero, but the counters mustn't go backwards.
+        worker = RuntimeMetrics(status_codes=[200])
+        worker.registry.open(tmp_path)
+        worker.update_sf_context_cache_counters(hits=1, misses=1)
+        worker.update_sf_context_cache_counters(hits=3, misses=1)
+
+    rendered = worker.registry.render()
+    assert 'sf_functions_sfcontext_cache_lookups_total{result="hit"} 8\n' in rendered
+    assert 'sf_functions_sfcontext_cache_lookups_total{result="miss"} 3\n' in rendered
+
+    worker.registry.close()
+    previous_worker.registry.close()
+
+
+def test_ignores_files_with_different_layout(tmp_path: Path) -> None:
+    tmp_path.joinpath("worker-1.metrics").write_bytes(b"\x00" * 16)
+    metrics = RuntimeMetrics(status_codes=[200])
+    metrics.registry.open(tmp_path)
+    metrics.invocations.inc("200")
+
+    assert 'sf_functions_invocations_total{status_code="200"} 1\n' in (
+        metrics.registry.render()
+    )
+
+    metrics.registry.close()
+
+
+async def test_update_admission_gauges() -> None:
+    metrics = RuntimeMetrics(status_codes=[200])
+    metrics.registry.open(None)
+    admission_controller = AdmissionController(
+        max_in_flight=1, on_change=metrics.update_admission_gauges
+    )
+
+    async with admission_controller.admit():
+        rendered = metrics.registry.render()
+        assert "sf_functions_in_flight_invocations 1\n" in rendered
+        assert "sf_functions_queued_invocations 0\n" in rendered
+
+    assert "sf_functions_in_flight_invocations 0\n" in metrics.registry.render()
@@ -0,0 +1,85 @@
+import dataclasses
+
+from salesforce_functions._internal.cloud_event import SalesforceContext
+from salesforce_functions._internal.org_cache import OrgCache
+
+from .utils import encode_cloud_event_extension, generate_sf_context
+
+USER_CONTEXT = SalesforceContext.from_base64_json(
+    encode_cloud_event_extension(generate_sf_context(include_optional_attributes=False))
+).user_context
+
+
+def test_org_attributes() -> None:
+    org_cache = OrgCache(api_version="56.0", session=None)
+    org = org_cache.get_org(USER_CONTEXT, "EXAMPLE-TOKEN")
+
+    assert org.id == "00DJS0000000123ABC"
+    assert org.base_url == "https://example-base-url.my.salesforce-sites.com"
+    assert org.domain_url == "https://example-domain-url.my.salesforce.com"
+    assert org.data_api.access_token == "EXAMPLE-TOKEN"
+    assert org.user.id == "005JS000000H123"
+    assert org.user.username == "user@example.tld"
+    assert org.user.on_behalf_of_user_id is None
+
+
+def test_org_reused() -> None:
+    org_cache = OrgCache(api_version="56.0", session=None)
+    org = org_cache.get_org(USER_CONTEXT, "EXAMPLE-TOKEN")
+
+    assert org_cache.get_org(USER_CONTEXT, "EXAMPLE-TOKEN") is org
+    assert org_cache.get_org(dataclasses.replace(USER_CONTEXT), "EXAMPLE-TOKEN") is org
+    assert len(org_cache) == 1
+
+
+def test_org_replaced_when_access_token_changes() -> None:
+    org_cache = OrgCache(api_version="56.0", session=None)
+    org = org_cache.get_org(USER_CONTEXT, "EXAMPLE-TOKEN")
+    new_org = org_cache.get_org(USER_CONTEXT, "NEW-EXAMPLE-TOKEN")
+
+    assert new_org is not org
+    assert new_org.data_api.access_token == "NEW-EXAMPLE-TOKEN"
+    assert org_cache.get_org(USER_CONTEXT, "NEW-EXAMPLE-TOKEN") is new_org
+    assert len(org_cache) == 1
+
+
+def test_org_replaced_when_user_context_changes() -> None:
+    org_cache = OrgCache(api_version="56.0", session=None)
+    org = org_cache.get_org(USER_CONTEXT, "EXAMPLE-TOKEN")
+    migrated_user_context = dataclasses.replace(
+        USER_CONTEXT, salesforce_base_url="https://new-base-url.my.salesforce-sites.com"
+    )
+    new_org = org_cache.get_org(migrated_user_context, "EXAMPLE-TOKEN")
+
+    assert new_org is not org
+    assert new_org.base_url == "https://new-base-url.my.salesforce-sites.com"
+    assert len(org_cache) == 1
+
+
+def test_different_users_cached_separately() -> None:
+    org_cache = OrgCache(api_version="56.0", session=None)
+    org = org_cache.get_org(USER_CONTEXT, "EXAMPLE-TOKEN")
+    other_user_context = dataclasses.replace(USER_CONTEXT, user_id="005JS000000H456")
+    other_org = org_cache.get_org(other_user_context, "OTHER-EXAMPLE-TOKEN")
+
+    assert other_org is not org
+    assert org_cache.get_org(USER_CONTEXT, "EXAMPLE-TOKEN") is org
+    assert org_cache.get_org(other_user_context, "OTHER-EXAMPLE-TOKEN") is other_org
+    assert len(org_cache) == 2
+
+
+def test_least_recently_used_evicted() -> None:
+    org_cache = OrgCache(api_version="56.0", session=None, max_size=2)
+    first_user_context = dataclasses.replace(USER_CONTEXT, user_id="005JS0000000001")
+    second_user_context = dataclasses.replace(USER_CONTEXT, user_id="005JS0000000002")
+    third_user_context = dataclasses.replace(USER_CONTEXT, user_id="005JS0000000003")
+
+    first_org = org_cache.get_org(first_user_context, "EXAMPLE-TOKEN")
+    second_org = org_cache.get_org(second_user_context, "EXAMPLE-TOKEN")
+    # Marks the first org as the most recently used.
+    assert org_cache.get_org(first_user_context, "EXAMPLE-TOKEN") is first_org
+    org_cache.get_org(third_user_context, "EXAMPLE-TOKEN")
+
+    assert len(org_cache) == 2
+    assert org_cache.get_org(first_user_context, "EXAMPLE-TOKEN") is first_org
+    assert org_cache.get_org(second_user_context, "EXAMPLE-TOKEN") is not second_org
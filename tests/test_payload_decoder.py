@@ -0,0 +1,261 @@
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Literal, Optional, TypedDict
+
+import pytest
+
+from salesforce_functions import Context, InvocationEvent
+from salesforce_functions._internal.payload_decoder import (
+    PayloadDecodeError,
+    PayloadDecoder,
+    build_payload_decoder,
+)
+
+
+class Stage(Enum):
+    PROSPECTING = "Prospecting"
+    CLOSED_WON = "Closed Won"
+
+
+class Address(TypedDict, total=False):
+    city: str
+    postal_code: str
+
+
+@dataclass
+class Opportunity:  # pylint: disable=too-many-instance-attributes
+    name: str
+    amount: float
+    stage: Stage
+    probability: int | None = None
+    tags: list[str] = field(default_factory=list)
+    address: Optional[Address] = None
+    priority: Literal["low", "high"] = "low"
+    metadata: dict[str, Any] = field(default_factory=dict)
+    related: list["Opportunity"] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        if self.amount < 0:
+            raise ValueError("amount must not be negative")
+
+
+class Account(TypedDict):
+    name: str
+    opportunities: list[Opportunity]
+
+
+def build_decoder(payload_type: Any) -> PayloadDecoder:
+    async def function(
+        _event: InvocationEvent[payload_type], _context: Context
+    ) -> None:
+        pass
+
+    decoder = build_payload_decoder(function)
+    assert decoder is not None
+    return decoder
+
+
+def test_dataclass() -> None:
+    decoder = build_decoder(Opportunity)
+
+    opportunity = decoder(
+        {
+            "name": "Example",
+            "amount": 1000,
+            "stage": "Closed Won",
+            "tags": ["a", "b"],
+            "address": {"city": "Example City", "unknown": "Ignored"},
+            "priority": "high",
+            "metadata": {"key": [1, 2]},
+            "related": [{"name": "Related", "amount": 1.5, "stage": "Prospecting"}],
+            "unknown": "Ignored",
+        }
+    )
+
+    assert opportunity == Opportunity(
+        name="Example",
+        # Integers are accepted for floats, but are converted.
+        amount=1000.0,
+        stage=Stage.CLOSED_WON,
+        tags=["a", "b"],
+        address={"city": "Example City"},
+        priority="high",
+        metadata={"key": [1, 2]},
+        related=[Opportunity(name="Related", amount=1.5, stage=Stage.PROSPECTING)],
+    )
+    assert isinstance(opportunity.amount, float)
+
+
+def test_typeddict() -> None:
+    decoder = build_decoder(Account)
+
+    account = decoder(
+        {
+            "name": "Example",
+            "opportunities": [
+                {"name": "Example", "amount": 1.5, "stage": "Prospecting"}
+            ],
+        }
+    )
+
+    assert account == {
+        "name": "Example",
+        "opportunities": [
+            Opportunity(name="Example", amount=1.5, stage=Stage.PROSPECTING)
+        ],
+    }
+
+
+@pytest.mark.parametrize(
+    "data,expected_message",
+    [
+        ("Example", "Expected Account but found string at data"),
+        ({"opportunities": []}, "Missing required field 'name' at data"),
+        (
+            {"name": "Example", "opportunities": {}},
+            "Expected array but found object at data.opportunities",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [{"name": "Example", "stage": "Prospecting"}],
+            },
+            "Missing required field 'amount' at data.opportunities[0]",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [
+                    {
+                        "name": "Example",
+                        "amount": 1,
+                        "stage": "Prospecting",
+                        "probability": True,
+                    }
+                ],
+            },
+            "Expected integer but found boolean at data.opportunities[0].probability",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [
+                    {"name": "Example", "amount": "1", "stage": "Prospecting"}
+                ],
+            },
+            "Expected number but found string at data.opportunities[0].amount",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [{"name": "Example", "amount": 1, "stage": "Unknown"}],
+            },
+            "Expected a valid Stage value but found 'Unknown' at data.opportunities[0].stage",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [
+                    {
+                        "name": "Example",
+                        "amount": 1,
+                        "stage": "Prospecting",
+                        "priority": "medium",
+                    }
+                ],
+            },
+            "Expected 'low' or 'high' but found 'medium' at data.opportunities[0].priority",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [
+                    {
+                        "name": "Example",
+                        "amount": 1,
+                        "stage": "Prospecting",
+                        "related": [{"name": 1, "amount": 1, "stage": "Prospecting"}],
+                    }
+                ],
+            },
+            "Expected string but found integer at data.opportunities[0].related[0].name",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [
+                    {
+                        "name": "Example",
+                        "amount": 1,
+                        "stage": "Prospecting",
+                        "address": {"city": 1},
+                    }
+                ],
+            },
+            "Expected string but found integer at data.opportunities[0].address.city",
+        ),
+        (
+            {
+                "name": "Example",
+                "opportunities": [
+                    {"name": "Example", "amount": -1, "stage": "Prospecting"}
+                ],
+            },
+            "Invalid Opportunity: amount must not be negative at data.opportunities[0]",
+        ),
+    ],
+)
+def test_invalid_payload(data: Any, expected_message: str) -> None:
+    decoder = build_decoder(Account)
+
+    with pytest.raises(PayloadDecodeError) as exc_info:
+        decoder(data)
+
+    assert str(exc_info.value) == expected_message
+
+
+def test_list_of_dataclasses() -> None:
+    decoder = build_decoder(list[Opportunity])
+
+    assert decoder([{"name": "Example", "amount": 1.5, "stage": "Prospecting"}]) == [
+        Opportunity(name="Example", amount=1.5, stage=Stage.PROSPECTING)
+    ]
+
+    with pytest.raises(PayloadDecodeError, match=r"at data\[1\]$"):
+        decoder([{"name": "Example", "amount": 1.5, "stage": "Prospecting"}, None])
+
+
+def test_batch_function() -> None:
+    async def batch_function(
+        _events: list[InvocationEvent[Opportunity]], _context: Context
+    ) -> list[Any]:
+        return []
+
+    decoder = build_payload_decoder(batch_function)
+
+    assert decoder is not None
+    assert decoder(
+        {"name": "Example", "amount": 1.5, "stage": "Prospecting"}
+    ) == Opportunity(name="Example", amount=1.5, stage=Stage.PROSPECTING)
+
+
+@pytest.mark.parametrize(
+    "payload_type",
+    # A forward reference that can't be resolved, such as to a name only imported when `TYPE_CHECKING`.
+    [Any, dict[str, Any], list[int], str, "UnresolvableType"],
+)
+def test_decoder_not_needed(payload_type: Any) -> None:
+    # Payloads that don't contain dataclasses or `TypedDict`s are passed to the function as-is.
+    async def function(
+        _event: InvocationEvent[payload_type], _context: Context
+    ) -> None:
+        pass
+
+    assert build_payload_decoder(function) is None
+
+
+def test_decoder_not_needed_unannotated() -> None:
+    async def function(_event, _context):  # type: ignore[no-untyped-def]
+        pass
+
+    assert build_payload_decoder(function) is None
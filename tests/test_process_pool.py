@@ -0,0 +1,120 @@
+import os
+import pickle
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import cast
+
+import pytest
+
+from salesforce_functions._internal.function_loader import load_function
+from salesforce_functions._internal.process_pool import (
+    _encode_exception,  # pyright: ignore [reportPrivateUsage]
+)
+from salesforce_functions._internal.process_pool import (
+    FunctionProcessPool,
+    run_in_thread,
+)
+from salesforce_functions.data_api import DataAPI
+from salesforce_functions.data_api.exceptions import ClientError, DataApiError
+from salesforce_functions.data_api.record import RecordQueryResult
+
+FIXTURE_PATH = Path("tests/fixtures/process_pool")
+
+
+class FakeDataAPI:  # pylint: disable=too-few-public-methods
+    def __init__(self) -> None:
+        self.queries: list[str] = []
+
+    async def query(self, soql: str) -> RecordQueryResult:
+        self.queries.append(soql)
+        return RecordQueryResult(
+            done=True, total_size=42, records=[], next_records_url=None
+        )
+
+
+def load_fixture_module() -> ModuleType:
+    # The callables passed to the pool are pickled by reference, so must be importable from `main`.
+    function = load_function(FIXTURE_PATH)
+    return sys.modules[function.__module__]
+
+
+async def test_run() -> None:
+    module = load_fixture_module()
+    process_pool = FunctionProcessPool(max_workers=1, project_path=FIXTURE_PATH)
+    await process_pool.start()
+
+    try:
+        result = await process_pool.run(
+            cast(DataAPI, FakeDataAPI()), module.sum_of_squares, [1, 2, 3]
+        )
+    finally:
+        await process_pool.shutdown()
+
+    assert result["result"] == 14
+    assert result["pid"] != os.getpid()
+
+
+async def test_run_data_api() -> None:
+    module = load_fixture_module()
+    data_api = FakeDataAPI()
+    process_pool = FunctionProcessPool(max_workers=1, project_path=FIXTURE_PATH)
+    await process_pool.start()
+
+    try:
+        total_size = await process_pool.run(
+            cast(DataAPI, data_api), module.query, "SELECT Name FROM Account"
+        )
+        # Exceptions raised by the Data API are passed back to the pool process.
+        with pytest.raises(
+            ClientError, match="An error occurred while making the request"
+        ):
+            await process_pool.run(
+                DataAPI(org_domain_url="", api_version="", access_token=""),
+                module.query,
+                "SELECT Name FROM Account",
+            )
+    finally:
+        await process_pool.shutdown()
+
+    assert total_size == 42
+    assert data_api.queries == ["SELECT Name FROM Account"]
+
+
+async def test_run_not_started() -> None:
+    module = load_fixture_module()
+    process_pool = FunctionProcessPool(max_workers=1, project_path=FIXTURE_PATH)
+
+    with pytest.raises(RuntimeError, match="The process pool hasn't been started"):
+        await process_pool.run(cast(DataAPI, FakeDataAPI()), module.sum_of_squares, [1])
+
+    await process_pool.shutdown()
+
+
+async def test_run_in_thread() -> None:
+    module = load_fixture_module()
+    data_api = FakeDataAPI()
+
+    total_size = await run_in_thread(
+        cast(DataAPI, data_api), module.query, "SELECT Name FROM Account"
+    )
+    result = await run_in_thread(
+        cast(DataAPI, data_api), module.sum_of_squares, [1, 2, 3]
+    )
+
+    assert total_size == 42
+    assert data_api.queries == ["SELECT Name FROM Account"]
+    assert result == {"result": 14, "pid": os.getpid()}
+
+
+def test_encode_unpicklable_exception() -> None:
+    class UnpicklableError(Exception):
+        def __init__(self, *, reason: str) -> None:
+            super().__init__(f"Failed: {reason}")
+
+    message = _encode_exception(UnpicklableError(reason="Example"))
+    succeeded, exception = pickle.loads(message[4:])
+
+    assert not succeeded
+    assert isinstance(exception, DataApiError)
+    assert str(exception) == "UnpicklableError: Failed: Example"
@@ -0,0 +1,87 @@
+import asyncio
+import pstats
+import re
+from pathlib import Path
+from unittest.mock import Mock
+
+from salesforce_functions._internal.profiling import InvocationProfiler, call_profiled
+
+
+def example_work() -> int:
+    return sum(range(1000))
+
+
+def test_profile(tmp_path: Path) -> None:
+    profiler = InvocationProfiler(directory=tmp_path, logger=Mock())
+
+    with profiler.profile("some/invocation:id") as profile:
+        example_work()
+
+    assert profile is not None
+    assert profile.written
+    assert profile.path.parent == tmp_path
+    assert profile.path.name.startswith("some_invocation_id-")
+    assert profile.path.suffix == ".pstats"
+
+    stats = pstats.Stats(str(profile.path))
+    function_names = [function[2] for function in stats.stats]  # type: ignore[attr-defined]
+    assert "example_work" in function_names
+
+
+async def test_only_one_profile_at_a_time(tmp_path: Path) -> None:
+    logger = Mock()
+    profiler = InvocationProfiler(directory=tmp_path, logger=logger)
+
+    async def invocation(invocation_id: str) -> bool:
+        with profiler.profile(invocation_id) as profile:
+            await asyncio.sleep(0.01)
+            return profile is not None
+
+    assert list(await asyncio.gather(invocation("first"), invocation("second"))) == [
+        True,
+        False,
+    ]
+    assert len(list(tmp_path.iterdir())) == 1
+
+    logger.warning.assert_called_once_with(
+        "Not profiling function invocation, since another invocation is already being profiled"
+    )
+
+
+async def test_call_profiled(tmp_path: Path) -> None:
+    profiler = InvocationProfiler(directory=tmp_path, logger=Mock())
+
+    def profiled_work() -> int:
+        return call_profiled(example_work)
+
+    # `asyncio.to_thread()` runs the call in a copy of the current `contextvars` context.
+    with profiler.profile("some-id") as profile:
+        assert await asyncio.to_thread(profiled_work) == 499500
+
+    assert profile is not None
+    stats = pstats.Stats(str(profile.path))
+    function_names = [function[2] for function in stats.stats]  # type: ignore[attr-defined]
+    assert "example_work" in function_names
+
+
+def test_call_profiled_not_profiling() -> None:
+    assert call_profiled(example_work) == 499500
+
+
+def test_unable_to_write_profile(tmp_path: Path) -> None:
+    logger = Mock()
+    profiler = InvocationProfiler(
+        directory=tmp_path.joinpath("nonexistent"), logger=logger
+    )
+
+    with profiler.profile("some-id") as profile:
+        pass
+
+    assert profile is not None
+    assert not profile.written
+
+    logger.error.assert_called_once()
+    assert re.fullmatch(
+        r"Unable to write profile: FileNotFoundError: .+",
+        logger.error.call_args.args[0],
+    )
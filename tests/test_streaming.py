@@ -0,0 +1,129 @@
+from typing import Any, AsyncGenerator
+from unittest.mock import Mock
+
+import orjson
+import pytest
+
+from salesforce_functions import Context, InvocationEvent
+from salesforce_functions._internal.streaming import (
+    JSON_ARRAY_FORMAT,
+    NDJSON_FORMAT,
+    NDJSON_WITH_METADATA_FORMAT,
+    StreamedResult,
+    StreamEncoder,
+    StreamFormat,
+    negotiate_stream_format,
+    wrap_streaming_function,
+)
+
+
+@pytest.mark.parametrize(
+    "accept,expected_format",
+    [
+        ("", JSON_ARRAY_FORMAT),
+        ("application/json", JSON_ARRAY_FORMAT),
+        ("application/x-ndjson", NDJSON_FORMAT),
+        ("application/jsonl", NDJSON_FORMAT),
+        ("application/json, application/x-ndjson", NDJSON_FORMAT),
+        ("application/json, application/x-ndjson;q=0.5", JSON_ARRAY_FORMAT),
+        ("application/x-ndjson;q=0", JSON_ARRAY_FORMAT),
+        ("*/*", JSON_ARRAY_FORMAT),
+    ],
+)
+def test_negotiate_stream_format(accept: str, expected_format: StreamFormat) -> None:
+    assert negotiate_stream_format(accept) == expected_format
+
+
+def test_negotiate_stream_format_metadata_frame() -> None:
+    assert (
+        negotiate_stream_format("application/x-ndjson", metadata_frame=True)
+        == NDJSON_WITH_METADATA_FORMAT
+    )
+    # The metadata can't be added to a JSON array without changing the result.
+    assert (
+        negotiate_stream_format("application/json", metadata_frame=True)
+        == JSON_ARRAY_FORMAT
+    )
+
+
+@pytest.mark.parametrize(
+    "stream_format,expected_body",
+    [
+        (JSON_ARRAY_FORMAT, b'[{"index":0},{"index":1},{"index":2}]'),
+        (NDJSON_FORMAT, b'{"index":0}\n{"index":1}\n{"index":2}\n'),
+    ],
+)
+def test_stream_encoder(stream_format: StreamFormat, expected_body: bytes) -> None:
+    encoder = StreamEncoder(stream_format, chunk_size=20)
+    chunks: list[bytes] = []
+
+    for index in range(3):
+        encoder.add({"index": index})
+        if encoder.full:
+            chunks.append(encoder.flush())
+    chunks.append(encoder.finish())
+
+    # Items are buffered until a chunk is full, rather than being sent one at a time.
+    assert len(chunks) == 2
+    assert b"".join(chunks) == expected_body
+    assert encoder.item_count == 3
+    assert encoder.size == len(expected_body)
+    assert encoder.serialization_ns > 0
+
+
+def test_stream_encoder_empty() -> None:
+    encoder = StreamEncoder(JSON_ARRAY_FORMAT)
+
+    assert encoder.finish() == b"[]"
+    assert encoder.item_count == 0
+
+
+def test_stream_encoder_not_serializable() -> None:
+    encoder = StreamEncoder(JSON_ARRAY_FORMAT)
+    encoder.add(1)
+
+    with pytest.raises(orjson.JSONEncodeError):
+        encoder.add({1, 2})
+
+    # The item that couldn't be serialized doesn't leave a trailing separator behind.
+    encoder.add(2)
+    assert encoder.finish() == b"[1,2]"
+
+
+async def test_wrap_streaming_function() -> None:
+    async def function(
+        _event: InvocationEvent[Any], _context: Context
+    ) -> AsyncGenerator[int, None]:
+        for item in range(3):
+            yield item
+
+    result = await wrap_streaming_function(function)(Mock(), Mock())
+
+    assert isinstance(result, StreamedResult)
+    # The function has only been run as far as its first item.
+    assert result.first_items == [0]
+    assert [item async for item in result.items] == [1, 2]
+
+
+async def test_wrap_streaming_function_empty() -> None:
+    async def function(
+        _event: InvocationEvent[Any], _context: Context
+    ) -> AsyncGenerator[int, None]:
+        for item in range(0):
+            yield item
+
+    result = await wrap_streaming_function(function)(Mock(), Mock())
+
+    assert isinstance(result, StreamedResult)
+    assert not result.first_items
+
+
+async def test_wrap_streaming_function_raises_exception() -> None:
+    async def function(
+        _event: InvocationEvent[Any], _context: Context
+    ) -> AsyncGenerator[int, None]:
+        raise ValueError("Some error")
+        yield  # pylint: disable=unreachable
+
+    with pytest.raises(ValueError, match="Some error"):
+        await wrap_streaming_function(function)(Mock(), Mock())
@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from salesforce_functions._internal.thread_pool import FunctionThreadPool
+
+example_var: contextvars.ContextVar[str] = contextvars.ContextVar("example_var")
+
+
+async def test_run() -> None:
+    thread_pool = FunctionThreadPool(max_workers=1)
+    example_var.set("example-value")
+
+    def get_thread_details() -> tuple[str, str]:
+        return threading.current_thread().name, example_var.get()
+
+    thread_name, value = await thread_pool.run(get_thread_details)
+    thread_pool.shutdown()
+
+    assert thread_name.startswith("sf-functions-sync")
+    # The call runs in a copy of the caller's `contextvars` context.
+    assert value == "example-value"
+
+
+async def test_busy_and_queued() -> None:
+    changes: list[tuple[int, int]] = []
+    thread_pool = FunctionThreadPool(
+        max_workers=2,
+        on_change=lambda pool: changes.append((pool.busy, pool.queued)),
+    )
+
+    await asyncio.gather(*(thread_pool.run(time.sleep, 0.1) for _ in range(3)))
+    thread_pool.shutdown()
+
+    assert thread_pool.busy == 0
+    assert thread_pool.queued == 0
+    assert changes[:3] == [(1, 0), (2, 0), (2, 1)]
+    assert changes[-1] == (0, 0)
+
+
+async def test_cancelled_call_still_counted_as_busy() -> None:
+    thread_pool = FunctionThreadPool(max_workers=1)
+    stop = threading.Event()
+
+    task = asyncio.create_task(thread_pool.run(stop.wait))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.sleep(0.05)
+
+    # The thread can't be interrupted, so remains busy until the call returns.
+    assert task.cancelled()
+    assert thread_pool.busy == 1
+
+    stop.set()
+    await asyncio.sleep(0.05)
+    thread_pool.shutdown()
+    assert thread_pool.busy == 0
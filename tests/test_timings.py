@@ -0,0 +1,33 @@
+from salesforce_functions._internal.timings import InvocationTimings
+
+
+def test_all_phases() -> None:
+    timings = InvocationTimings(
+        body_read_ns=12_345,
+        parse_ns=50_000,
+        context_ns=1_000,
+        function_ns=123_456_789,
+        serialization_ns=999,
+    )
+    timings.add_data_api_request(40_000_000)
+    timings.add_data_api_request(60_000_400)
+
+    assert timings.to_milliseconds() == {
+        "bodyRead": 0.012,
+        "parse": 0.05,
+        "context": 0.001,
+        "function": 123.457,
+        "dataApi": 100.0,
+        "serialization": 0.001,
+    }
+    assert timings.to_server_timing() == (
+        "bodyRead;dur=0.012, parse;dur=0.05, context;dur=0.001, function;dur=123.457,"
+        " dataApi;dur=100.0, serialization;dur=0.001"
+    )
+
+
+def test_phases_not_reached() -> None:
+    timings = InvocationTimings(body_read_ns=2_000_000)
+
+    assert timings.to_milliseconds() == {"bodyRead": 2.0}
+    assert timings.to_server_timing() == "bodyRead;dur=2.0"
@@ -0,0 +1,83 @@
+import os
+import socket
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+from salesforce_functions._internal.workers import bind_sockets, bind_unix_socket
+
+
+def test_bind_sockets() -> None:
+    sockets = bind_sockets("127.0.0.1", 0)
+
+    try:
+        assert len(sockets) == 1
+        host, port = sockets[0].getsockname()
+        assert host == "127.0.0.1"
+        assert port != 0
+
+        # The socket is already listening, so can accept connections before the workers start.
+        with socket.create_connection((host, port), timeout=1):
+            pass
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def test_bind_sockets_address_in_use() -> None:
+    sockets = bind_sockets("127.0.0.1", 0)
+
+    try:
+        _, port = sockets[0].getsockname()
+        with pytest.raises(OSError):
+            bind_sockets("127.0.0.1", port)
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires SO_REUSEPORT")
+def test_bind_sockets_reuse_port() -> None:
+    sockets = bind_sockets("127.0.0.1", 0, reuse_port=True)
+
+    try:
+        _, port = sockets[0].getsockname()
+        # Each worker binds its own socket to the same address.
+        sockets.extend(bind_sockets("127.0.0.1", port, reuse_port=True))
+        assert len(sockets) == 2
+
+        with socket.create_connection(("127.0.0.1", port), timeout=1):
+            pass
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires AF_UNIX")
+def test_bind_unix_socket(tmp_path: Path) -> None:
+    path = str(tmp_path.joinpath("function.sock"))
+    # A stale socket left behind by a previous server is replaced.
+    bind_unix_socket(path).close()
+    sock = bind_unix_socket(path)
+
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o666
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+    finally:
+        sock.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires AF_UNIX")
+def test_bind_unix_socket_not_a_socket(tmp_path: Path) -> None:
+    path = tmp_path.joinpath("function.sock")
+    path.write_text("Not a socket")
+
+    # Only sockets are replaced, so that a mistyped path can't delete an unrelated file.
+    with pytest.raises(OSError):
+        bind_unix_socket(str(path))
+
+    assert path.read_text() == "Not a socket"
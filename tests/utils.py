@@ -1,19 +1,34 @@
 import binascii
 import os
+import re
+from datetime import datetime, timedelta, timezone
 from typing import Any
 from unittest.mock import patch
 
 import orjson
 from httpx import Response
 from starlette.testclient import TestClient
+from starlette.types import ASGIApp
 
 from salesforce_functions._internal.app import PROJECT_PATH_ENV_VAR, asgi_app
 
 WIREMOCK_SERVER_URL = "http://localhost:12345"
 
+# The line that the app logs whenever it shuts down, which has a varying duration.
+SHUTDOWN_LOG_LINE_REGEX = re.compile(
+    r"shutdownDurationMs=\d+ abortedInvocations=0 level=info"
+    r' msg="Finished draining in-flight work before shutting down"\n'
+)
+
+
+def without_shutdown_log_line(output: str) -> str:
+    """Remove the log line logged each time the app shuts down, for tests that aren't about shutdown."""
+    return SHUTDOWN_LOG_LINE_REGEX.sub("", output)
+
 
 def generate_cloud_event_headers(
     include_optional_attributes: bool = True,
+    deadline: str | None = None,
 ) -> dict[str, str]:
     invocation_id = "00DJS0000000123ABC-d75b3b6ece5011dcabbed4-3c6f7179"
     headers = {
@@ -27,7 +42,9 @@ def generate_cloud_event_headers(
         ),
         "ce-sffncontext": encode_cloud_event_extension(
             generate_sf_function_context(
-                invocation_id, include_optional_attributes=include_optional_attributes
+                invocation_id,
+                include_optional_attributes=include_optional_attributes,
+                deadline=deadline,
             )
         ),
         "x-request-id": invocation_id,
@@ -45,6 +62,28 @@ def generate_cloud_event_headers(
     return headers
 
 
+def generate_batch_event(
+    invocation_id: str,
+    data: Any = None,
+    access_token: str = "EXAMPLE-TOKEN",
+    deadline: str | None = None,
+) -> dict[str, Any]:
+    sf_function_context = generate_sf_function_context(invocation_id, deadline=deadline)
+    sf_function_context["accessToken"] = access_token
+
+    return {
+        "id": invocation_id,
+        "source": "urn:event:from:salesforce/JS/56.0/00DJS0000000123ABC/apex/ExampleClass:example_function():7",
+        "specversion": "1.0",
+        "type": "com.salesforce.function.invoke.async",
+        "datacontenttype": "application/json",
+        "time": "2023-01-19T10:09:12.476684Z",
+        "data": data,
+        "sfcontext": encode_cloud_event_extension(generate_sf_context()),
+        "sffncontext": encode_cloud_event_extension(sf_function_context),
+    }
+
+
 def generate_sf_context(
     include_optional_attributes: bool = True,
 ) -> dict[str, str | dict[str, str]]:
@@ -72,7 +111,9 @@ def generate_sf_context(
 
 
 def generate_sf_function_context(
-    invocation_id: str, include_optional_attributes: bool = True
+    invocation_id: str,
+    include_optional_attributes: bool = True,
+    deadline: str | None = None,
 ) -> dict[str, str]:
     sf_function_context = {
         "accessToken": "EXAMPLE-TOKEN",
@@ -84,7 +125,8 @@ def generate_sf_function_context(
             {
                 "apexFQN": "ExampleClass:example_function():7",
                 "apexId": "apexId TODO",
-                "deadline": "2023-01-19T10:11:12.468085Z",
+                # The deadline has to be in the future, otherwise the invocation is rejected.
+                "deadline": deadline or generate_deadline(timedelta(minutes=2)),
                 "functionInvocationId": "functionInvocationId TODO",
                 "functionName": "ExampleProject.examplefunction",
                 "invokingNamespace": "",
@@ -95,25 +137,29 @@ def generate_sf_function_context(
     return sf_function_context
 
 
+def generate_deadline(remaining_time: timedelta) -> str:
+    deadline = datetime.now(timezone.utc) + remaining_time
+    return deadline.isoformat().replace("+00:00", "Z")
+
+
 def encode_cloud_event_extension(data: Any) -> str:
     json = orjson.dumps(data)
     return binascii.b2a_base64(json).decode("ascii")
 
 
-def invoke_function(
+def invoke_function(  # pylint: disable=too-many-arguments
     fixture_path: str,
     headers: dict[str, str] | None = None,
     json: Any = None,
     content: Any = None,
     raise_server_exceptions: bool = True,
+    app: ASGIApp = asgi_app,
 ) -> Response:
     if headers is None:
         headers = generate_cloud_event_headers()
 
     with patch.dict(os.environ, {PROJECT_PATH_ENV_VAR: fixture_path}):
-        with TestClient(
-            asgi_app, raise_server_exceptions=raise_server_exceptions
-        ) as client:
+        with TestClient(app, raise_server_exceptions=raise_server_exceptions) as client:
             response = client.post("/", headers=headers, json=json, content=content)
 
     return response